@@ -59,6 +59,10 @@ MIDDLEWARE = [
     "csp.middleware.CSPMiddleware",
     "django_referrer_policy.middleware.ReferrerPolicyMiddleware",
 ]
+# statements run this many times by one request are logged in DEBUG
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+if DEBUG:
+    MIDDLEWARE.append("secretariat.middleware.RepeatedQueriesMiddleware")
 
 ROOT_URLCONF = "config.urls"
 
@@ -161,5 +165,43 @@ REFERRER_POLICY = "same-origin"
 
 OUTLINE_URL = os.getenv("OUTLINE_URL")
 OUTLINE_API_TOKEN = os.getenv("OUTLINE_API_TOKEN")
+OUTLINE_HTTP_POOL_SIZE = int(os.getenv("OUTLINE_HTTP_POOL_SIZE", 10))
+OUTLINE_HTTP_CONNECT_TIMEOUT = float(os.getenv("OUTLINE_HTTP_CONNECT_TIMEOUT", 5))
+OUTLINE_HTTP_READ_TIMEOUT = float(os.getenv("OUTLINE_HTTP_READ_TIMEOUT", 30))
+OUTLINE_CONCURRENCY = int(os.getenv("OUTLINE_CONCURRENCY", 8))
+OUTLINE_INVITE_CHUNK_SIZE = int(os.getenv("OUTLINE_INVITE_CHUNK_SIZE", 20))
+# requests per second and per endpoint, 0 disables the rate limiter
+OUTLINE_RATE_LIMIT = float(os.getenv("OUTLINE_RATE_LIMIT", 10))
+OUTLINE_RATE_BURST = int(os.getenv("OUTLINE_RATE_BURST", 20))
+OUTLINE_MAX_RETRIES = int(os.getenv("OUTLINE_MAX_RETRIES", 4))
+OUTLINE_BACKOFF_BASE = float(os.getenv("OUTLINE_BACKOFF_BASE", 0.5))
+OUTLINE_BACKOFF_MAX = float(os.getenv("OUTLINE_BACKOFF_MAX", 30))
+# longest Retry-After honoured, longer ones fail the call at once
+OUTLINE_RETRY_AFTER_MAX = float(
+    os.getenv("OUTLINE_RETRY_AFTER_MAX", OUTLINE_BACKOFF_MAX)
+)
+# seconds before the cached group name index is rebuilt
+OUTLINE_GROUP_INDEX_TTL = float(os.getenv("OUTLINE_GROUP_INDEX_TTL", 300))
+# seconds during which users resolved by email are not looked up again
+OUTLINE_USER_CACHE_TTL = float(os.getenv("OUTLINE_USER_CACHE_TTL", 60))
+OUTLINE_EMAIL_CHUNK_SIZE = int(os.getenv("OUTLINE_EMAIL_CHUNK_SIZE", 100))
+# the circuit opens when this share of calls fails over the window (seconds)
+OUTLINE_BREAKER_FAILURE_RATE = float(os.getenv("OUTLINE_BREAKER_FAILURE_RATE", 0.5))
+OUTLINE_BREAKER_MINIMUM_CALLS = int(os.getenv("OUTLINE_BREAKER_MINIMUM_CALLS", 10))
+OUTLINE_BREAKER_WINDOW = float(os.getenv("OUTLINE_BREAKER_WINDOW", 60))
+OUTLINE_BREAKER_OPEN_SECONDS = float(os.getenv("OUTLINE_BREAKER_OPEN_SECONDS", 30))
+# bearer token for Prometheus to scrape /outline/metrics without a session
+OUTLINE_METRICS_TOKEN = os.getenv("OUTLINE_METRICS_TOKEN")
+# background sync worker: jobs claimed per round, lease (seconds) and attempts
+OUTLINE_SYNC_BATCH_SIZE = int(os.getenv("OUTLINE_SYNC_BATCH_SIZE", 50))
+OUTLINE_SYNC_LEASE_SECONDS = float(os.getenv("OUTLINE_SYNC_LEASE_SECONDS", 300))
+OUTLINE_SYNC_MAX_ATTEMPTS = int(os.getenv("OUTLINE_SYNC_MAX_ATTEMPTS", 5))
+OUTLINE_SYNC_POLL_INTERVAL = float(os.getenv("OUTLINE_SYNC_POLL_INTERVAL", 5))
+# users or memberships committed per transaction by import-from-outline
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+# times import-from-outline starts again from its checkpoint when Outline fails
+IMPORT_MAX_RETRIES = int(os.getenv("IMPORT_MAX_RETRIES", 3))
+# seconds a run of expire-memberships may spend before leaving the rest for later
+OUTLINE_EXPIRY_BUDGET = float(os.getenv("OUTLINE_EXPIRY_BUDGET", 300))
 
 ADMIN_URL = os.getenv("ADMIN_URL", "admin/")
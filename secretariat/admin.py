@@ -1,7 +1,26 @@
 from django.contrib import admin, messages
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
 
-from secretariat.models import Membership, Organisation, User
+from secretariat.models import (
+    Membership,
+    Organisation,
+    OutlineGroup,
+    OutlineUser,
+    SyncJob,
+    SyncOperation,
+    SyncRun,
+    User,
+    active_membership,
+)
+from secretariat.utils.metrics import diff_snapshots, metrics, summary_lines
+from secretariat.utils.outline import CircuitOpen
+from secretariat.utils.outline import Client as OutlineClient
 from secretariat.utils.outline import GroupCreationFailed
+from secretariat.utils.outline_mirror import (
+    memberships_missing_from_outline,
+    outline_memberships_missing_from_django,
+)
 
 
 class MembershipInline(admin.TabularInline):
@@ -32,15 +51,107 @@ class SynchronizedWithOutlineFilter(admin.SimpleListFilter):
             return queryset.filter(**{f"{self.field_name}__isnull": True})
 
 
-@admin.action(description="Synchroniser vers Outline")
+class InOutlineMirrorFilter(admin.SimpleListFilter):
+    title = "Présent·e dans la copie d’Outline"
+    parameter_name = "outline_mirror"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("oui", "Oui"),
+            ("non", "Non"),
+        )
+
+    def queryset(self, request, queryset):
+        in_mirror = Exists(OutlineUser.objects.filter(id=OuterRef("outline_uuid")))
+        if self.value() == "oui":
+            return queryset.filter(in_mirror)
+        if self.value() == "non":
+            return queryset.filter(outline_uuid__isnull=False).exclude(in_mirror)
+
+
+class OutOfSyncMembersFilter(admin.SimpleListFilter):
+    title = "Membres différents dans la copie d’Outline"
+    parameter_name = "outline_diff"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("oui", "Oui"),
+            ("non", "Non"),
+        )
+
+    def queryset(self, request, queryset):
+        out_of_sync = Exists(
+            memberships_missing_from_outline().filter(organisation=OuterRef("pk"))
+        ) | Exists(
+            outline_memberships_missing_from_django().filter(
+                group_id=OuterRef("outline_group_uuid")
+            )
+        )
+        if self.value() == "oui":
+            return queryset.filter(out_of_sync)
+        if self.value() == "non":
+            return queryset.exclude(out_of_sync)
+
+
+class MembersCountFilter(admin.SimpleListFilter):
+    """Filters on a member count annotated by `OrganisationAdmin.get_queryset`."""
+
+    annotation = None
+
+    def lookups(self, request, model_admin):
+        return (
+            ("oui", "Oui"),
+            ("non", "Non"),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == "oui":
+            return queryset.filter(**{f"{self.annotation}__gt": 0})
+        if self.value() == "non":
+            return queryset.filter(**{self.annotation: 0})
+
+
+class ActiveMembersFilter(MembersCountFilter):
+    title = "Avec des membres actifs"
+    parameter_name = "active_members"
+    annotation = "active_members_count"
+
+
+class UnsyncedMembersFilter(MembersCountFilter):
+    title = "Avec des membres absents d’Outline"
+    parameter_name = "unsynced_members"
+    annotation = "unsynced_members_count"
+
+
+@admin.action(description="Synchroniser vers Outline (en arrière-plan)")
+def enqueue_outline_sync(model_admin: admin.ModelAdmin, request, queryset):
+    jobs = SyncJob.enqueue(
+        model_admin.sync_target, queryset.values_list("pk", flat=True)
+    )
+    messages.success(
+        request,
+        f"{len(jobs)} tâche(s) de synchronisation ajoutée(s) à la file d’attente.",
+    )
+
+
+@admin.action(description="Synchroniser immédiatement vers Outline")
 def sync_objects_with_outline(model_admin: admin.ModelAdmin, request, queryset):
+    client = OutlineClient()
+    metrics_before = metrics.snapshot()
     for object in queryset:
         try:
-            object.synchronize_to_outline()
+            object.synchronize_to_outline(client)
             messages.success(
                 request,
                 f"Synchronisation correcte de l’{model_admin.opts.verbose_name} « {object}»",
             )
+        except CircuitOpen:
+            messages.error(
+                request,
+                f"Outline est indisponible : synchronisation interrompue avant l’{model_admin.opts.verbose_name} « {object}». "
+                f"Réessayez dans {client.breaker.retry_in():.0f} secondes.",
+            )
+            break
         except GroupCreationFailed:
             messages.error(
                 request,
@@ -52,9 +163,25 @@ def sync_objects_with_outline(model_admin: admin.ModelAdmin, request, queryset):
                 f"Une erreur s’est produite lors de la synchronisation de l’{model_admin.opts.verbose_name} « {object}»",
             )
 
+    messages.info(
+        request,
+        " · ".join(summary_lines(diff_snapshots(metrics_before, metrics.snapshot()))),
+    )
+
+
+class OutlineSyncOnSaveMixin:
+    """Queues a sync job in the transaction that saves the object and its inlines."""
+
+    sync_target = None
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        SyncJob.enqueue(self.sync_target, [form.instance.pk])
+
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(OutlineSyncOnSaveMixin, admin.ModelAdmin):
+    sync_target = SyncJob.USER
     list_display = (
         "username",
         "email",
@@ -64,9 +191,9 @@ class UserAdmin(admin.ModelAdmin):
         "is_staff",
         "is_outline_synchronized",
     )
-    list_filter = (SynchronizedWithOutlineFilter,)
+    list_filter = (SynchronizedWithOutlineFilter, InOutlineMirrorFilter)
     inlines = [MembershipInline]
-    actions = (sync_objects_with_outline,)
+    actions = (enqueue_outline_sync, sync_objects_with_outline)
     readonly_fields = ["outline_uuid"]
     fieldsets = (
         (
@@ -108,20 +235,175 @@ class OrganisationSynchronizedWithOutlineFilter(SynchronizedWithOutlineFilter):
 
 
 @admin.register(Organisation)
-class OrganisationAdmin(admin.ModelAdmin):
+class OrganisationAdmin(OutlineSyncOnSaveMixin, admin.ModelAdmin):
+    sync_target = SyncJob.ORGANISATION
     inlines = [MembershipInlineForOrganisation]
-    actions = (sync_objects_with_outline,)
-    list_filter = (OrganisationSynchronizedWithOutlineFilter,)
+    actions = (enqueue_outline_sync, sync_objects_with_outline)
+    list_filter = (
+        OrganisationSynchronizedWithOutlineFilter,
+        OutOfSyncMembersFilter,
+        ActiveMembersFilter,
+        UnsyncedMembersFilter,
+    )
     list_display = (
         "name",
         "members_count",
+        "active_members_count",
+        "unsynced_members_count",
         "is_outline_synchronized",
     )
     search_fields = ["name"]
 
+    def get_queryset(self, request):
+        # counted in the changelist query, whatever the number of rows
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                members_count=Count("membership__user", distinct=True),
+                active_members_count=Count(
+                    "membership__user",
+                    filter=active_membership(prefix="membership__"),
+                    distinct=True,
+                ),
+                unsynced_members_count=Count(
+                    "membership__user",
+                    # ended memberships are not synced anyway
+                    filter=active_membership(prefix="membership__")
+                    & Q(membership__user__outline_uuid__isnull=True),
+                    distinct=True,
+                ),
+            )
+        )
+
     @admin.display(description="Synchro Outline", boolean=True)
     def is_outline_synchronized(self, obj):
         return obj.outline_group_uuid is not None
 
+    @admin.display(description="Membres", ordering="members_count")
     def members_count(self, obj):
-        return obj.members.count()
+        return obj.members_count
+
+    @admin.display(description="Membres actifs", ordering="active_members_count")
+    def active_members_count(self, obj):
+        return obj.active_members_count
+
+    @admin.display(description="Absent·es d’Outline", ordering="unsynced_members_count")
+    def unsynced_members_count(self, obj):
+        return obj.unsynced_members_count
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "__str__",
+        "status",
+        "attempts",
+        "available_at",
+        "updated_at",
+        "last_error",
+    )
+    list_filter = ("status", "target")
+    readonly_fields = [
+        "target",
+        "object_id",
+        "attempts",
+        "lease_expires_at",
+        "last_error",
+        "created_at",
+        "updated_at",
+    ]
+    actions = ("retry_now",)
+
+    @admin.action(description="Relancer maintenant")
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status=SyncJob.RUNNING).update(
+            status=SyncJob.PENDING, available_at=timezone.now(), attempts=0
+        )
+        messages.success(request, f"{count} tâche(s) relancée(s).")
+
+
+class ReadOnlyMirrorAdmin(admin.ModelAdmin):
+    """The mirror is only written by `refresh-outline-mirror`."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutlineUser)
+class OutlineUserAdmin(ReadOnlyMirrorAdmin):
+    list_display = ("name", "email", "is_admin", "is_suspended", "fetched_at")
+    list_filter = ("is_admin", "is_suspended")
+    search_fields = ["name", "email"]
+
+
+@admin.register(OutlineGroup)
+class OutlineGroupAdmin(ReadOnlyMirrorAdmin):
+    list_display = ("name", "fetched_at")
+    search_fields = ["name"]
+
+
+class SyncOperationInline(admin.TabularInline):
+    model = SyncOperation
+    fields = ("key", "status", "error", "updated_at")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "__str__",
+        "status",
+        "finished_at",
+        "resumed_count",
+        "operations_done",
+        "operations_failed",
+        "operations_left",
+    )
+    list_filter = ("kind", "status")
+    readonly_fields = [
+        "kind",
+        "status",
+        "started_at",
+        "finished_at",
+        "resumed_count",
+        "checkpoint",
+    ]
+    inlines = [SyncOperationInline]
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                done_count=Count(
+                    "operations", filter=Q(operations__status=SyncOperation.DONE)
+                ),
+                failed_count=Count(
+                    "operations", filter=Q(operations__status=SyncOperation.FAILED)
+                ),
+                planned_count=Count(
+                    "operations", filter=Q(operations__status=SyncOperation.PLANNED)
+                ),
+            )
+        )
+
+    @admin.display(description="Appliquées", ordering="done_count")
+    def operations_done(self, obj):
+        return obj.done_count
+
+    @admin.display(description="Échouées", ordering="failed_count")
+    def operations_failed(self, obj):
+        return obj.failed_count
+
+    @admin.display(description="Restantes", ordering="planned_count")
+    def operations_left(self, obj):
+        return obj.planned_count
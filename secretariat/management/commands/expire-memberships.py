@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+from config.settings import OUTLINE_CONCURRENCY, OUTLINE_EXPIRY_BUDGET
+from secretariat.utils.membership_expiry import MembershipExpiry
+from secretariat.utils.metrics import diff_snapshots, metrics, summary_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique dans Outline les adhésions qui ont commencé ou pris fin depuis "
+        "le dernier passage. À lancer régulièrement (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=OUTLINE_EXPIRY_BUDGET,
+            help="Durée maximale (en secondes) du passage ; le reste attend le suivant.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre d'appels simultanés à Outline.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche les opérations prévues sans les appliquer.",
+        )
+
+    def handle(self, *args, **options):
+        expiry = MembershipExpiry(workers=options["workers"], budget=options["budget"])
+
+        if options["dry_run"]:
+            for day in expiry.pending_days():
+                for line in expiry.plan_day(day).describe():
+                    self.stdout.write(f"{day:%d/%m/%Y} : {line}")
+            return
+
+        metrics_before = metrics.snapshot()
+        result = expiry.run()
+        for operation, error in result.errors:
+            self.stdout.write(self.style.ERROR(f"Échec de {operation.key} : {error}"))
+        if result.queued:
+            self.stdout.write(
+                f"{len(result.queued)} utilisateurice(s) confié(e)s à run-sync-worker."
+            )
+        self.stdout.write(
+            f"{len(result.days)} jour(s) traité(s), {len(result.done)} opération(s) appliquée(s)."
+        )
+        if result.out_of_time:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Temps écoulé : la suite sera traitée au prochain passage."
+                )
+            )
+        for line in summary_lines(diff_snapshots(metrics_before, metrics.snapshot())):
+            self.stdout.write(line)
@@ -1,211 +1,590 @@
+import cProfile
+import json
+import time
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ValidationError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
 from django.db.utils import IntegrityError
-from factory import Faker
+from django.utils.dateparse import parse_datetime
 
-from config.settings import OUTLINE_URL
-from secretariat.models import Membership, Organisation
+from config.settings import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_MAX_RETRIES,
+    OUTLINE_CONCURRENCY,
+    OUTLINE_URL,
+)
+from secretariat.models import Membership, Organisation, SyncRun, Watermark
+from secretariat.utils.fetch_pipeline import FetchPipeline
+from secretariat.utils.import_checkpoint import ImportCheckpoint
+from secretariat.utils.metrics import diff_snapshots, metrics, summary_lines
+from secretariat.utils.outline import CircuitOpen
 from secretariat.utils.outline import Client as OutlineClient
 from secretariat.utils.outline import RemoteServerError
+from secretariat.utils.outline_async import ConcurrentClient
+from secretariat.utils.phases import PhaseRecorder
+from secretariat.utils.queries import QueryCounter
 
 User = get_user_model()
 
+USERS_WATERMARK = "import-from-outline:users"
+
 
 class Command(BaseCommand):
     help = "Imports users from Outline. Creates missing users in Django, updates existing users if needed."
 
+    users_page_size = 25
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre maximal de requêtes simultanées vers Outline.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre de groupes dont les membres sont récupérés simultanément.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Relit tous les utilisateurices, pas seulement ceux modifiés depuis le dernier import.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Nombre d'utilisateurices ou de membres importés par transaction.",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="RUN_ID",
+            help="Reprend un import interrompu là où il s'est arrêté.",
+        )
+        parser.add_argument(
+            "--max-retries",
+            type=int,
+            default=IMPORT_MAX_RETRIES,
+            help="Nombre de reprises sur place quand Outline ne répond pas.",
+        )
+        parser.add_argument(
+            "--profile",
+            metavar="FICHIER",
+            help="Enregistre les statistiques cProfile de l'import (lisibles avec pstats).",
+        )
+        parser.add_argument(
+            "--report-json",
+            metavar="FICHIER",
+            help="Écrit les durées, requêtes SQL et appels à Outline de l'import en JSON.",
+        )
+
     def handle(self, *args, **options):
-        print(f"Instance URL is {OUTLINE_URL} .")
+        self.stdout.write(f"Instance URL is {OUTLINE_URL} .")
 
         client = OutlineClient()
+        concurrent_client = ConcurrentClient(client, options["concurrency"])
+        metrics_before = metrics.snapshot()
+
+        if options["resume"]:
+            try:
+                self.checkpoint = ImportCheckpoint.resume(options["resume"])
+            except SyncRun.DoesNotExist:
+                raise CommandError(f"Import n°{options['resume']} introuvable.")
+            self.stdout.write(f"Reprise de l'import n°{self.checkpoint.run.pk}.")
+        else:
+            since = None if options["full"] else Watermark.get_value(USERS_WATERMARK)
+            self.checkpoint = ImportCheckpoint.start(since)
+            self.stdout.write(f"Import n°{self.checkpoint.run.pk}.")
+        if self.checkpoint.since:
+            self.stdout.write(
+                f"Import des utilisateurices modifié·es depuis {self.checkpoint.since}."
+            )
+        self.latest_user_update = self.checkpoint.latest_user_update
+        self.phases = PhaseRecorder()
+        self.counts = {}
+        started = time.perf_counter()
+        profiler = cProfile.Profile() if options["profile"] else None
+
+        try:
+            if profiler:
+                profiler.enable()
+            if not self.checkpoint.users_done:
+                self.run_with_retries(
+                    client,
+                    options["max_retries"],
+                    lambda: self.import_users(concurrent_client, options["batch_size"]),
+                )
+            self.run_with_retries(
+                client,
+                options["max_retries"],
+                lambda: self.import_orga_and_memberships(
+                    concurrent_client, options["workers"], options["batch_size"]
+                ),
+            )
+        except Exception:
+            # committed batches are kept, the run can be resumed after them
+            self.checkpoint.finish(SyncRun.FAILED)
+            raise
+        else:
+            self.checkpoint.finish()
+            # only a complete run moves the mark forward
+            if self.latest_user_update:
+                Watermark.advance(USERS_WATERMARK, self.latest_user_update)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(options["profile"])
+            outline_calls = diff_snapshots(metrics_before, metrics.snapshot())
+            if options["report_json"]:
+                self.write_report(
+                    options["report_json"],
+                    time.perf_counter() - started,
+                    client,
+                    outline_calls,
+                )
+
+        stats = client.connection_stats()
+        self.stdout.write(
+            f"{stats['requests']} requêtes HTTP vers Outline sur {stats['connections']} connexion(s) "
+            f"({stats['reused']} réutilisations)."
+        )
+        stats = client.scheduler.stats()
+        self.stdout.write(
+            f"{stats['throttled']} limitation(s) de débit, {stats['retries']} nouvelle(s) tentative(s), "
+            f"{stats['wait_time']:.1f} s d'attente."
+        )
+        for line in summary_lines(outline_calls):
+            self.stdout.write(line)
+        for line in self.phases.summary_lines():
+            self.stdout.write(line)
+        self.stdout.write(f"Durée totale : {time.perf_counter() - started:.2f} s")
 
-        self.import_users(client)
-        self.import_orga_and_memberships(client)
+    def write_report(self, path, duration, client, outline_calls):
+        report = {
+            "run": self.checkpoint.run.pk,
+            "status": self.checkpoint.run.status,
+            "duration": duration,
+            "phases": self.phases.as_dict(),
+            "queries": sum(phase["queries"] for phase in self.phases.phases.values()),
+            "counts": self.counts,
+            "outline": {
+                "endpoints": outline_calls,
+                "connections": client.connection_stats(),
+                "scheduler": client.scheduler.stats(),
+            },
+        }
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
 
-    def import_users(self, client):
+    def run_with_retries(self, client, max_retries, step):
+        """
+        Runs `step` again from the last checkpoint when Outline cannot be
+        reached, up to `max_retries` times, then fails the run.
+        """
+        attempt = 0
+        while True:
+            try:
+                return step()
+            except RemoteServerError as error:
+                self.checkpoint.save()
+                attempt += 1
+                if attempt > max_retries:
+                    raise CommandError(
+                        f"Impossible d'atteindre le serveur ({error.status_code}). "
+                        f"Reprendre avec --resume {self.checkpoint.run.pk}."
+                    )
+                delay = client.scheduler.backoff_delay(attempt)
+                if isinstance(error, CircuitOpen):
+                    # requests fail at once until the breaker lets one through
+                    delay = max(delay, client.breaker.retry_in())
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Outline ne répond pas, nouvel essai dans {delay:.1f} s."
+                    )
+                )
+                time.sleep(delay)
+
+    def import_users(self, client, batch_size=IMPORT_BATCH_SIZE):
         self.stdout.write("Importing users ... ")
+        # a retried step starts again from the last committed batch
+        self.latest_user_update = self.checkpoint.latest_user_update
+        counter = QueryCounter()
+        counts = self.counts["users"] = dict.fromkeys(
+            ("existing", "updated", "new", "errors"), 0
+        )
 
-        # we list known mails to try and match users
-        known_emails = set(value[0] for value in User.objects.values_list("email"))
-        count_existing_users, count_new_users, count_errors = 0, 0, 0
+        for next_offset, outline_users in self.phases.iterate(
+            "users.fetch", self.get_user_batches(client, batch_size)
+        ):
+            # a failure rolls back this batch only, the checkpoint included
+            with transaction.atomic():
+                with counter:
+                    self.import_users_batch(outline_users, counts, batch_size)
+                self.checkpoint.users_committed(next_offset, self.latest_user_update)
+        self.checkpoint.users_finished()
+
+        self.stdout.write(
+            f"\n{counts['existing']} utilisateurices déjà à jour sur secretariat."
+        )
+        self.stdout.write(f"{counts['updated']} UUID Outline ajoutés.")
+        self.stdout.write(f"{counts['new']} nouveaux users.")
+        self.stdout.write(self.style.ERROR(f"{counts['errors']} erreurs.\n"))
+        self.stdout.write(f"{counter.count} requête(s) SQL pour les utilisateurices.")
+
+    def import_users_batch(self, outline_users, counts, batch_size):
+        with self.phases.phase("users.match"):
+            users_to_update, users_to_create = self.match_users(
+                outline_users, counts, batch_size
+            )
+        with self.phases.phase("users.write"):
+            User.objects.bulk_update(
+                users_to_update, ["outline_uuid"], batch_size=batch_size
+            )
+            User.objects.bulk_create(users_to_create, batch_size=batch_size)
+        counts["updated"] += len(users_to_update)
+        counts["new"] += len(users_to_create)
 
-        for user in self.get_all_outline_users(client):
-            if user["email"] in known_emails:
-                django_user = User.objects.get(email=user["email"])
+    def match_users(self, outline_users, counts, batch_size):
+        """Returns the users of the batch to update and to create."""
+        new_users = {user["id"]: self.new_django_user(user) for user in outline_users}
+        # only the rows this batch can collide with are loaded
+        users_by_email, known_usernames, known_uuids = {}, set(), set()
+        for django_user in User.objects.filter(
+            Q(email__in=[user["email"] for user in outline_users])
+            | Q(username__in=[user.username for user in new_users.values()])
+            | Q(outline_uuid__in=list(new_users))
+        ).iterator(chunk_size=batch_size):
+            users_by_email[django_user.email] = django_user
+            known_usernames.add(django_user.username)
+            if django_user.outline_uuid:
+                known_uuids.add(str(django_user.outline_uuid))
+
+        users_to_update, users_to_create = [], []
+        for user in outline_users:
+            if user["email"] in users_by_email:
+                django_user = users_by_email[user["email"]]
                 if str(django_user.outline_uuid) == user["id"]:
-                    count_existing_users += 1
+                    counts["existing"] += 1
                 elif django_user.outline_uuid is None:
                     django_user.outline_uuid = user["id"]
-                    django_user.save()
+                    users_to_update.append(django_user)
                 else:
                     self.stdout.write(
                         self.style.ERROR(
                             f"Unexpected UUID for {django_user.username} (django: '{django_user.outline_uuid}', outline: '{user['id']}')."
                         )
                     )
-                    count_errors += 1
+                    counts["errors"] += 1
+                continue
+
+            django_user = new_users[user["id"]]
+            if django_user.username in known_usernames:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Impossible d'ajouter '{django_user.username}' car cet username existe déjà dans Django. Veuillez choisir un username différent ou supprimer le doublon avant de réessayer."
+                    )
+                )
+                counts["errors"] += 1
+            elif user["id"] in known_uuids:
+                counts["errors"] += 1
             else:
                 try:
-                    self.create_new_django_user(user)
-                except IntegrityError:
-                    count_errors += 1
+                    # uniqueness is checked against the loaded rows instead
+                    django_user.full_clean(validate_unique=False)
                 except ValidationError:
-                    count_errors += 1
+                    counts["errors"] += 1
                 else:
-                    count_new_users += 1
+                    users_by_email[django_user.email] = django_user
+                    known_usernames.add(django_user.username)
+                    known_uuids.add(user["id"])
+                    users_to_create.append(django_user)
+        return users_to_update, users_to_create
 
-        self.stdout.write(
-            f"\n{count_existing_users} utilisateurices déjà à jour sur secretariat."
-        )
-        self.stdout.write(f"{count_new_users} nouveaux users.")
-        self.stdout.write(self.style.ERROR(f"{count_errors} erreurs.\n"))
+    def get_user_batches(self, client, batch_size):
+        """
+        Yields `(next_offset, users)` batches of whole pages holding at least
+        `batch_size` users, except for the last one. `next_offset` is where
+        a resumed import starts once the batch is written.
+        """
+        batch = []
+        next_offset = self.checkpoint.users_offset
+        for offset, users_page in self.get_all_outline_users(client):
+            if len(batch) >= batch_size:
+                yield offset, batch
+                batch = []
+            batch += users_page
+            next_offset = offset + self.users_page_size
+        yield next_offset, batch
 
     def get_all_outline_users(self, client):
-        try:
-            offset = 0
-            limit = 25
-            users_page = None
-            while users_page != []:
-                users_page = client.list_users(offset=offset, limit=limit)
-                yield from users_page
-                offset += limit
-
-        except RemoteServerError:
-            self.stdout.write(self.style.ERROR("Cannot reach remote server."))
-            exit()
-
-    def create_new_django_user(self, outline_user):
-        django_user = User(
+        """
+        Yields `(offset, users)` pages from the checkpoint on, most recently
+        updated users first. In incremental mode, stops at the first user not
+        updated since the previous import.
+        """
+        since = self.checkpoint.since
+        for offset, users_page in client.iter_user_pages(
+            self.checkpoint.users_offset, self.users_page_size
+        ):
+            users = []
+            for user in users_page:
+                updated_at = parse_datetime(user["updatedAt"])
+                if since and updated_at < since:
+                    yield offset, users
+                    return
+                if (
+                    self.latest_user_update is None
+                    or updated_at > self.latest_user_update
+                ):
+                    self.latest_user_update = updated_at
+                users.append(user)
+            yield offset, users
+
+    def new_django_user(self, outline_user):
+        return User(
             username=outline_user["name"].replace(" ", "").lower(),
             first_name=outline_user["name"].split(" ")[0],
             last_name=" ".join(outline_user["name"].split(" ")[1:]),
             email=outline_user["email"],
             outline_uuid=outline_user["id"],
-            password=Faker("password"),
+            # accounts imported from Outline cannot log in with a password
+            password=make_password(None),
         )
-        try:
-            django_user.full_clean()
-            django_user.save()
-        except IntegrityError:
-            self.stdout.write(
-                self.style.ERROR(
-                    f"Impossible d'ajouter '{django_user.username}' car cet username existe déjà dans Django. Veuillez choisir un username différent ou supprimer le doublon avant de réessayer."
-                )
-            )
 
-    def get_all_outline_groups(self, client):
-        try:
-            offset = 0
-            limit = 25
-            groups_page = None
-            while groups_page != []:
-                groups_page = client.list_groups(offset=offset, limit=limit)
-                yield from groups_page
-                offset += limit
-
-        except RemoteServerError:
-            self.stdout.write(self.style.ERROR("Impossible d'atteindre le serveur."))
-            exit()
-
-    def import_orga_and_memberships(self, client):
-        self.stdout.write("Import des groupes ...")
-        known_group_names = set(
-            value[0] for value in Organisation.objects.values_list("name")
+    def get_all_outline_groups(self, client, workers=OUTLINE_CONCURRENCY):
+        """
+        Yields every group along with its members. Members are fetched for
+        `workers` groups at a time in the background, while the caller writes
+        the previous groups to the database.
+        """
+        groups = (
+            group
+            for _, page in client.iter_group_pages()
+            for group in page
+            if group["id"] not in self.checkpoint.groups_done
         )
-        known_group_uuids = set(
-            str(value[0])
-            for value in Organisation.objects.values_list("outline_group_uuid")
+        pipeline = FetchPipeline(
+            lambda group: list(client.client.list_group_users(group["id"])), workers
         )
-        count_existing_orgas, count_new_groups, count_errors = 0, 0, 0
+        yield from pipeline.run(groups)
 
-        for outline_group in self.get_all_outline_groups(client):
-            if str(outline_group["id"]) in known_group_uuids:
-                count_existing_orgas += 1
-                django_orga = Organisation.objects.get(
-                    outline_group_uuid=outline_group["id"]
-                )
-                prompt_already_existing = f'L\'organisation "{outline_group["name"]}" existe déjà sur secretariat.'
-
-                if django_orga.name != outline_group["name"]:
-                    django_orga.name = outline_group["name"]
-                    django_orga.save()
-
-            elif outline_group["name"] in known_group_names:
-                count_existing_orgas += 1
-                django_orga = Organisation.objects.get(name=outline_group["name"])
-
-                prompt_already_existing = f'L’orga "{outline_group["name"]}" existe déjà dans l’app secrétariat'
-                if str(django_orga.outline_group_uuid) != outline_group["id"]:
-                    if django_orga.outline_group_uuid is None:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"{prompt_already_existing}, sans UUID précisé. UUID copié depuis Outline."
-                            )
-                        )
-                        django_orga.outline_group_uuid = outline_group["id"]
-                        django_orga.save()
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f"{prompt_already_existing}. Les UUID ne correspondent pas (django: '{django_orga.outline_group_uuid}', outline: '{outline_group['id']}')."
-                            )
-                        )
-                        count_errors += 1
-            else:
-                try:
-                    django_orga = self.create_new_django_orga(outline_group)
-                    count_new_groups += 1
-                except IntegrityError:
-                    count_errors += 1
-
-            # then lists group members on django and outline
-
-            # we then prepare a set listing every member of the group in Django. We'll remove outline members.
-            # The remaining list should be empty. If not, users might have been removed directly in outline of here
-            # django users were not properly synced to outline
-            django_users_unaccounted_for = set(
-                value[0] for value in django_orga.members.values_list("username")
-            )
+    def get_group_batches(self, client, workers, batch_size):
+        """
+        Yields lists of `(group, members)` pairs holding at least `batch_size`
+        members, except for the last one.
+        """
+        batch, size = [], 0
+        for outline_group, outline_members in self.get_all_outline_groups(
+            client, workers
+        ):
+            batch.append((outline_group, outline_members))
+            size += len(outline_members) + 1
+            if size >= batch_size:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
 
-            # and get or create memberships for all users found in outline group
-            count_added_members = 0
-            for member in client.list_group_users(outline_group["id"]):
-                django_user = User.objects.get(outline_uuid=member["id"])
+    def import_orga_and_memberships(
+        self, client, workers=OUTLINE_CONCURRENCY, batch_size=IMPORT_BATCH_SIZE
+    ):
+        self.stdout.write("Import des groupes ...")
+        counter = QueryCounter()
+        counts = self.counts["groups"] = dict.fromkeys(("existing", "new", "errors"), 0)
+        # (username, organisation name) pairs, only as many as there are problems
+        django_users_unaccounted_for = []
 
-                try:
-                    membership, is_created = Membership.objects.get_or_create(
-                        user=django_user,
-                        organisation=django_orga,
-                        role="admin" if member["isAdmin"] else "member",
+        for batch in self.phases.iterate(
+            "groups.fetch", self.get_group_batches(client, workers, batch_size)
+        ):
+            # a failure rolls back this batch only, the checkpoint included
+            with transaction.atomic():
+                with counter:
+                    django_users_unaccounted_for += self.import_groups_batch(
+                        batch, counts, batch_size
                     )
-                    if is_created:
-                        membership.save()
-                        count_added_members += 1
-                    else:
-                        django_users_unaccounted_for.remove(django_user.username)
-                except Exception as exception:
-                    print("Exception : ", exception)
-
-            if count_added_members != 0:
-                print(
-                    f"{count_added_members} membres ajouté.es au groupe {django_orga.name}."
-                )
+                self.checkpoint.groups_done.update(group["id"] for group, _ in batch)
+                self.checkpoint.save()
 
         # Every member should be accounted for. Warn user otherwise
-        print(
-            len(django_users_unaccounted_for), "souci(s) de permissions après import."
+        self.stdout.write(
+            f"{len(django_users_unaccounted_for)} souci(s) de permissions après import."
         )
-        if len(django_users_unaccounted_for) != 0:
-            print("Veuillez vérifier/synchroniser les groupes des membres suivants :")
-            for extra_django_member in django_users_unaccounted_for:
-                print("   - ", extra_django_member)
+        if django_users_unaccounted_for:
+            self.stdout.write(
+                "Veuillez vérifier/synchroniser les groupes des membres suivants :"
+            )
+            for username, organisation_name in django_users_unaccounted_for:
+                self.stdout.write(f"   -  {username} ({organisation_name})")
 
         self.stdout.write(
-            f"\n{count_existing_orgas} organisations déjà à jour sur secretariat."
+            f"\n{counts['existing']} organisations déjà à jour sur secretariat."
         )
-        self.stdout.write(f"{count_new_groups} organisations créées.")
-        self.stdout.write(self.style.ERROR(f"{count_errors} erreurs."))
+        self.stdout.write(f"{counts['new']} organisations créées.")
+        self.stdout.write(self.style.ERROR(f"{counts['errors']} erreurs."))
+        self.stdout.write(f"{counter.count} requête(s) SQL pour les groupes.")
+
+    def import_groups_batch(self, batch, counts, batch_size):
+        with self.phases.phase("groups.match"):
+            memberships_to_create, django_users_unaccounted_for = self.match_groups(
+                batch, counts, batch_size
+            )
+        with self.phases.phase("memberships.write"):
+            Membership.objects.bulk_create(
+                (
+                    Membership(
+                        user_id=user_id, organisation_id=organisation_id, role=role
+                    )
+                    for user_id, organisation_id, role in memberships_to_create
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+        return django_users_unaccounted_for
+
+    def match_groups(self, batch, counts, batch_size):
+        """
+        Matches or creates the organisations of the batch. Returns the
+        memberships to create and the Django members missing from Outline.
+        """
+        group_ids = [outline_group["id"] for outline_group, _ in batch]
+        organisations_by_uuid, organisations_by_name = {}, {}
+        for orga in Organisation.objects.filter(
+            Q(outline_group_uuid__in=group_ids)
+            | Q(name__in=[outline_group["name"] for outline_group, _ in batch])
+        ).iterator(chunk_size=batch_size):
+            if orga.outline_group_uuid:
+                organisations_by_uuid[str(orga.outline_group_uuid)] = orga
+            organisations_by_name[orga.name] = orga
+        # memberships are reconciled against these maps, not row by row
+        user_ids_by_uuid = {
+            str(outline_uuid): user_id
+            for outline_uuid, user_id in User.objects.filter(
+                outline_uuid__in=set(
+                    member["id"] for _, members in batch for member in members
+                )
+            )
+            .values_list("outline_uuid", "id")
+            .iterator(chunk_size=batch_size)
+        }
+
+        groups = []
+        for outline_group, outline_members in batch:
+            django_orga = self.match_django_orga(
+                outline_group, organisations_by_uuid, organisations_by_name, counts
+            )
+            if django_orga is None:
+                continue
+            outline_member_roles = {}
+            for member in outline_members:
+                user_id = user_ids_by_uuid.get(str(member["id"]))
+                if user_id is None:
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"{member['name']} ({member['id']}) est membre de {django_orga.name} mais n'existe pas dans Django."
+                        )
+                    )
+                    counts["errors"] += 1
+                    continue
+                outline_member_roles[user_id] = (
+                    "admin" if member["isAdmin"] else "member"
+                )
+            groups.append((django_orga, outline_member_roles))
+
+        existing_memberships = set()
+        django_members = defaultdict(dict)
+        for user_id, organisation_id, role, username in (
+            Membership.objects.filter(
+                organisation__in=[django_orga.pk for django_orga, _ in groups]
+            )
+            .values_list("user_id", "organisation_id", "role", "user__username")
+            .iterator(chunk_size=batch_size)
+        ):
+            existing_memberships.add((user_id, organisation_id, role))
+            django_members[organisation_id][user_id] = username
+
+        memberships_to_create = []
+        django_users_unaccounted_for = []
+        for django_orga, outline_member_roles in groups:
+            missing_memberships = (
+                set(
+                    (user_id, django_orga.pk, role)
+                    for user_id, role in outline_member_roles.items()
+                )
+                - existing_memberships
+            )
+            existing_memberships |= missing_memberships
+            memberships_to_create += missing_memberships
+            if missing_memberships:
+                self.stdout.write(
+                    f"{len(missing_memberships)} membres ajouté.es au groupe {django_orga.name}."
+                )
+            # django members missing from the outline group: removed directly in
+            # outline, or never synced to it
+            django_users_unaccounted_for += [
+                (username, django_orga.name)
+                for user_id, username in sorted(django_members[django_orga.pk].items())
+                if user_id not in outline_member_roles
+            ]
+
+        return memberships_to_create, django_users_unaccounted_for
+
+    def match_django_orga(
+        self, outline_group, organisations_by_uuid, organisations_by_name, counts
+    ):
+        """
+        Returns the Django organisation of `outline_group`, created if needed,
+        or None when it cannot be matched.
+        """
+        if str(outline_group["id"]) in organisations_by_uuid:
+            counts["existing"] += 1
+            django_orga = organisations_by_uuid[str(outline_group["id"])]
+
+            if django_orga.name != outline_group["name"]:
+                django_orga.name = outline_group["name"]
+                django_orga.save(update_fields=["name"])
+            return django_orga
+
+        if outline_group["name"] in organisations_by_name:
+            counts["existing"] += 1
+            django_orga = organisations_by_name[outline_group["name"]]
+
+            prompt_already_existing = (
+                f'L’orga "{outline_group["name"]}" existe déjà dans l’app secrétariat'
+            )
+            if django_orga.outline_group_uuid is None:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{prompt_already_existing}, sans UUID précisé. UUID copié depuis Outline."
+                    )
+                )
+                django_orga.outline_group_uuid = outline_group["id"]
+                django_orga.save(update_fields=["outline_group_uuid"])
+            else:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{prompt_already_existing}. Les UUID ne correspondent pas (django: '{django_orga.outline_group_uuid}', outline: '{outline_group['id']}')."
+                    )
+                )
+                counts["errors"] += 1
+            return django_orga
+
+        try:
+            django_orga = self.create_new_django_orga(outline_group)
+        except (IntegrityError, ValidationError):
+            counts["errors"] += 1
+            return None
+        organisations_by_name[django_orga.name] = django_orga
+        counts["new"] += 1
+        return django_orga
 
     def create_new_django_orga(self, outline_group):
         django_orga = Organisation(
@@ -213,15 +592,18 @@ class Command(BaseCommand):
             outline_group_uuid=outline_group["id"],
         )
         try:
-            django_orga.full_clean()
-            django_orga.save()
-        except IntegrityError:
+            # the batch lookup already matched existing names and UUIDs
+            django_orga.full_clean(validate_unique=False)
+            # a savepoint keeps the batch transaction usable after an error
+            with transaction.atomic():
+                django_orga.save()
+        except (IntegrityError, ValidationError):
             self.stdout.write(
                 self.style.ERROR(
-                    f"Impossible d'ajouter '{outline_group.name}' car ce groupe existe déjà dans Django. Veuillez choisir un nom de groupe différent ou supprimer le doublon avant de réessayer."
+                    f"Impossible d'ajouter '{outline_group['name']}' car ce groupe existe déjà dans Django. Veuillez choisir un nom de groupe différent ou supprimer le doublon avant de réessayer."
                 )
             )
-        else:
-            self.stdout.write(f"Création du groupe {django_orga.name}.")
+            raise
+        self.stdout.write(f"Création du groupe {django_orga.name}.")
 
         return django_orga
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from secretariat.utils.outline_mirror import (
+    last_refresh,
+    memberships_missing_from_outline,
+    outline_memberships_missing_from_django,
+    outline_users_missing_from_django,
+    users_missing_from_outline,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare Django à la copie locale d'Outline, sans appel à l'API."
+
+    def report(self, title, lines):
+        lines = list(lines)
+        self.stdout.write(f"\n{title} : {len(lines)}")
+        for line in lines:
+            self.stdout.write(f"   - {line}")
+
+    def handle(self, *args, **options):
+        refreshed_at = last_refresh()
+        if refreshed_at is None:
+            self.stdout.write(
+                self.style.ERROR(
+                    "La copie d'Outline est vide : lancez d'abord refresh-outline-mirror."
+                )
+            )
+            return
+        self.stdout.write(f"Copie d'Outline du {refreshed_at:%d/%m/%Y %H:%M}.")
+
+        self.report(
+            "Dans Django mais pas dans Outline",
+            (f"{user} ({user.email})" for user in users_missing_from_outline()),
+        )
+        self.report(
+            "Dans Outline mais pas dans Django",
+            (
+                f"{user} ({user.email})"
+                for user in outline_users_missing_from_django().order_by("name")
+            ),
+        )
+        self.report(
+            "Membres absents du groupe Outline",
+            (
+                f"{membership.user} dans « {membership.organisation} »"
+                for membership in memberships_missing_from_outline()
+            ),
+        )
+        self.report(
+            "Membres du groupe Outline absents de Django",
+            (
+                f"{membership.user} dans « {membership.group} »"
+                for membership in outline_memberships_missing_from_django()
+            ),
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from config.settings import OUTLINE_CONCURRENCY
+from secretariat.utils.metrics import diff_snapshots, metrics, summary_lines
+from secretariat.utils.outline import Client as OutlineClient
+from secretariat.utils.outline import RemoteServerError
+from secretariat.utils.outline_mirror import refresh_mirror
+
+
+class Command(BaseCommand):
+    help = (
+        "Recopie les utilisateurices, groupes et membres des groupes d'Outline en base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre maximal de requêtes simultanées vers Outline.",
+        )
+
+    def handle(self, *args, **options):
+        metrics_before = metrics.snapshot()
+        try:
+            counts = refresh_mirror(OutlineClient(), options["concurrency"])
+        except RemoteServerError:
+            self.stdout.write(self.style.ERROR("Impossible d'atteindre le serveur."))
+            return
+
+        self.stdout.write(
+            f"{counts['users']} utilisateurices, {counts['groups']} groupes et "
+            f"{counts['memberships']} membres de groupes copiés."
+        )
+        for line in summary_lines(diff_snapshots(metrics_before, metrics.snapshot())):
+            self.stdout.write(line)
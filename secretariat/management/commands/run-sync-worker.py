@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from config.settings import (
+    OUTLINE_CONCURRENCY,
+    OUTLINE_SYNC_BATCH_SIZE,
+    OUTLINE_SYNC_LEASE_SECONDS,
+    OUTLINE_SYNC_MAX_ATTEMPTS,
+    OUTLINE_SYNC_POLL_INTERVAL,
+)
+from secretariat.utils.sync_worker import SyncWorker
+
+
+class Command(BaseCommand):
+    help = "Traite les tâches de synchronisation vers Outline en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre d'appels simultanés à Outline.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=OUTLINE_SYNC_BATCH_SIZE,
+            help="Nombre de tâches réservées à chaque tour.",
+        )
+        parser.add_argument(
+            "--lease",
+            type=float,
+            default=OUTLINE_SYNC_LEASE_SECONDS,
+            help="Durée (en secondes) au bout de laquelle une tâche réservée peut être reprise.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=OUTLINE_SYNC_MAX_ATTEMPTS,
+            help="Nombre d'essais avant qu'une tâche soit marquée en échec.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=OUTLINE_SYNC_POLL_INTERVAL,
+            help="Attente (en secondes) quand aucune tâche n'est disponible.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="S'arrête dès qu'il n'y a plus de tâche disponible.",
+        )
+
+    def handle(self, *args, **options):
+        worker = SyncWorker(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            lease_seconds=options["lease"],
+            max_attempts=options["max_attempts"],
+        )
+        while True:
+            jobs = worker.claim()
+            if not jobs:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            failures = worker.process(jobs)
+            self.stdout.write(
+                f"{len(jobs) - len(failures)} tâche(s) terminée(s), {len(failures)} en échec."
+            )
+            for job in jobs:
+                if job.pk in failures:
+                    self.stdout.write(
+                        self.style.ERROR(f"Échec de « {job} » : {failures[job.pk]}")
+                    )
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from config.settings import OUTLINE_CONCURRENCY
+from secretariat.models import Organisation, SyncRun
+from secretariat.utils.metrics import diff_snapshots, metrics, summary_lines
+from secretariat.utils.outline import Client as OutlineClient
+from secretariat.utils.outline_mirror import MirroredOutlineState
+from secretariat.utils.sync_journal import SyncJournal
+from secretariat.utils.sync_plan import SyncExecutor, SyncPlanner
+
+
+class Command(BaseCommand):
+    help = "Synchronise les organisations (groupes et membres) vers Outline."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--organisation",
+            type=int,
+            action="append",
+            dest="organisations",
+            help="Identifiant d'une organisation à synchroniser (toutes par défaut).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Affiche les opérations prévues sans les appliquer.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=OUTLINE_CONCURRENCY,
+            help="Nombre d'appels simultanés à Outline.",
+        )
+        parser.add_argument(
+            "--mirror",
+            action="store_true",
+            help="Compare avec la copie locale d'Outline (refresh-outline-mirror) au lieu de relire l'API.",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="RUN_ID",
+            help="Reprend une synchronisation interrompue sans refaire les opérations déjà appliquées.",
+        )
+
+    def handle(self, *args, **options):
+        organisations = Organisation.objects.order_by("name")
+        if options["organisations"]:
+            organisations = organisations.filter(pk__in=options["organisations"])
+
+        client = OutlineClient()
+        metrics_before = metrics.snapshot()
+
+        outline_state = MirroredOutlineState() if options["mirror"] else None
+        journal = None
+        if options["resume"]:
+            try:
+                journal, plan = SyncJournal.resume(options["resume"])
+            except SyncRun.DoesNotExist:
+                raise CommandError(
+                    f"Synchronisation n°{options['resume']} introuvable."
+                )
+            self.stdout.write(
+                f"Reprise de la synchronisation n°{journal.run.pk} : "
+                f"{len(plan.operations)} opération(s) restante(s)."
+            )
+        else:
+            plan = SyncPlanner(client, outline_state).plan(organisations)
+        estimate = plan.estimated_api_calls()
+
+        if options["dry_run"]:
+            for line in plan.describe():
+                self.stdout.write(line)
+            self.stdout.write(
+                f"\n{len(plan.operations)} opération(s) prévue(s), environ {estimate['total']} appel(s) à l'API Outline "
+                f"({estimate['create_group']} création(s) de groupe, {estimate['invite']} invitation(s) groupée(s), "
+                f"{estimate['add']} ajout(s), {estimate['remove']} retrait(s))."
+            )
+            return
+
+        journal = journal or SyncJournal.start(plan)
+        result = SyncExecutor(client, options["workers"], journal).execute(plan)
+        journal.finish(result)
+        if outline_state:
+            outline_state.record(plan, result.done)
+        for operation, error in result.errors:
+            self.stdout.write(self.style.ERROR(f"Échec de {operation.key} : {error}"))
+
+        self.stdout.write(
+            f"Synchronisation n°{journal.run.pk} : {len(result.done)} opération(s) appliquée(s)."
+        )
+        self.stdout.write(self.style.ERROR(f"{len(result.errors)} erreurs."))
+        for line in summary_lines(diff_snapshots(metrics_before, metrics.snapshot())):
+            self.stdout.write(line)
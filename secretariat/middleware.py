@@ -0,0 +1,26 @@
+import logging
+
+from config.settings import QUERY_REPEAT_THRESHOLD
+from secretariat.utils.queries import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class RepeatedQueriesMiddleware:
+    """
+    Logs the SQL statements a request runs at least `QUERY_REPEAT_THRESHOLD`
+    times, to spot N+1 patterns while developing. Only enabled with DEBUG.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder:
+            response = self.get_response(request)
+        for statement, count in recorder.repeated(QUERY_REPEAT_THRESHOLD):
+            logger.warning(
+                "%s %s : %s× %s", request.method, request.path, count, statement
+            )
+        return response
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0008_alter_organisation_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "target",
+                    models.CharField(
+                        choices=[
+                            ("user", "Utilisateur/rice"),
+                            ("organisation", "Organisation"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "En attente"),
+                            ("running", "En cours"),
+                            ("done", "Terminée"),
+                            ("failed", "Échouée"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("lease_expires_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "tâche de synchronisation",
+                "verbose_name_plural": "tâches de synchronisation",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "available_at"],
+                        name="secretariat_status_4005b4_idx",
+                    )
+                ],
+            },
+        ),
+    ]
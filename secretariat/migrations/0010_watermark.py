@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0009_syncjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Watermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "point de reprise",
+                "verbose_name_plural": "points de reprise",
+            },
+        ),
+    ]
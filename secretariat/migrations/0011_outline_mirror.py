@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0010_watermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutlineGroup",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255)),
+                ("fetched_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "groupe Outline (copie)",
+                "verbose_name_plural": "groupes Outline (copie)",
+            },
+        ),
+        migrations.CreateModel(
+            name="OutlineUser",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255)),
+                ("email", models.EmailField(blank=True, max_length=254)),
+                ("is_admin", models.BooleanField(default=False)),
+                ("is_suspended", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(blank=True, null=True)),
+                ("fetched_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "utilisateur/rice Outline (copie)",
+                "verbose_name_plural": "utilisateurices Outline (copie)",
+            },
+        ),
+        migrations.CreateModel(
+            name="OutlineGroupMembership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fetched_at", models.DateTimeField()),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="secretariat.outlinegroup",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="secretariat.outlineuser",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "membre de groupe Outline (copie)",
+                "verbose_name_plural": "membres de groupes Outline (copie)",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="outlinegroupmembership",
+            constraint=models.UniqueConstraint(
+                fields=("group", "user"), name="unique_outline_group_membership"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0011_outline_mirror"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="membership",
+            index=models.Index(fields=["start_date"], name="membership_start_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="membership",
+            index=models.Index(fields=["end_date"], name="membership_end_date_idx"),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0012_membership_date_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "En cours ou interrompue"),
+                            ("done", "Terminée"),
+                            ("failed", "Terminée avec des erreurs"),
+                        ],
+                        default="running",
+                        max_length=10,
+                    ),
+                ),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("resumed_count", models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "synchronisation",
+                "verbose_name_plural": "synchronisations",
+            },
+        ),
+        migrations.CreateModel(
+            name="SyncOperation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100)),
+                ("kind", models.CharField(max_length=15)),
+                ("organisation_id", models.PositiveIntegerField(blank=True, null=True)),
+                ("user_id", models.PositiveIntegerField(blank=True, null=True)),
+                ("user_uuid", models.CharField(blank=True, max_length=36)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("planned", "Prévue"),
+                            ("done", "Appliquée"),
+                            ("failed", "Échouée"),
+                        ],
+                        default="planned",
+                        max_length=10,
+                    ),
+                ),
+                ("error", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="operations",
+                        to="secretariat.syncrun",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "opération de synchronisation",
+                "verbose_name_plural": "opérations de synchronisation",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="syncoperation",
+            constraint=models.UniqueConstraint(
+                fields=("run", "key"), name="unique_operation_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0013_sync_journal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncrun",
+            name="checkpoint",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="syncrun",
+            name="kind",
+            field=models.CharField(
+                choices=[("sync", "Synchronisation"), ("import", "Import")],
+                default="sync",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("secretariat", "0014_syncrun_import_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="watermark",
+            name="checkpoint",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
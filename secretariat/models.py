@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import CheckConstraint, F, Q
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -18,24 +19,61 @@ class User(AbstractUser):
     def organisations(self):
         return Organisation.objects.filter(membership__user=self)
 
-    def synchronize_to_outline(self):
+    def synchronize_to_outline(self, client=None):
+        from secretariat.utils.outline import Client as OutlineClient
+        from secretariat.utils.sync_plan import SyncExecutor, SyncPlanner
+
+        client = client or OutlineClient()
+
+        # only send the group changes missing from the user's outline groups
+        plan = SyncPlanner(client).plan_users([self])
+        SyncExecutor(client).execute(plan).raise_first_error()
+
+    @classmethod
+    def invite_many_to_outline(cls, users, client=None):
+        """
+        Creates Outline accounts for `users` with batched invitations, links
+        users who already have an account by email, and saves every new
+        `outline_uuid` with a single `bulk_update`. Raises `InvitationFailed`
+        listing the users found in neither, once the others are saved.
+        """
         from secretariat.utils.outline import Client as OutlineClient
         from secretariat.utils.outline import InvitationFailed
 
-        client = OutlineClient()
+        client = client or OutlineClient()
+        users = list(
+            {user.pk: user for user in users if not user.outline_uuid}.values()
+        )
+
+        uuids_by_email = client.invite_many_to_outline(users)
+        for user in users:
+            user.outline_uuid = uuids_by_email.get(user.email.lower())
 
-        if not self.outline_uuid:
-            try:
-                self.outline_uuid = client.invite_to_outline(self)
-                self.save()
-            except InvitationFailed:
-                outline_user = client.find_user_from_email(self.email)
-                self.outline_uuid = outline_user["id"]
-                self.save()
+        # invitations are silently skipped for existing Outline accounts
+        existing_users = client.find_users_from_emails(
+            [user.email for user in users if not user.outline_uuid]
+        )
+        unresolved = []
+        for user in users:
+            if not user.outline_uuid:
+                existing_user = existing_users.get(user.email.lower())
+                if existing_user is None:
+                    unresolved.append(user)
+                else:
+                    user.outline_uuid = existing_user["id"]
 
-        for group in self.organisations:
-            if group.outline_group_uuid:
-                client.add_to_outline_group(self.outline_uuid, group.outline_group_uuid)
+        # accounts just created on Outline are linked even if others failed
+        cls.objects.bulk_update(
+            [user for user in users if user.outline_uuid], ["outline_uuid"]
+        )
+        if unresolved:
+            raise InvitationFailed(
+                None,
+                "Comptes Outline introuvables : "
+                + ", ".join(user.email for user in unresolved),
+                users=unresolved,
+            )
+        return users
 
 
 class Organisation(models.Model):
@@ -51,51 +89,47 @@ class Organisation(models.Model):
     def members(self):
         return User.objects.filter(membership__organisation=self)
 
-    def synchronize_to_outline(self):
+    def synchronize_to_outline(self, client=None):
         from secretariat.utils.outline import Client as OutlineClient
-        from secretariat.utils.outline import GroupCreationFailed
-
-        client = OutlineClient()
-
-        if not self.outline_group_uuid:
-            try:
-                self.outline_group_uuid = client.create_new_group(self.name)
-                self.save()
-            except GroupCreationFailed:
-                outline_user = client.find_group_by_name(self.name)
-                self.outline_group_uuid = outline_user["id"]
-                self.save()
-
-        # create users on outline when needed
-        for new_member in self.members.filter(outline_uuid__isnull=True):
-            new_member.synchronize_to_outline()
-
-        # find users which already are in the group on outline side:
-        # no need to add them again
-        user_uuids_in_outline_group = set(
-            user.get("id") for user in client.list_group_users(self.outline_group_uuid)
-        )
+        from secretariat.utils.sync_journal import SyncJournal
+        from secretariat.utils.sync_plan import SyncExecutor, SyncPlanner
 
-        # add outline users to outline group when possible and needed
-        for new_member in self.members.filter(outline_uuid__isnull=False).exclude(
-            outline_uuid__in=user_uuids_in_outline_group
-        ):
-            client.add_to_outline_group(
-                new_member.outline_uuid, self.outline_group_uuid
-            )
+        client = client or OutlineClient()
 
-        # remove users from outline group which are not in django group
-        user_uuids_in_django_group = set(
-            str(value[0]) for value in self.members.values_list("outline_uuid")
-        )
-        user_uuids_to_remove_from_outline_group = (
-            user_uuids_in_outline_group - user_uuids_in_django_group
-        )
-        for uuid in user_uuids_to_remove_from_outline_group:
-            client.remove_from_outline_group(uuid, self.outline_group_uuid)
+        # compare django and outline memberships once, then apply the difference
+        plan = SyncPlanner(client).plan([self])
+        journal = SyncJournal.start(plan)
+        result = SyncExecutor(client, journal=journal).execute(plan)
+        journal.finish(result)
+        result.raise_first_error()
+
+
+def active_membership(day=None, prefix=""):
+    """
+    Condition on memberships in effect on `day` (today by default):
+    start <= day < end. `prefix` reaches them through a relation, e.g.
+    "membership__".
+    """
+    day = day or timezone.localdate()
+    return (
+        Q(**{f"{prefix}start_date__isnull": True})
+        | Q(**{f"{prefix}start_date__lte": day})
+    ) & (Q(**{f"{prefix}end_date__isnull": True}) | Q(**{f"{prefix}end_date__gt": day}))
+
+
+class MembershipQuerySet(models.QuerySet):
+    def active(self, day=None):
+        """Memberships in effect on `day` (today by default): start <= day < end."""
+        return self.filter(active_membership(day))
+
+    def changing_on(self, day):
+        """Memberships starting or ending on `day`, found through the date indexes."""
+        return self.filter(Q(start_date=day) | Q(end_date=day))
 
 
 class Membership(models.Model):
+    objects = MembershipQuerySet.as_manager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE)
     role = models.CharField(max_length=15)
@@ -109,6 +143,10 @@ class Membership(models.Model):
                 name="start_must_be_before_end",
             ),
         ]
+        indexes = [
+            models.Index(fields=["start_date"], name="membership_start_date_idx"),
+            models.Index(fields=["end_date"], name="membership_end_date_idx"),
+        ]
 
     def clean(self):
         if self.start_date is not None and self.end_date is not None:
@@ -118,3 +156,239 @@ class Membership(models.Model):
                         "end_date": "La date de fin ne peut pas être avant la date de début."
                     }
                 )
+
+
+class SyncJob(models.Model):
+    """
+    Outbox entry asking for a user or an organisation to be synchronized to
+    Outline. Jobs are written in the same transaction as the changes they
+    follow, and drained by the `run-sync-worker` command.
+    """
+
+    USER = "user"
+    ORGANISATION = "organisation"
+    TARGET_CHOICES = [
+        (USER, "Utilisateur/rice"),
+        (ORGANISATION, "Organisation"),
+    ]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "En attente"),
+        (RUNNING, "En cours"),
+        (DONE, "Terminée"),
+        (FAILED, "Échouée"),
+    ]
+
+    target = models.CharField(max_length=15, choices=TARGET_CHOICES)
+    object_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "tâche de synchronisation"
+        verbose_name_plural = "tâches de synchronisation"
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_target_display()} n°{self.object_id}"
+
+    @classmethod
+    def enqueue(cls, target, object_ids):
+        """Adds a pending job for each object that does not have one yet."""
+        object_ids = set(object_ids)
+        already_pending = set(
+            cls.objects.filter(
+                target=target, object_id__in=object_ids, status=cls.PENDING
+            ).values_list("object_id", flat=True)
+        )
+        return cls.objects.bulk_create(
+            cls(target=target, object_id=object_id)
+            for object_id in sorted(object_ids - already_pending)
+        )
+
+
+class Watermark(models.Model):
+    """Most recent point reached by an incremental job, such as an import."""
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+    # progress past `value`, for a job stopped partway; cleared when the mark moves
+    checkpoint = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "point de reprise"
+        verbose_name_plural = "points de reprise"
+
+    def __str__(self):
+        return f"{self.name} : {self.value}"
+
+    @classmethod
+    def get_value(cls, name):
+        return cls.objects.filter(name=name).values_list("value", flat=True).first()
+
+    @classmethod
+    def advance(cls, name, value):
+        """Moves the mark forward; it never goes back."""
+        watermark, created = cls.objects.get_or_create(
+            name=name, defaults={"value": value}
+        )
+        if not created and value > watermark.value:
+            watermark.value = value
+            watermark.checkpoint = {}
+            watermark.save(update_fields=["value", "checkpoint", "updated_at"])
+        return watermark
+
+    @classmethod
+    def get_checkpoint(cls, name):
+        checkpoint = (
+            cls.objects.filter(name=name).values_list("checkpoint", flat=True).first()
+        )
+        return checkpoint or {}
+
+    @classmethod
+    def save_checkpoint(cls, name, value, checkpoint):
+        """Records `checkpoint`, creating the mark at `value` if it does not exist yet."""
+        watermark, created = cls.objects.get_or_create(
+            name=name, defaults={"value": value, "checkpoint": checkpoint}
+        )
+        if not created:
+            watermark.checkpoint = checkpoint
+            watermark.save(update_fields=["checkpoint", "updated_at"])
+        return watermark
+
+
+class OutlineUser(models.Model):
+    """Copy of an Outline user, as of `fetched_at`."""
+
+    id = models.UUIDField(primary_key=True)
+    name = models.CharField(max_length=255)
+    email = models.EmailField(blank=True)
+    is_admin = models.BooleanField(default=False)
+    is_suspended = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "utilisateur/rice Outline (copie)"
+        verbose_name_plural = "utilisateurices Outline (copie)"
+
+    def __str__(self):
+        return self.name
+
+
+class OutlineGroup(models.Model):
+    """Copy of an Outline group, as of `fetched_at`."""
+
+    id = models.UUIDField(primary_key=True)
+    name = models.CharField(max_length=255)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "groupe Outline (copie)"
+        verbose_name_plural = "groupes Outline (copie)"
+
+    def __str__(self):
+        return self.name
+
+
+class OutlineGroupMembership(models.Model):
+    """Copy of an Outline group membership, as of `fetched_at`."""
+
+    group = models.ForeignKey(OutlineGroup, on_delete=models.CASCADE)
+    user = models.ForeignKey(OutlineUser, on_delete=models.CASCADE)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "membre de groupe Outline (copie)"
+        verbose_name_plural = "membres de groupes Outline (copie)"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["group", "user"], name="unique_outline_group_membership"
+            ),
+        ]
+
+
+class SyncRun(models.Model):
+    """
+    A synchronization to Outline, with the journal of its operations, or an
+    import from Outline, with the checkpoint it resumes from.
+    """
+
+    SYNC = "sync"
+    IMPORT = "import"
+    KIND_CHOICES = [
+        (SYNC, "Synchronisation"),
+        (IMPORT, "Import"),
+    ]
+
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (RUNNING, "En cours ou interrompue"),
+        (DONE, "Terminée"),
+        (FAILED, "Terminée avec des erreurs"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=SYNC)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    resumed_count = models.PositiveSmallIntegerField(default=0)
+    checkpoint = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "synchronisation"
+        verbose_name_plural = "synchronisations"
+
+    def __str__(self):
+        return (
+            f"{self.get_kind_display()} n°{self.pk} du {self.started_at:%d/%m/%Y %H:%M}"
+        )
+
+
+class SyncOperation(models.Model):
+    """An Outline call planned by a `SyncRun`, identified by its idempotency key."""
+
+    PLANNED = "planned"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PLANNED, "Prévue"),
+        (DONE, "Appliquée"),
+        (FAILED, "Échouée"),
+    ]
+
+    run = models.ForeignKey(
+        SyncRun, on_delete=models.CASCADE, related_name="operations"
+    )
+    key = models.CharField(max_length=100)
+    kind = models.CharField(max_length=15)
+    organisation_id = models.PositiveIntegerField(null=True, blank=True)
+    user_id = models.PositiveIntegerField(null=True, blank=True)
+    user_uuid = models.CharField(max_length=36, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PLANNED)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "opération de synchronisation"
+        verbose_name_plural = "opérations de synchronisation"
+        constraints = [
+            models.UniqueConstraint(fields=["run", "key"], name="unique_operation_key"),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,552 @@
+"""
+In-process, stateful stand-in for the Outline API.
+
+It implements the endpoints used by `secretariat.utils.outline.Client` with
+real offset pagination, and can inject latency, errors and throttling. Run it
+as an HTTP server on localhost and point the app at it:
+
+    python -m secretariat.tests.fake_outline --users 50000 --groups 2000 --port 8765
+    OUTLINE_URL=http://127.0.0.1:8765 python manage.py import-from-outline
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+MAX_LIMIT = 100
+
+
+class OutlineError(Exception):
+    def __init__(self, status, error, message):
+        self.status = status
+        self.error = error
+        self.message = message
+
+
+def now_iso(moment=None):
+    moment = moment or datetime.now(timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class FakeOutlineState:
+    """In-memory users, groups and group memberships."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = {}
+        self.user_ids_by_email = {}
+        self.groups = {}
+        self.group_ids_by_name = {}
+        self.memberships = {}
+        self._sorted_users = {}
+
+    def add_user(self, name, email, is_admin=False, updated_at=None):
+        with self.lock:
+            user_id = str(uuid.uuid4())
+            moment = now_iso(updated_at)
+            self.users[user_id] = {
+                "id": user_id,
+                "name": name,
+                "email": email,
+                "avatarUrl": None,
+                "color": "#2BC2FF",
+                "isAdmin": is_admin,
+                "isSuspended": False,
+                "isViewer": False,
+                "createdAt": moment,
+                "updatedAt": moment,
+                "lastActiveAt": None,
+            }
+            self.user_ids_by_email[email.lower()] = user_id
+            self._sorted_users.clear()
+            return self.users[user_id]
+
+    def delete_user(self, user_id):
+        with self.lock:
+            user = self.users.pop(user_id, None)
+            if user is None:
+                raise OutlineError(404, "not_found", "Resource not found")
+            self.user_ids_by_email.pop(user["email"].lower(), None)
+            for group_id, members in self.memberships.items():
+                if members.pop(user_id, None) is not None:
+                    self.groups[group_id]["memberCount"] -= 1
+            self._sorted_users.clear()
+
+    def add_group(self, name):
+        with self.lock:
+            if name in self.group_ids_by_name:
+                raise OutlineError(
+                    400,
+                    "validation_error",
+                    "The name of this group is already in use (isUniqueNameInTeam)",
+                )
+            group_id = str(uuid.uuid4())
+            moment = now_iso()
+            self.groups[group_id] = {
+                "id": group_id,
+                "name": name,
+                "memberCount": 0,
+                "createdAt": moment,
+                "updatedAt": moment,
+            }
+            self.group_ids_by_name[name] = group_id
+            self.memberships[group_id] = {}
+            return self.groups[group_id]
+
+    def delete_group(self, group_id):
+        with self.lock:
+            group = self.get_group(group_id)
+            del self.group_ids_by_name[group["name"]]
+            del self.groups[group_id]
+            del self.memberships[group_id]
+
+    def get_user(self, user_id):
+        try:
+            return self.users[str(user_id)]
+        except KeyError:
+            raise OutlineError(404, "not_found", "Resource not found")
+
+    def get_group(self, group_id):
+        try:
+            return self.groups[str(group_id)]
+        except KeyError:
+            raise OutlineError(404, "not_found", "Resource not found")
+
+    def add_member(self, group_id, user_id):
+        with self.lock:
+            group = self.get_group(group_id)
+            self.get_user(user_id)
+            members = self.memberships[group["id"]]
+            if user_id not in members:
+                members[user_id] = True
+                group["memberCount"] += 1
+
+    def remove_member(self, group_id, user_id):
+        with self.lock:
+            group = self.get_group(group_id)
+            self.get_user(user_id)
+            if self.memberships[group["id"]].pop(user_id, None) is not None:
+                group["memberCount"] -= 1
+
+    def sorted_users(self, sort, direction):
+        key = (sort, direction)
+        if key not in self._sorted_users:
+            self._sorted_users[key] = sorted(
+                self.users.values(),
+                key=lambda user: (user.get(sort) or "", user["id"]),
+                reverse=direction == "DESC",
+            )
+        return self._sorted_users[key]
+
+    def populate(self, users=0, groups=0, members_per_group=0, seed=0):
+        """Fills the state with a synthetic directory."""
+        randomizer = random.Random(seed)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        with self.lock:
+            user_ids = []
+            for index in range(users):
+                user = self.add_user(
+                    f"Agent {index}",
+                    f"agent.{index}@fictif.pour.test.gouv.fr",
+                    updated_at=start + timedelta(minutes=index),
+                )
+                user_ids.append(user["id"])
+            for index in range(groups):
+                group = self.add_group(f"Groupe {index}")
+                for user_id in randomizer.sample(
+                    user_ids, min(members_per_group, len(user_ids))
+                ):
+                    self.add_member(group["id"], user_id)
+
+
+class FakeOutlineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately: avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.outline
+        length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(length) if length else b""
+        endpoint = self.path.rsplit("/", 1)[-1]
+
+        status, payload, headers = server.handle(
+            endpoint, raw_body, self.headers.get("Authorization")
+        )
+
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOutlineServer:
+    """
+    HTTP server for `FakeOutlineState`.
+
+    - `latency`: seconds added to every response, or a dict by endpoint;
+    - `error_rate` / `error_status`: random server errors;
+    - `rate_limit`: requests per second above which 429s are answered;
+    - `fail_next(endpoint, status, count)`: deterministic failures.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        token=None,
+        latency=0,
+        error_rate=0,
+        error_status=503,
+        rate_limit=None,
+        seed=0,
+    ):
+        self.state = FakeOutlineState()
+        self.token = token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.failures = {}
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), FakeOutlineHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.outline = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/api"
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def populate(self, *args, **kwargs):
+        self.state.populate(*args, **kwargs)
+        return self
+
+    def fail_next(self, endpoint, status=503, count=1):
+        with self._lock:
+            self.failures[endpoint] = (status, count)
+
+    def _injected_failure(self, endpoint):
+        with self._lock:
+            if endpoint in self.failures:
+                status, count = self.failures[endpoint]
+                if count <= 1:
+                    del self.failures[endpoint]
+                else:
+                    self.failures[endpoint] = (status, count - 1)
+                return status
+            if self.rate_limit:
+                second, count = self._window
+                current = int(time.monotonic())
+                count = count + 1 if second == current else 1
+                self._window = (current, count)
+                if count > self.rate_limit:
+                    return 429
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.error_status
+        return None
+
+    def handle(self, endpoint, raw_body, authorization):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+        latency = self.latency
+        if isinstance(latency, dict):
+            latency = latency.get(endpoint, 0)
+        if latency:
+            time.sleep(latency)
+
+        if self.token and authorization != f"Bearer {self.token}":
+            return 401, error_payload(401, "authentication_required", ""), {}
+
+        failure = self._injected_failure(endpoint)
+        if failure == 429:
+            return (
+                429,
+                error_payload(429, "rate_limit_exceeded", ""),
+                {"Retry-After": "1"},
+            )
+        if failure:
+            return failure, error_payload(failure, "internal_error", ""), {}
+
+        view = getattr(self, f"api_{endpoint.replace('.', '_')}", None)
+        if view is None:
+            return 404, error_payload(404, "not_found", "Resource not found"), {}
+        try:
+            body = json.loads(raw_body or b"{}")
+            return 200, dict(view(body), status=200, ok=True), {}
+        except OutlineError as error:
+            return (
+                error.status,
+                error_payload(error.status, error.error, error.message),
+                {},
+            )
+        except (ValueError, TypeError, KeyError) as error:
+            return 400, error_payload(400, "validation_error", str(error)), {}
+
+    # API endpoints
+
+    def _page(self, items, body):
+        offset = int(body.get("offset", 0))
+        limit = int(body.get("limit", 25))
+        if limit > MAX_LIMIT:
+            raise OutlineError(400, "validation_error", "limit: Must be <= 100")
+        return items[offset : offset + limit], {"offset": offset, "limit": limit}
+
+    def api_users_list(self, body):
+        state = self.state
+        with state.lock:
+            users = state.sorted_users(
+                body.get("sort", "updatedAt"), body.get("direction", "DESC")
+            )
+            if body.get("emails"):
+                emails = {email.lower() for email in body["emails"]}
+                users = [user for user in users if user["email"].lower() in emails]
+            if body.get("query"):
+                query = body["query"].lower()
+                users = [
+                    user
+                    for user in users
+                    if query in user["name"].lower() or query in user["email"].lower()
+                ]
+            if body.get("filter") == "suspended":
+                users = [user for user in users if user["isSuspended"]]
+            elif body.get("filter") == "active":
+                users = [user for user in users if not user["isSuspended"]]
+            page, pagination = self._page(users, body)
+            return {"data": [dict(user) for user in page], "pagination": pagination}
+
+    def api_users_info(self, body):
+        with self.state.lock:
+            return {"data": dict(self.state.get_user(body["id"]))}
+
+    def api_users_invite(self, body):
+        sent, users = [], []
+        with self.state.lock:
+            for invite in body["invites"]:
+                if "@" not in invite["email"]:
+                    raise OutlineError(400, "validation_error", "email: Invalid email")
+                if invite["email"].lower() in self.state.user_ids_by_email:
+                    continue
+                user = self.state.add_user(invite["name"], invite["email"])
+                sent.append(invite)
+                users.append(dict(user))
+        return {"data": {"sent": sent, "users": users}}
+
+    def api_users_delete(self, body):
+        self.state.delete_user(body["id"])
+        return {"success": True}
+
+    def api_groups_list(self, body):
+        state = self.state
+        with state.lock:
+            groups = list(state.groups.values())
+            if body.get("userId"):
+                groups = [
+                    group
+                    for group in groups
+                    if body["userId"] in state.memberships[group["id"]]
+                ]
+            sort = body.get("sort", "updatedAt")
+            groups.sort(
+                key=lambda group: (group.get(sort) or "", group["id"]),
+                reverse=body.get("direction", "DESC") == "DESC",
+            )
+            page, pagination = self._page(groups, body)
+            return {
+                "data": {
+                    "groups": [dict(group) for group in page],
+                    "groupMemberships": [],
+                },
+                "pagination": pagination,
+            }
+
+    def api_groups_info(self, body):
+        with self.state.lock:
+            return {"data": dict(self.state.get_group(body["id"]))}
+
+    def api_groups_create(self, body):
+        if not body.get("name"):
+            raise OutlineError(400, "validation_error", "name: Required")
+        return {"data": dict(self.state.add_group(body["name"]))}
+
+    def api_groups_delete(self, body):
+        self.state.delete_group(body["id"])
+        return {"success": True}
+
+    def _membership_payload(self, group_id, user_id):
+        return {
+            "id": f"{user_id}-{group_id}",
+            "groupId": group_id,
+            "userId": user_id,
+            "user": dict(self.state.users[user_id]),
+        }
+
+    def api_groups_add_user(self, body):
+        state = self.state
+        with state.lock:
+            state.add_member(str(body["id"]), str(body["userId"]))
+            return {
+                "data": {
+                    "users": [dict(state.get_user(body["userId"]))],
+                    "groups": [dict(state.get_group(body["id"]))],
+                    "groupMemberships": [
+                        self._membership_payload(str(body["id"]), str(body["userId"]))
+                    ],
+                }
+            }
+
+    def api_groups_remove_user(self, body):
+        state = self.state
+        with state.lock:
+            state.remove_member(str(body["id"]), str(body["userId"]))
+            return {
+                "data": {
+                    "groups": [dict(state.get_group(body["id"]))],
+                }
+            }
+
+    def api_groups_memberships(self, body):
+        state = self.state
+        with state.lock:
+            group = state.get_group(body["id"])
+            members = state.memberships[group["id"]]
+            user_ids = list(members)
+            if body.get("query"):
+                query = body["query"].lower()
+                user_ids = [
+                    user_id
+                    for user_id in user_ids
+                    if query in state.users[user_id]["name"].lower()
+                ]
+            page, pagination = self._page(user_ids, body)
+            return {
+                "data": {
+                    "users": [dict(state.users[user_id]) for user_id in page],
+                    "groupMemberships": [
+                        self._membership_payload(group["id"], user_id)
+                        for user_id in page
+                    ],
+                },
+                "pagination": pagination,
+            }
+
+
+def error_payload(status, error, message):
+    return {"ok": False, "error": error, "status": status, "message": message}
+
+
+@contextmanager
+def use_fake_outline(server):
+    """
+    Points every `Client` at `server`, disables the process-wide rate limiter
+    and uses a fresh circuit breaker, so code building its own clients talks
+    to the fake server.
+    """
+    from secretariat.utils.circuit_breaker import CircuitBreaker
+    from secretariat.utils.outline import Client
+    from secretariat.utils.scheduler import RequestScheduler
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(Client, "api_url", server.api_url))
+        stack.enter_context(
+            mock.patch(
+                "secretariat.utils.scheduler._shared_scheduler",
+                RequestScheduler(rate=0, backoff_base=0.01),
+            )
+        )
+        stack.enter_context(
+            mock.patch(
+                "secretariat.utils.circuit_breaker._shared_breaker", CircuitBreaker()
+            )
+        )
+        yield server
+
+
+class FakeOutlineTestCase:
+    """Test case mixin: every `Client` talks to a fresh fake server, `self.server`."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeOutlineServer().start()
+        self.addCleanup(self.server.stop)
+        self.enterContext(use_fake_outline(self.server))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token", default=None)
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--groups", type=int, default=0)
+    parser.add_argument("--members-per-group", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    server = FakeOutlineServer(
+        host=options.host,
+        port=options.port,
+        token=options.token,
+        latency=options.latency,
+        error_rate=options.error_rate,
+        rate_limit=options.rate_limit,
+        seed=options.seed,
+    )
+    server.populate(
+        options.users, options.groups, options.members_per_group, options.seed
+    )
+    print(f"Fake Outline listening on {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -54,6 +54,57 @@ def invite_response_ok():
     )
 
 
+def invite_response_many_ok():
+    return json_response(
+        200,
+        """{
+    "data": {
+        "sent": [
+            {
+                "email": "tarik.ota@test.gouv.fr",
+                "name": "Tarik Ota",
+                "role": "member"
+            },
+            {
+                "email": "ada.lovelace@test.gouv.fr",
+                "name": "Ada Lovelace",
+                "role": "member"
+            }
+        ],
+        "users": [
+            {
+                "id": "26985a73-9fc5-4c31-839c-51304daf2628",
+                "name": "Tarik Ota",
+                "avatarUrl": null,
+                "color": "#2BC2FF",
+                "isAdmin": false,
+                "isSuspended": false,
+                "isViewer": false,
+                "createdAt": "2023-10-24T14:45:51.889Z",
+                "updatedAt": "2023-10-24T14:45:51.889Z",
+                "lastActiveAt": null
+            },
+            {
+                "id": "36985a73-9fc5-4c31-839c-51304daf2628",
+                "name": "Ada Lovelace",
+                "email": "Ada.Lovelace@test.gouv.fr",
+                "avatarUrl": null,
+                "color": "#2BC2FF",
+                "isAdmin": false,
+                "isSuspended": false,
+                "isViewer": false,
+                "createdAt": "2023-10-24T14:45:51.889Z",
+                "updatedAt": "2023-10-24T14:45:51.889Z",
+                "lastActiveAt": null
+            }
+        ]
+    },
+    "status": 200,
+    "ok": true
+}""",
+    )
+
+
 def invite_response_already_invited():
     return json_response(
         200,
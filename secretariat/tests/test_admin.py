@@ -1,13 +1,20 @@
-from django.test import TestCase, tag
+from datetime import timedelta
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory, TestCase, tag
+from django.utils import timezone
 
 from secretariat.admin import (
+    ActiveMembersFilter,
     OrganisationAdmin,
     OrganisationSynchronizedWithOutlineFilter,
     SynchronizedWithOutlineFilter,
+    UnsyncedMembersFilter,
     UserAdmin,
 )
 from secretariat.models import Organisation, User
 from secretariat.tests.factories import (
+    MembershipFactory,
     OrganisationFactory,
     OrganisationSynchronizedWithOutlineFactory,
     UserFactory,
@@ -76,3 +83,59 @@ class OutlineSyncFilterTests(TestCase):
         )
         self.assertEqual(2, queryset_unsynchronized.count())
         self.assertIsNone(queryset_unsynchronized[0].outline_uuid)
+
+
+@tag("admin")
+class OrganisationMemberCountsTests(TestCase):
+    def setUp(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.busy = OrganisationFactory(name="Occupée")
+        MembershipFactory(organisation=self.busy)
+        MembershipFactory(
+            organisation=self.busy, user=UserSynchronizedWithOutlineFactory()
+        )
+        MembershipFactory(organisation=self.busy, end_date=yesterday)
+        self.former = OrganisationFactory(name="Ancienne")
+        MembershipFactory(
+            organisation=self.former,
+            user=UserSynchronizedWithOutlineFactory(),
+            start_date=yesterday - timedelta(days=1),
+            end_date=yesterday,
+        )
+        self.empty = OrganisationFactory(name="Vide")
+        self.model_admin = OrganisationAdmin(Organisation, site)
+        self.request = RequestFactory().get("/")
+
+    def test_counts_are_annotated(self):
+        counts = {
+            orga.name: (
+                orga.members_count,
+                orga.active_members_count,
+                orga.unsynced_members_count,
+            )
+            for orga in self.model_admin.get_queryset(self.request)
+        }
+        self.assertEqual(
+            counts,
+            {"Occupée": (3, 2, 1), "Ancienne": (1, 0, 0), "Vide": (0, 0, 0)},
+        )
+
+    def test_counts_are_sortable(self):
+        queryset = self.model_admin.get_queryset(self.request)
+        self.assertEqual(
+            [orga.name for orga in queryset.order_by("-members_count", "name")],
+            ["Occupée", "Ancienne", "Vide"],
+        )
+
+    def test_counts_filters(self):
+        queryset = self.model_admin.get_queryset(self.request)
+        active_filter = ActiveMembersFilter(
+            None, {"active_members": "non"}, Organisation, OrganisationAdmin
+        )
+        self.assertEqual(
+            set(active_filter.queryset(None, queryset)), {self.former, self.empty}
+        )
+        unsynced_filter = UnsyncedMembersFilter(
+            None, {"unsynced_members": "oui"}, Organisation, OrganisationAdmin
+        )
+        self.assertEqual(list(unsynced_filter.queryset(None, queryset)), [self.busy])
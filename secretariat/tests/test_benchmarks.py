@@ -0,0 +1,135 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import skipUnless
+
+import django
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, tag
+from django.urls import reverse
+
+from secretariat.models import Membership, User
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineServer, use_fake_outline
+from secretariat.utils.queries import QueryCounter
+
+# comma-separated directory sizes, e.g. "1000,10000,100000"
+BENCHMARK_SIZES = [
+    int(size) for size in os.getenv("BENCHMARK_SIZES", "").split(",") if size
+]
+BENCHMARK_OUTPUT = os.getenv("BENCHMARK_OUTPUT", "benchmark-results.json")
+BENCHMARK_USERS_PER_GROUP = int(os.getenv("BENCHMARK_USERS_PER_GROUP", 50))
+BENCHMARK_MEMBERS_PER_GROUP = int(os.getenv("BENCHMARK_MEMBERS_PER_GROUP", 25))
+
+
+@tag("benchmark")
+@skipUnless(BENCHMARK_SIZES, "Set BENCHMARK_SIZES to run the benchmarks")
+class ScaleBenchmark(TestCase):
+    """
+    Imports, synchronisations and admin pages against a synthetic directory
+    served by the fake Outline server, for each size of `BENCHMARK_SIZES`.
+    Wall time, SQL queries, Outline API calls and peak Python memory (from
+    tracemalloc, which slows the run down) are written to `BENCHMARK_OUTPUT`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        with open(BENCHMARK_OUTPUT, "w") as output:
+            json.dump(
+                {
+                    "date": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "database": connection.vendor,
+                    "users_per_group": BENCHMARK_USERS_PER_GROUP,
+                    "members_per_group": BENCHMARK_MEMBERS_PER_GROUP,
+                    "results": cls.results,
+                },
+                output,
+                indent=2,
+            )
+        super().tearDownClass()
+
+    @contextmanager
+    def measure(self, scenario, size, server=None):
+        counter = QueryCounter()
+        if server:
+            server.calls.clear()
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with counter:
+                yield
+        finally:
+            seconds = time.perf_counter() - started
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.results.append(
+            {
+                "scenario": scenario,
+                "users": size,
+                "seconds": round(seconds, 3),
+                "queries": counter.count,
+                "api_calls": sum(server.calls.values()) if server else 0,
+                "peak_memory": peak_memory,
+            }
+        )
+
+    def test_scale(self):
+        for size in BENCHMARK_SIZES:
+            with self.subTest(users=size), transaction.atomic():
+                server = FakeOutlineServer().start()
+                try:
+                    with use_fake_outline(server):
+                        self.run_scenarios(server, size)
+                finally:
+                    server.stop()
+                # every size starts from an empty database
+                transaction.set_rollback(True)
+
+    def run_scenarios(self, server, size):
+        server.populate(
+            users=size,
+            groups=max(size // BENCHMARK_USERS_PER_GROUP, 1),
+            members_per_group=BENCHMARK_MEMBERS_PER_GROUP,
+        )
+
+        with self.measure("import-from-outline", size, server):
+            call_command("import-from-outline", "--full", stdout=StringIO())
+        self.assertEqual(User.objects.count(), size)
+
+        with self.measure("import-from-outline (up to date)", size, server):
+            call_command("import-from-outline", "--full", stdout=StringIO())
+
+        # a new organisation whose members all have to be added in Outline
+        organisation = OrganisationFactory(name="Organisation mesurée")
+        Membership.objects.bulk_create(
+            MembershipFactory.build(user=user, organisation=organisation)
+            for user in User.objects.order_by("pk")[: max(size // 10, 1)]
+        )
+        with self.measure("Organisation.synchronize_to_outline", size, server):
+            organisation.synchronize_to_outline()
+
+        self.client.force_login(
+            UserFactory(username="benchmark.admin", is_staff=True, is_superuser=True)
+        )
+        for model in ("user", "organisation"):
+            url = reverse(f"admin:secretariat_{model}_changelist")
+            with self.measure(f"admin {model} changelist", size):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
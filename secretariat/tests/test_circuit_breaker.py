@@ -0,0 +1,111 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+import secretariat.tests.outline_mocks as mocks
+from secretariat.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from secretariat.utils.outline import (
+    CircuitOpen,
+    Client,
+    OutlineUnreachable,
+    RemoteServerError,
+)
+from secretariat.utils.scheduler import RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def server_error_response():
+    response = mock.MagicMock()
+    response.status_code = 502
+    return response
+
+
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5,
+            minimum_calls=4,
+            window=60,
+            open_seconds=30,
+            clock=self.clock,
+        )
+
+    def test_opens_when_failure_rate_is_reached(self):
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_old_failures_are_forgotten(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 61
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_probe(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now = 31
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request(), "only one probe at a time")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.clock.now = 62
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+
+class TestClientWithCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(minimum_calls=2, open_seconds=30)
+        self.client = Client(
+            scheduler=RequestScheduler(rate=0, max_retries=0),
+            breaker=self.breaker,
+        )
+
+    @mock.patch("requests.Session.post")
+    def test_fails_fast_when_open(self, mock_post):
+        mock_post.return_value = server_error_response()
+        for _ in range(2):
+            with self.assertRaises(RemoteServerError):
+                self.client.list_users()
+
+        mock_post.reset_mock()
+        with self.assertRaises(CircuitOpen):
+            self.client.list_users()
+        self.assertFalse(mock_post.called, "no request should be sent")
+
+    @mock.patch("requests.Session.post")
+    def test_timeouts_count_as_failures(self, mock_post):
+        mock_post.side_effect = requests.Timeout("read timed out")
+        for _ in range(2):
+            with self.assertRaises(OutlineUnreachable):
+                self.client.list_users()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    @mock.patch("requests.Session.post")
+    def test_client_errors_do_not_open_the_circuit(self, mock_post):
+        mock_post.return_value = mocks.group_creation_ko_already_exists()
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                self.client.create_new_group("Déjà là")
+        self.assertEqual(self.breaker.state, CLOSED)
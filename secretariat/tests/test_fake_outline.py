@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase
+
+from secretariat.tests.factories import UserFactory
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.circuit_breaker import CircuitBreaker
+from secretariat.utils.outline import (
+    Client,
+    GroupCreationFailed,
+    InvitationFailed,
+    RemoteServerError,
+)
+from secretariat.utils.scheduler import RequestScheduler
+
+
+class TestFakeOutlineServer(FakeOutlineTestCase, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(
+            scheduler=RequestScheduler(rate=0, max_retries=2, backoff_base=0.01),
+            breaker=CircuitBreaker(),
+        )
+
+    def test_users_list_is_paginated(self):
+        self.server.populate(users=60)
+        emails = [
+            user["email"]
+            for offset in range(0, 75, 25)
+            for user in self.client.list_users(offset=offset, limit=25)
+        ]
+        self.assertEqual(len(emails), 60)
+        self.assertEqual(len(set(emails)), 60)
+        self.assertEqual(self.client.list_users(offset=75), [])
+
+    def test_invite_then_find_by_email(self):
+        user = UserFactory.build()
+        user_uuid = self.client.invite_to_outline(user)
+        self.assertEqual(self.client.find_user_from_email(user.email)["id"], user_uuid)
+
+        with self.assertRaises(InvitationFailed):
+            self.client.invite_to_outline(user)
+
+    def test_groups_and_memberships(self):
+        self.server.populate(users=40)
+        group_uuid = self.client.create_new_group("Opérateur")
+        with self.assertRaises(GroupCreationFailed):
+            self.client.create_new_group("Opérateur")
+
+        users = self.client.list_users(limit=40)
+        for user in users:
+            self.client.add_to_outline_group(user["id"], group_uuid)
+        self.client.remove_from_outline_group(users[0]["id"], group_uuid)
+
+        members = list(self.client.list_group_users(group_uuid))
+        self.assertEqual(len(members), 39)
+        self.assertEqual(self.client.find_group_by_name("Opérateur")["id"], group_uuid)
+
+    def test_error_injection_is_retried_on_list_calls(self):
+        self.server.populate(users=1)
+        self.server.fail_next("users.list", status=503, count=2)
+        self.assertEqual(len(self.client.list_users()), 1)
+        self.assertEqual(self.server.calls["users.list"], 3)
+
+        self.server.fail_next("users.list", status=502, count=5)
+        with self.assertRaises(RemoteServerError):
+            self.client.list_users()
@@ -1,8 +1,19 @@
-from django.core.management import call_command
+import json
+import os
+import pstats
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command, load_command_class
+from django.db import IntegrityError
 from django.test import TestCase
 
-from secretariat.models import Membership, Organisation, User
+from secretariat.models import Membership, Organisation, SyncRun, User, Watermark
 from secretariat.tests.factories import OrganisationFactory, UserFactory
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.circuit_breaker import CircuitBreaker
 from secretariat.utils.outline import Client as OutlineClient
 
 
@@ -77,3 +88,204 @@ class TestSynchronizationCommand(TestCase):
 
         self.outline_client.remove_user_from_outline(outline_user)
         self.outline_client.delete_group_from_outline(outline_group)
+
+
+class TestImportCommandWithFakeOutline(FakeOutlineTestCase, TestCase):
+    def test_import_users_groups_and_memberships(self):
+        self.server.populate(users=30, groups=3, members_per_group=10)
+
+        call_command("import-from-outline", stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Organisation.objects.count(), 3)
+        self.assertEqual(Membership.objects.count(), 30)
+
+    def test_incremental_import_stops_at_the_watermark(self):
+        self.server.populate(users=30, groups=1, members_per_group=5)
+        call_command("import-from-outline", "--concurrency", "1", stdout=StringIO())
+        self.assertEqual(
+            Watermark.get_value("import-from-outline:users"),
+            datetime(2023, 1, 1, 0, 29, tzinfo=timezone.utc),
+        )
+
+        self.server.state.add_user(
+            "Agent Nouveau",
+            "agent.nouveau@fictif.pour.test.gouv.fr",
+            updated_at=datetime(2023, 2, 1, tzinfo=timezone.utc),
+        )
+        self.server.calls.clear()
+        call_command("import-from-outline", "--concurrency", "1", stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 31)
+        self.assertEqual(self.server.calls["users.list"], 1)
+        self.assertEqual(
+            Watermark.get_value("import-from-outline:users"),
+            datetime(2023, 2, 1, tzinfo=timezone.utc),
+        )
+
+        self.server.calls.clear()
+        call_command(
+            "import-from-outline", "--concurrency", "1", "--full", stdout=StringIO()
+        )
+        # 31 users: a full page, then a short one that ends the listing
+        self.assertEqual(self.server.calls["users.list"], 2)
+
+    def test_import_retries_from_its_checkpoint(self):
+        self.server.populate(users=30, groups=1, members_per_group=5)
+        # more failures than the scheduler retries on its own
+        self.server.fail_next("users.list", 503, count=6)
+        stdout = StringIO()
+
+        call_command("import-from-outline", "--concurrency", "1", stdout=stdout)
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertIn("nouvel essai", stdout.getvalue())
+        self.assertEqual(SyncRun.objects.get(kind=SyncRun.IMPORT).status, SyncRun.DONE)
+
+    def test_import_waits_for_an_open_circuit(self):
+        self.server.populate(users=5, groups=1, members_per_group=2)
+        now = [0]
+        breaker = CircuitBreaker(open_seconds=30, clock=lambda: now[0])
+        breaker._open(now[0])
+
+        def sleep(delay):
+            now[0] += delay
+
+        with mock.patch(
+            "secretariat.utils.circuit_breaker._shared_breaker", breaker
+        ), mock.patch("time.sleep", side_effect=sleep) as mock_sleep:
+            call_command(
+                "import-from-outline",
+                "--concurrency",
+                "1",
+                "--max-retries",
+                "1",
+                stdout=StringIO(),
+            )
+
+        self.assertGreaterEqual(mock_sleep.call_args.args[0], 30)
+        self.assertEqual(User.objects.count(), 5)
+
+    def test_interrupted_import_is_resumed(self):
+        self.server.populate(users=30, groups=3, members_per_group=5)
+        self.server.fail_next("groups.memberships", 503, count=5)
+
+        with self.assertRaisesMessage(CommandError, "--resume"):
+            call_command(
+                "import-from-outline",
+                "--workers",
+                "1",
+                "--max-retries",
+                "0",
+                stdout=StringIO(),
+            )
+
+        run = SyncRun.objects.get(kind=SyncRun.IMPORT)
+        self.assertEqual(run.status, SyncRun.FAILED)
+        self.assertTrue(run.checkpoint["users_done"])
+        self.assertEqual(User.objects.count(), 30)
+
+        self.server.calls.clear()
+        call_command("import-from-outline", "--resume", str(run.pk), stdout=StringIO())
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, SyncRun.DONE)
+        self.assertEqual(run.resumed_count, 1)
+        self.assertEqual(self.server.calls["users.list"], 0)
+        self.assertEqual(Organisation.objects.count(), 3)
+        self.assertEqual(Membership.objects.count(), 15)
+
+    def test_users_are_written_in_batches(self):
+        self.server.populate(users=40, groups=1, members_per_group=5)
+        UserFactory(email="agent.3@fictif.pour.test.gouv.fr")
+        stdout = StringIO()
+
+        call_command("import-from-outline", "--batch-size", "10", stdout=stdout)
+
+        self.assertEqual(User.objects.filter(outline_uuid__isnull=False).count(), 40)
+        self.assertIn("1 UUID Outline ajoutés.", stdout.getvalue())
+        self.assertIn("39 nouveaux users.", stdout.getvalue())
+        self.assertIn("8 requête(s) SQL pour les utilisateurices.", stdout.getvalue())
+
+    def test_failed_batch_is_rolled_back_alone(self):
+        self.server.populate(users=60, groups=1, members_per_group=5)
+        command = load_command_class("secretariat", "import-from-outline")
+        import_users_batch = type(command).import_users_batch
+
+        def fail_on_second_batch(command, outline_users, *args):
+            if User.objects.exists():
+                # the rows written so far are rolled back along with the batch
+                import_users_batch(command, outline_users, *args)
+                raise IntegrityError("interrupted")
+            import_users_batch(command, outline_users, *args)
+
+        with mock.patch.object(
+            type(command),
+            "import_users_batch",
+            autospec=True,
+            side_effect=fail_on_second_batch,
+        ):
+            with self.assertRaises(IntegrityError):
+                call_command(command, "--batch-size", "20", stdout=StringIO())
+
+        run = SyncRun.objects.get(kind=SyncRun.IMPORT)
+        self.assertEqual(run.status, SyncRun.FAILED)
+        self.assertEqual(run.checkpoint["users_offset"], 25)
+        self.assertEqual(User.objects.count(), 25)
+
+    def test_import_reports_its_phases(self):
+        self.server.populate(users=30, groups=2, members_per_group=5)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        report_path = os.path.join(directory.name, "import.json")
+        profile_path = os.path.join(directory.name, "import.prof")
+        stdout = StringIO()
+
+        call_command(
+            "import-from-outline",
+            "--report-json",
+            report_path,
+            "--profile",
+            profile_path,
+            stdout=stdout,
+        )
+
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["status"], SyncRun.DONE)
+        self.assertEqual(report["counts"]["users"]["new"], 30)
+        self.assertEqual(report["counts"]["groups"]["new"], 2)
+        self.assertEqual(
+            set(report["phases"]),
+            {
+                "users.fetch",
+                "users.match",
+                "users.write",
+                "groups.fetch",
+                "groups.match",
+                "memberships.write",
+            },
+        )
+        self.assertEqual(
+            report["outline"]["endpoints"]["groups.memberships"]["calls"],
+            self.server.calls["groups.memberships"],
+        )
+        self.assertIn("users.write : ", stdout.getvalue())
+        self.assertGreater(pstats.Stats(profile_path).total_calls, 0)
+
+    def test_memberships_are_reconciled_in_bulk(self):
+        self.server.populate(users=40, groups=4, members_per_group=10)
+        call_command("import-from-outline", stdout=StringIO())
+        organisation = Organisation.objects.get(name="Groupe 0")
+        extra_member = User.objects.exclude(membership__organisation=organisation)[0]
+        Membership.objects.create(
+            user=extra_member, organisation=organisation, role="member"
+        )
+        stdout = StringIO()
+
+        call_command("import-from-outline", "--full", stdout=stdout)
+
+        self.assertEqual(Membership.objects.count(), 41)
+        self.assertIn("1 souci(s) de permissions après import.", stdout.getvalue())
+        self.assertIn(f"{extra_member.username} (Groupe 0)", stdout.getvalue())
+        self.assertIn("3 requête(s) SQL pour les groupes.", stdout.getvalue())
@@ -0,0 +1,168 @@
+import itertools
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from secretariat.models import Membership, SyncJob, Watermark
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.membership_expiry import EXPIRY_WATERMARK, MembershipExpiry
+from secretariat.utils.outline import Client
+from secretariat.utils.sync_plan import ADD, INVITE, REMOVE
+
+
+class TestMembershipExpiry(FakeOutlineTestCase, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        Watermark.advance(
+            EXPIRY_WATERMARK,
+            timezone.make_aware(
+                datetime.combine(self.today - timedelta(days=2), datetime.min.time())
+            ),
+        )
+
+        self.organisation = OrganisationFactory()
+        self.group = self.server.state.add_group(self.organisation.name)
+        self.organisation.outline_group_uuid = self.group["id"]
+        self.organisation.save()
+
+    def outline_member(self, user):
+        user.outline_uuid = self.server.state.add_user(str(user), user.email)["id"]
+        user.save()
+        self.server.state.add_member(self.group["id"], str(user.outline_uuid))
+        return user
+
+    def test_started_and_ended_memberships_are_applied(self):
+        leaving = self.outline_member(UserFactory())
+        MembershipFactory(
+            user=leaving,
+            organisation=self.organisation,
+            start_date=self.today - timedelta(days=30),
+            end_date=self.yesterday,
+        )
+        renewed = self.outline_member(UserFactory())
+        MembershipFactory(
+            user=renewed, organisation=self.organisation, end_date=self.yesterday
+        )
+        MembershipFactory(
+            user=renewed, organisation=self.organisation, start_date=self.yesterday
+        )
+        arriving = UserFactory()
+        MembershipFactory(
+            user=arriving, organisation=self.organisation, start_date=self.today
+        )
+        MembershipFactory.create_batch(5, organisation=self.organisation)
+        expiry = MembershipExpiry(self.client)
+
+        with self.assertNumQueries(2):
+            plan = expiry.plan_day(self.yesterday)
+        self.assertEqual(
+            [(operation.kind, operation.user_id) for operation in plan.operations],
+            [(REMOVE, leaving.pk), (ADD, renewed.pk)],
+        )
+
+        result = expiry.run()
+
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.days, [self.yesterday, self.today])
+        self.assertIn(
+            (INVITE, arriving.pk), [(op.kind, op.user_id) for op in result.done]
+        )
+        arriving.refresh_from_db()
+        self.assertEqual(
+            set(self.server.state.memberships[self.group["id"]]),
+            {str(renewed.outline_uuid), str(arriving.outline_uuid)},
+        )
+        self.assertEqual(list(expiry.pending_days()), [])
+
+    def test_budget_leaves_the_rest_for_the_next_run(self):
+        MembershipFactory(
+            user=self.outline_member(UserFactory()),
+            organisation=self.organisation,
+            end_date=self.yesterday,
+        )
+
+        result = MembershipExpiry(self.client, budget=-1).run()
+
+        self.assertTrue(result.out_of_time)
+        self.assertEqual(result.days, [])
+        self.assertEqual(self.server.calls["groups.remove_user"], 0)
+        self.assertEqual(
+            list(MembershipExpiry(self.client).pending_days()),
+            [self.yesterday, self.today],
+        )
+
+    def test_runs_resume_after_the_groups_already_handled(self):
+        organisations = [self.organisation]
+        for _ in range(2):
+            organisation = OrganisationFactory()
+            organisation.outline_group_uuid = self.server.state.add_group(
+                organisation.name
+            )["id"]
+            organisation.save()
+            organisations.append(organisation)
+        for organisation in organisations:
+            user = UserFactory()
+            user.outline_uuid = self.server.state.add_user(str(user), user.email)["id"]
+            user.save()
+            self.server.state.add_member(
+                str(organisation.outline_group_uuid), str(user.outline_uuid)
+            )
+            MembershipFactory(
+                user=user, organisation=organisation, end_date=self.yesterday
+            )
+
+        results = []
+        for _ in organisations:
+            # the clock moves by one second per check: one group per run
+            clock = itertools.count().__next__
+            results.append(MembershipExpiry(self.client, budget=1, clock=clock).run())
+
+        self.assertEqual(
+            [result.out_of_time for result in results], [True, True, False]
+        )
+        self.assertEqual(results[-1].days, [self.yesterday, self.today])
+        self.assertEqual(self.server.calls["groups.remove_user"], 3)
+        for organisation in organisations:
+            self.assertEqual(
+                self.server.state.memberships[str(organisation.outline_group_uuid)],
+                {},
+            )
+        self.assertEqual(list(MembershipExpiry(self.client).pending_days()), [])
+        self.assertEqual(Watermark.get_checkpoint(EXPIRY_WATERMARK), {})
+
+    def test_failed_operations_are_queued_and_the_days_move_on(self):
+        leaving = self.outline_member(UserFactory())
+        MembershipFactory(
+            user=leaving, organisation=self.organisation, end_date=self.yesterday
+        )
+        self.server.fail_next("groups.remove_user", 500)
+
+        result = MembershipExpiry(self.client).run()
+
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn(
+            str(leaving.outline_uuid), self.server.state.memberships[self.group["id"]]
+        )
+        self.assertEqual(result.days, [self.yesterday, self.today])
+        self.assertEqual(list(MembershipExpiry(self.client).pending_days()), [])
+        job = SyncJob.objects.get()
+        self.assertEqual((job.target, job.object_id), (SyncJob.USER, leaving.pk))
+        self.assertEqual(result.queued, [job])
+
+    def test_active_memberships(self):
+        MembershipFactory(end_date=self.today)
+        MembershipFactory(start_date=self.today + timedelta(days=1))
+        current = MembershipFactory(start_date=self.today)
+        always = MembershipFactory()
+
+        self.assertEqual(set(Membership.objects.active()), {current, always})
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+import secretariat.tests.outline_mocks as mocks
+from secretariat.models import User
+from secretariat.tests.factories import UserFactory
+from secretariat.utils.metrics import OutlineMetrics, diff_snapshots, metrics
+from secretariat.utils.outline import Client
+from secretariat.utils.phases import PhaseRecorder
+from secretariat.utils.scheduler import RequestScheduler
+
+
+class TestOutlineMetrics(SimpleTestCase):
+    def test_record_and_render_prometheus(self):
+        outline_metrics = OutlineMetrics()
+        outline_metrics.record("users.list", 200, 0.07, 120, 2000)
+        outline_metrics.record("users.list", 503, 3, 120, 50)
+
+        snapshot = outline_metrics.snapshot()["users.list"]
+        self.assertEqual(snapshot["calls"], 2)
+        self.assertEqual(snapshot["status_codes"], {"200": 1, "503": 1})
+        self.assertEqual(snapshot["bytes_received"], 2050)
+
+        exposition = outline_metrics.render_prometheus()
+        self.assertIn(
+            'outline_api_requests_total{endpoint="users.list",status="503"} 1',
+            exposition,
+        )
+        self.assertIn(
+            'outline_api_request_duration_seconds_bucket{endpoint="users.list",le="0.1"} 1',
+            exposition,
+        )
+        self.assertIn(
+            'outline_api_request_duration_seconds_bucket{endpoint="users.list",le="+Inf"} 2',
+            exposition,
+        )
+
+    @mock.patch("requests.Session.post")
+    def test_client_calls_are_recorded(self, mock_post):
+        mock_post.return_value = mocks.list_response_ok()
+        before = metrics.snapshot()
+
+        Client(scheduler=RequestScheduler(rate=0)).list_users()
+
+        diff = diff_snapshots(before, metrics.snapshot())
+        self.assertEqual(diff["users.list"]["calls"], 1)
+
+
+class TestPhaseRecorder(TestCase):
+    def test_phases_add_up_time_and_queries(self):
+        ticks = iter([0, 1, 10, 12, 20, 20.5, 21, 21.5])
+        phases = PhaseRecorder(clock=lambda: next(ticks))
+
+        with phases.phase("users.match"):
+            list(User.objects.all())
+        with phases.phase("users.match"):
+            pass
+        self.assertEqual(list(phases.iterate("users.fetch", ["page"])), ["page"])
+
+        self.assertEqual(
+            phases.as_dict(),
+            {
+                "users.match": {"seconds": 3, "queries": 1, "entries": 2},
+                "users.fetch": {"seconds": 1.0, "queries": 0, "entries": 2},
+            },
+        )
+        self.assertEqual(
+            phases.summary_lines()[0], "users.match : 3.00 s, 1 requête(s) SQL"
+        )
+
+
+class TestOutlineStatusViews(TestCase):
+    def test_status_page_is_for_staff_only(self):
+        response = self.client.get(reverse("outline_status"))
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(UserFactory(is_staff=True))
+        response = self.client.get(reverse("outline_status"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Appels par endpoint")
+
+    def test_prometheus_endpoint(self):
+        response = self.client.get(reverse("outline_metrics"))
+        self.assertEqual(response.status_code, 403)
+
+        with mock.patch("secretariat.views.OUTLINE_METRICS_TOKEN", "s3cr3t"):
+            response = self.client.get(
+                reverse("outline_metrics"), HTTP_AUTHORIZATION="Bearer s3cr3t"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "# TYPE outline_api_requests_total counter", response.content.decode()
+        )
+
+        with mock.patch("secretariat.views.OUTLINE_METRICS_TOKEN", "s3cr3t"):
+            response = self.client.get(
+                reverse("outline_metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+            )
+        self.assertEqual(response.status_code, 403)
+
+        with mock.patch("secretariat.views.OUTLINE_METRICS_TOKEN", ""):
+            response = self.client.get(
+                reverse("outline_metrics"), HTTP_AUTHORIZATION="Bearer "
+            )
+        self.assertEqual(response.status_code, 403)
@@ -1,5 +1,5 @@
 from datetime import date, timedelta
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from django.db.utils import IntegrityError
 from django.test import TestCase
@@ -10,6 +10,7 @@ from secretariat.tests.factories import (
     OrganisationFactory,
     UserFactory,
 )
+from secretariat.utils.outline import InvitationFailed
 
 
 class TestMembership(TestCase):
@@ -56,6 +57,46 @@ class TestMembership(TestCase):
                 "organisation.outline_group_uuid should be the one returned by Outline after first sync",
             )
 
+    def test_invite_many_to_outline(self):
+        new_uuid = "26985a73-9fc5-4c31-839c-51304daf2628"
+        existing_uuid = "36985a73-9fc5-4c31-839c-51304daf2628"
+        new_user = UserFactory(email="New.User@fictif.gouv.fr")
+        existing_user = UserFactory()
+        client = MagicMock()
+        client.invite_many_to_outline.return_value = {
+            "new.user@fictif.gouv.fr": new_uuid
+        }
+        client.find_users_from_emails.return_value = {
+            existing_user.email: {"id": existing_uuid}
+        }
+
+        with self.assertNumQueries(1):
+            User.invite_many_to_outline([new_user, existing_user], client)
+
+        client.invite_many_to_outline.assert_called_once_with([new_user, existing_user])
+        client.find_users_from_emails.assert_called_once_with([existing_user.email])
+        new_user.refresh_from_db()
+        existing_user.refresh_from_db()
+        self.assertEqual(str(new_user.outline_uuid), new_uuid)
+        self.assertEqual(str(existing_user.outline_uuid), existing_uuid)
+
+    def test_invite_many_to_outline_saves_the_users_it_resolved(self):
+        new_uuid = "26985a73-9fc5-4c31-839c-51304daf2628"
+        new_user = UserFactory(email="new.user@fictif.gouv.fr")
+        lost_user = UserFactory(email="lost.user@fictif.gouv.fr")
+        client = MagicMock()
+        client.invite_many_to_outline.return_value = {new_user.email: new_uuid}
+        client.find_users_from_emails.return_value = {}
+
+        with self.assertRaises(InvitationFailed) as raised:
+            User.invite_many_to_outline([new_user, lost_user], client)
+
+        self.assertEqual(raised.exception.users, [lost_user])
+        new_user.refresh_from_db()
+        lost_user.refresh_from_db()
+        self.assertEqual(str(new_user.outline_uuid), new_uuid)
+        self.assertIsNone(lost_user.outline_uuid)
+
     def test_membership_cannot_end_before_beginning(self):
         wrong_end_date = date.today() - timedelta(days=100)
         with self.assertRaises(IntegrityError):
@@ -0,0 +1,139 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from secretariat.utils.fetch_pipeline import FetchPipeline
+from secretariat.utils.outline import RemoteServerError
+from secretariat.utils.outline_async import ConcurrentClient
+
+
+def paginated(items):
+    def list_page(offset=0, limit=25, **kwargs):
+        return items[offset : offset + limit]
+
+    return list_page
+
+
+class TestConcurrentClient(SimpleTestCase):
+    def test_iter_user_pages_yields_every_page_in_order(self):
+        client = mock.MagicMock()
+        client.list_users.side_effect = paginated(list(range(60)))
+
+        pages = list(ConcurrentClient(client, concurrency=4).iter_user_pages(limit=25))
+
+        self.assertEqual([offset for offset, _ in pages], [0, 25, 50])
+        self.assertEqual(sum((page for _, page in pages), []), list(range(60)))
+
+    def test_iter_group_pages_starts_at_given_offset(self):
+        client = mock.MagicMock()
+        client.list_groups.side_effect = paginated(list(range(10)))
+
+        pages = list(
+            ConcurrentClient(client, concurrency=2).iter_group_pages(
+                start_offset=5, limit=2
+            )
+        )
+
+        self.assertEqual(sum((page for _, page in pages), []), [5, 6, 7, 8, 9])
+
+    def test_list_many_group_users(self):
+        members = {"a": list(range(30)), "b": [], "c": ["x"]}
+        client = mock.MagicMock()
+        client._request_list_memberships.side_effect = (
+            lambda group_id, offset, limit: members[group_id][offset : offset + limit]
+        )
+
+        result = ConcurrentClient(client, concurrency=3).list_many_group_users(
+            ["a", "b", "c"]
+        )
+
+        self.assertEqual(result, members)
+
+    def test_short_first_page_is_the_only_call(self):
+        client = mock.MagicMock()
+        client._request_list_memberships.side_effect = (
+            lambda group_id, offset, limit: list(range(3))[offset : offset + limit]
+        )
+        client.list_groups.side_effect = paginated(["groupe"])
+
+        ConcurrentClient(client, concurrency=8).list_many_group_users(range(20))
+        ConcurrentClient(client, concurrency=8).list_many_user_groups(range(5))
+
+        self.assertEqual(client._request_list_memberships.call_count, 20)
+        self.assertEqual(client.list_groups.call_count, 5)
+
+    def test_requests_in_flight_are_bounded(self):
+        in_flight, max_in_flight = 0, 0
+        lock = threading.Lock()
+
+        def slow_page(group_id, offset, limit):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+            return [group_id] if offset == 0 else []
+
+        client = mock.MagicMock()
+        client._request_list_memberships.side_effect = slow_page
+
+        result = ConcurrentClient(client, concurrency=3).list_many_group_users(
+            range(20)
+        )
+
+        self.assertEqual(len(result), 20)
+        self.assertLessEqual(max_in_flight, 3)
+        self.assertGreater(max_in_flight, 1)
+
+    def test_errors_are_raised_to_the_caller(self):
+        client = mock.MagicMock()
+        client.list_users.side_effect = RemoteServerError(502)
+
+        with self.assertRaises(RemoteServerError):
+            list(ConcurrentClient(client, concurrency=2).iter_user_pages())
+
+
+class TestFetchPipeline(SimpleTestCase):
+    def test_every_item_is_fetched_concurrently(self):
+        in_flight, max_in_flight = 0, 0
+        lock = threading.Lock()
+
+        def fetch(item):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+            return item * 2
+
+        results = dict(FetchPipeline(fetch, workers=4).run(range(20)))
+
+        self.assertEqual(results, {item: item * 2 for item in range(20)})
+        self.assertEqual(max_in_flight, 4)
+
+    def test_full_queue_holds_back_fetching(self):
+        fetched = []
+        pipeline = FetchPipeline(fetched.append, workers=2, queue_size=2)
+
+        results = pipeline.run(range(100))
+        next(results)
+        time.sleep(0.05)
+
+        # one consumed, two queued, two waiting to be queued, one in flight
+        self.assertLessEqual(len(fetched), 6)
+        results.close()
+
+    def test_errors_reach_the_consumer(self):
+        def fetch(item):
+            if item == 3:
+                raise RemoteServerError(503)
+            return item
+
+        with self.assertRaises(RemoteServerError):
+            list(FetchPipeline(fetch, workers=2).run(range(10)))
@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase
+
+from secretariat.tests.fake_outline import FakeOutlineServer
+from secretariat.utils.outline import Client
+from secretariat.utils.outline_cache import GroupIndex, UserEmailCache
+from secretariat.utils.scheduler import RequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestGroupIndex(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeOutlineServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.populate(groups=250)
+        self.clock = FakeClock()
+        self.client = Client(
+            api_url=self.server.api_url,
+            scheduler=RequestScheduler(rate=0),
+            group_index=GroupIndex(ttl=60, clock=self.clock),
+        )
+
+    def test_lookups_share_one_sweep(self):
+        for index in range(250):
+            group = self.client.find_group_by_name(f"Groupe {index}")
+            self.assertEqual(group["name"], f"Groupe {index}")
+
+        # 3 pages of 100 groups, and an empty one
+        self.assertEqual(self.server.calls["groups.list"], 4)
+
+    def test_index_is_rebuilt_after_ttl_or_invalidation(self):
+        self.client.find_group_by_name("Groupe 0")
+        self.clock.now = 61
+        self.client.find_group_by_name("Groupe 0")
+        self.assertEqual(self.server.calls["groups.list"], 8)
+
+        self.client.group_index.invalidate()
+        self.client.find_group_by_name("Groupe 0")
+        self.assertEqual(self.server.calls["groups.list"], 12)
+
+    def test_created_and_deleted_groups_are_tracked(self):
+        self.client.find_group_by_name("Groupe 0")
+        group_uuid = self.client.create_new_group("Nouveau groupe")
+        self.assertEqual(
+            self.client.find_group_by_name("Nouveau groupe")["id"], group_uuid
+        )
+        self.assertEqual(self.server.calls["groups.list"], 4)
+
+    def test_unknown_group_triggers_a_refresh(self):
+        self.client.find_group_by_name("Groupe 0")
+        self.server.state.add_group("Créé ailleurs")
+        self.assertIsNotNone(self.client.find_group_by_name("Créé ailleurs"))
+        self.assertIsNone(self.client.find_group_by_name("Inconnu"))
+
+
+class TestFindUsersFromEmails(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeOutlineServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.populate(users=250)
+        self.clock = FakeClock()
+        self.client = Client(
+            api_url=self.server.api_url,
+            scheduler=RequestScheduler(rate=0),
+            user_cache=UserEmailCache(ttl=60, clock=self.clock),
+        )
+
+    def test_emails_are_resolved_by_chunks(self):
+        emails = [f"Agent.{index}@fictif.pour.test.gouv.fr" for index in range(250)]
+        users = self.client.find_users_from_emails(
+            emails + ["inconnu@fictif.gouv.fr"], chunk_size=100
+        )
+
+        self.assertEqual(len(users), 250)
+        self.assertEqual(users["agent.42@fictif.pour.test.gouv.fr"]["name"], "Agent 42")
+        self.assertEqual(self.server.calls["users.list"], 3)
+
+    def test_resolved_users_are_memoized(self):
+        self.client.find_users_from_emails(["agent.1@fictif.pour.test.gouv.fr"])
+        user = self.client.find_user_from_email("agent.1@fictif.pour.test.gouv.fr")
+        self.assertEqual(user["name"], "Agent 1")
+        self.assertEqual(self.server.calls["users.list"], 1)
+
+        self.clock.now = 61
+        self.client.find_user_from_email("agent.1@fictif.pour.test.gouv.fr")
+        self.assertEqual(self.server.calls["users.list"], 2)
@@ -15,7 +15,7 @@ from secretariat.utils.outline import (
 
 
 class TestOutlineClient(TestCase):
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_list_users_when_all_is_fine(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.list_response_ok()
@@ -32,7 +32,7 @@ class TestOutlineClient(TestCase):
             "First user should be Prudence Crandall",
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_list_users_when_unauthorized(self, mock_post):
         client = Client()
         mock_post.return_value.status_code = 401
@@ -47,7 +47,7 @@ class TestOutlineClient(TestCase):
             mock_post.called, "A POST request should have been sent at some point"
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_invite_user_when_all_is_fine(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.invite_response_ok()
@@ -62,7 +62,28 @@ class TestOutlineClient(TestCase):
             "Response should be the UUID of the new user",
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
+    def test_invite_many_users_in_chunks(self, mock_post):
+        client = Client()
+        mock_post.return_value = mocks.invite_response_many_ok()
+        users = [
+            UserFactory(first_name="Tarik", last_name="Ota"),
+            UserFactory(first_name="Ada", last_name="Lovelace"),
+        ]
+
+        response = client.invite_many_to_outline(users * 2, chunk_size=2)
+
+        self.assertEqual(mock_post.call_count, 2, "4 invites should need 2 requests")
+        self.assertEqual(len(mock_post.call_args.kwargs["json"]["invites"]), 2)
+        self.assertEqual(
+            response,
+            {
+                "tarik.ota@test.gouv.fr": "26985a73-9fc5-4c31-839c-51304daf2628",
+                "ada.lovelace@test.gouv.fr": "36985a73-9fc5-4c31-839c-51304daf2628",
+            },
+        )
+
+    @mock.patch("requests.Session.post")
     def test_invite_already_invited_user(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.invite_response_already_invited()
@@ -72,7 +93,7 @@ class TestOutlineClient(TestCase):
             mock_post.called, "A POST request should have been sent at some point"
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_invite_user_invalid_email(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.invite_response_invalid_email()
@@ -88,7 +109,7 @@ class TestOutlineClient(TestCase):
             mock_post.called, "A POST request should have been sent at some point"
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_invite_when_outline_is_out(self, mock_post):
         client = Client()
         mock_post.return_value.status_code = 502
@@ -103,7 +124,7 @@ class TestOutlineClient(TestCase):
             mock_post.called, "A POST request should have been sent at some point"
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_create_group_when_all_is_fine(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.group_creation_ok()
@@ -114,7 +135,7 @@ class TestOutlineClient(TestCase):
             "Group should be created on outline and uuid returned",
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_create_group_but_it_exists(self, mock_post):
         client = Client()
         mock_post.return_value = mocks.group_creation_ko_already_exists()
@@ -126,7 +147,7 @@ class TestOutlineClient(TestCase):
             mock_post.called, "A POST request should have been sent at some point"
         )
 
-    @mock.patch("requests.post")
+    @mock.patch("requests.Session.post")
     def test_list_group_users_with_pagination(self, mock_post):
         client = Client()
         mock_post.side_effect = [
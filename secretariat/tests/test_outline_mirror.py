@@ -0,0 +1,148 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from secretariat.admin import OrganisationAdmin, OutOfSyncMembersFilter
+from secretariat.models import (
+    Organisation,
+    OutlineGroup,
+    OutlineGroupMembership,
+    OutlineUser,
+)
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.outline import Client
+from secretariat.utils.outline_mirror import (
+    MirroredOutlineState,
+    memberships_missing_from_outline,
+    outline_memberships_missing_from_django,
+    outline_users_missing_from_django,
+    refresh_mirror,
+    users_missing_from_outline,
+)
+from secretariat.utils.sync_plan import SyncPlanner
+
+
+class TestOutlineMirror(FakeOutlineTestCase, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+        self.organisation = OrganisationFactory()
+        group = self.server.state.add_group(self.organisation.name)
+        self.organisation.outline_group_uuid = group["id"]
+        self.organisation.save()
+
+        self.in_sync, self.missing_from_group = UserFactory.create_batch(2)
+        for user in (self.in_sync, self.missing_from_group):
+            user.outline_uuid = self.server.state.add_user(str(user), user.email)["id"]
+            user.save()
+            MembershipFactory(user=user, organisation=self.organisation)
+        self.server.state.add_member(group["id"], str(self.in_sync.outline_uuid))
+        self.stranger = self.server.state.add_user("Ex Membre", "ex@fictif.gouv.fr")
+        self.server.state.add_member(group["id"], self.stranger["id"])
+        self.deleted = UserFactory(outline_uuid="6f1c1d34-7f0a-4b4e-9a52-0d5b5a7b1f10")
+
+    def test_refresh_replaces_the_mirror(self):
+        OutlineUser.objects.create(
+            id=self.deleted.outline_uuid, name="?", fetched_at="2023-01-01T00:00Z"
+        )
+
+        counts = refresh_mirror(self.client)
+
+        self.assertEqual(counts, {"users": 3, "groups": 1, "memberships": 2})
+        self.assertEqual(OutlineUser.objects.count(), 3)
+        self.assertEqual(OutlineGroup.objects.get().name, self.organisation.name)
+        self.assertEqual(OutlineGroupMembership.objects.count(), 2)
+
+    def test_mismatches_are_single_queries(self):
+        refresh_mirror(self.client)
+
+        with self.assertNumQueries(4):
+            self.assertEqual(list(users_missing_from_outline()), [self.deleted])
+            self.assertEqual(
+                [user.email for user in outline_users_missing_from_django()],
+                [self.stranger["email"]],
+            )
+            self.assertEqual(
+                [membership.user for membership in memberships_missing_from_outline()],
+                [self.missing_from_group],
+            )
+            self.assertEqual(
+                [
+                    str(membership.user_id)
+                    for membership in outline_memberships_missing_from_django()
+                ],
+                [self.stranger["id"]],
+            )
+
+        out_of_sync = OutOfSyncMembersFilter(
+            None, {"outline_diff": "oui"}, Organisation, OrganisationAdmin
+        ).queryset(None, Organisation.objects.all())
+        self.assertEqual(list(out_of_sync), [self.organisation])
+
+        stdout = StringIO()
+        call_command("outline-mirror-report", stdout=stdout)
+        self.assertIn("Dans Django mais pas dans Outline : 1", stdout.getvalue())
+
+    def test_sync_from_mirror_reads_nothing_from_outline(self):
+        refresh_mirror(self.client)
+        self.server.calls.clear()
+
+        plan = SyncPlanner(self.client, MirroredOutlineState()).plan(
+            [self.organisation]
+        )
+        self.assertEqual(sum(self.server.calls.values()), 0)
+        self.assertEqual(len(plan.operations), 2)
+
+        call_command("sync-to-outline", "--mirror", stdout=StringIO())
+
+        self.assertEqual(self.server.calls["groups.memberships"], 0)
+        self.assertEqual(list(memberships_missing_from_outline()), [])
+        self.assertEqual(list(outline_memberships_missing_from_django()), [])
+
+    def test_sync_from_mirror_with_an_invitation(self):
+        refresh_mirror(self.client)
+        newcomer = UserFactory()
+        MembershipFactory(user=newcomer, organisation=self.organisation)
+
+        call_command("sync-to-outline", "--mirror", stdout=StringIO())
+
+        newcomer.refresh_from_db()
+        self.assertIsNotNone(newcomer.outline_uuid)
+        self.assertTrue(
+            OutlineGroupMembership.objects.filter(
+                group_id=self.organisation.outline_group_uuid,
+                user_id=newcomer.outline_uuid,
+            ).exists()
+        )
+        self.assertEqual(list(memberships_missing_from_outline()), [])
+
+    def test_only_active_memberships_are_compared(self):
+        refresh_mirror(self.client)
+        today = timezone.localdate()
+        # ended in Django but still in the Outline group
+        in_sync_membership = self.in_sync.membership_set.get()
+        in_sync_membership.start_date = today - timedelta(days=10)
+        in_sync_membership.end_date = today - timedelta(days=1)
+        in_sync_membership.save()
+        # not started yet, so not expected in Outline
+        missing_membership = self.missing_from_group.membership_set.get()
+        missing_membership.start_date = today + timedelta(days=1)
+        missing_membership.save()
+
+        self.assertEqual(list(memberships_missing_from_outline()), [])
+        self.assertEqual(
+            sorted(
+                str(membership.user_id)
+                for membership in outline_memberships_missing_from_django()
+            ),
+            sorted([self.stranger["id"], str(self.in_sync.outline_uuid)]),
+        )
@@ -0,0 +1,131 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from factory import Sequence
+
+from secretariat.middleware import RepeatedQueriesMiddleware
+from secretariat.models import Membership, Organisation, User
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.queries import QueryBudget, QueryBudgetExceeded, normalise
+
+
+class TestQueryBudget(TestCase):
+    def test_statements_are_normalised(self):
+        self.assertEqual(
+            normalise(
+                'SELECT "id" FROM "user"  WHERE "id" IN (%s, %s, %s) AND "name" = \'a\' LIMIT 21'
+            ),
+            'SELECT "id" FROM "user" WHERE "id" IN (...) AND "name" = ? LIMIT ?',
+        )
+
+    def test_budget_exceeded(self):
+        UserFactory()
+        with self.assertRaisesMessage(QueryBudgetExceeded, "2 requêtes SQL"):
+            with QueryBudget(1):
+                User.objects.count()
+                User.objects.count()
+
+    def test_repeated_statement(self):
+        users = UserFactory.create_batch(3)
+        with self.assertRaisesMessage(QueryBudgetExceeded, "répétée 3 fois"):
+            with QueryBudget(10, max_repeats=1):
+                for user in users:
+                    User.objects.get(pk=user.pk)
+
+    def test_decorator(self):
+        @QueryBudget(1)
+        def count_users():
+            return User.objects.count()
+
+        self.assertEqual(count_users(), 0)
+        self.assertEqual(count_users(), 0)
+
+    def test_middleware_logs_repeated_statements(self):
+        users = UserFactory.create_batch(3)
+
+        def view(request):
+            for user in users:
+                User.objects.get(pk=user.pk)
+
+        middleware = RepeatedQueriesMiddleware(view)
+        with mock.patch(
+            "secretariat.middleware.QUERY_REPEAT_THRESHOLD", 3
+        ), self.assertLogs("secretariat.middleware", "WARNING") as logs:
+            middleware(self.client.request().wsgi_request)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("3×", logs.output[0])
+
+
+class TestAdminQueryBudgets(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            UserFactory(username="admin", is_staff=True, is_superuser=True)
+        )
+
+    def assertChangelistBudget(self, model, budget):
+        url = reverse(f"admin:secretariat_{model}_changelist")
+        # the paginator counts both the filtered and the whole table
+        with QueryBudget(budget, max_repeats=2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_changelist(self):
+        UserFactory.create_batch(40, username=Sequence(lambda n: f"agent.{n}"))
+        self.assertChangelistBudget("user", 6)
+
+    def test_organisation_changelist(self):
+        for organisation in OrganisationFactory.create_batch(40):
+            MembershipFactory.create_batch(
+                2,
+                organisation=organisation,
+                # faker names collide at this scale
+                user__username=Sequence(lambda n: f"agent.{n}"),
+            )
+        self.assertChangelistBudget("organisation", 6)
+
+
+class TestSyncQueryBudgets(FakeOutlineTestCase, TestCase):
+    def outline_user(self):
+        user = UserFactory()
+        user.outline_uuid = self.server.state.add_user(user.username, user.email)["id"]
+        user.save()
+        return user
+
+    def test_organisation_synchronization(self):
+        organisation = OrganisationFactory()
+        for _ in range(20):
+            Membership.objects.create(
+                user=self.outline_user(), organisation=organisation
+            )
+
+        with QueryBudget(30, max_repeats=2):
+            organisation.synchronize_to_outline()
+        self.assertEqual(len(self.server.state.memberships), 1)
+
+    def test_user_synchronization(self):
+        user = self.outline_user()
+        for organisation in OrganisationFactory.create_batch(10):
+            Membership.objects.create(user=user, organisation=organisation)
+
+        with QueryBudget(30, max_repeats=1):
+            user.synchronize_to_outline()
+
+    def test_import(self):
+        self.server.populate(users=200, groups=10, members_per_group=20)
+
+        # new groups cost an INSERT and a savepoint each
+        with QueryBudget(55):
+            call_command("import-from-outline", stdout=StringIO())
+        self.assertEqual(Organisation.objects.count(), 10)
+
+        # nothing to write: lookups and checkpoint saves, once per batch
+        with QueryBudget(15, max_repeats=4):
+            call_command("import-from-outline", "--full", stdout=StringIO())
@@ -0,0 +1,128 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+import secretariat.tests.outline_mocks as mocks
+from secretariat.utils.circuit_breaker import CircuitBreaker
+from secretariat.utils.outline import Client, InvalidRequest, RateLimited
+from secretariat.utils.scheduler import RequestScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def throttled_response(retry_after="2"):
+    response = mock.MagicMock()
+    response.status_code = 429
+    response.headers = {"Retry-After": retry_after} if retry_after else {}
+    return response
+
+
+def server_error_response():
+    response = mock.MagicMock()
+    response.status_code = 503
+    response.headers = {}
+    return response
+
+
+class TestTokenBucket(SimpleTestCase):
+    def test_burst_then_paced(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1.0)
+
+        clock.now = 10
+        self.assertEqual(bucket.reserve(), 0, "bucket should have refilled")
+
+    def test_block(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=5, clock=clock)
+        bucket.block(3)
+        self.assertEqual(bucket.reserve(), 4)
+
+
+class TestClientScheduling(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = RequestScheduler(
+            rate=100,
+            burst=1,
+            max_retries=3,
+            backoff_base=1,
+            sleep=self.clock.sleep,
+            clock=self.clock,
+        )
+        self.client = Client(scheduler=self.scheduler, breaker=CircuitBreaker())
+
+    @mock.patch("requests.Session.post")
+    def test_retry_after_is_honoured(self, mock_post):
+        mock_post.side_effect = [throttled_response("2"), mocks.list_response_ok()]
+
+        users = self.client.list_users()
+
+        self.assertEqual(len(users), 1)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertGreaterEqual(self.clock.now, 2)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["throttled"], 1)
+        self.assertEqual(stats["retries"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreaterEqual(stats["wait_time"], 2)
+
+    @mock.patch("requests.Session.post")
+    def test_list_calls_are_retried_with_backoff(self, mock_post):
+        mock_post.side_effect = [
+            server_error_response(),
+            server_error_response(),
+            mocks.list_response_ok(),
+        ]
+
+        self.client.list_users()
+
+        self.assertEqual(mock_post.call_count, 3)
+        # jittered delays: [0.5, 1] then [1, 2]
+        self.assertGreaterEqual(self.clock.now, 1.5)
+        self.assertLessEqual(self.clock.now, 3.1)
+
+    @mock.patch("requests.Session.post")
+    def test_invitations_are_not_retried_on_server_errors(self, mock_post):
+        mock_post.return_value = server_error_response()
+
+        with self.assertRaises(Exception):
+            self.client.invite_to_outline(mock.MagicMock())
+
+        self.assertEqual(mock_post.call_count, 1)
+
+    @mock.patch("requests.Session.post")
+    def test_throttling_gives_up_after_max_retries(self, mock_post):
+        mock_post.return_value = throttled_response(None)
+
+        with self.assertRaises(RateLimited) as cm:
+            self.client.invite_to_outline(mock.MagicMock())
+
+        self.assertNotIsInstance(cm.exception, InvalidRequest)
+        self.assertEqual(cm.exception.status_code, 429)
+        self.assertEqual(mock_post.call_count, 4)
+
+    @mock.patch("requests.Session.post")
+    def test_long_retry_after_fails_at_once(self, mock_post):
+        self.scheduler.retry_after_max = 60
+        mock_post.return_value = throttled_response("3600")
+
+        with self.assertRaises(RateLimited):
+            self.client.list_users()
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self.clock.now, 0)
+        self.assertEqual(self.scheduler.stats()["retries"], 0)
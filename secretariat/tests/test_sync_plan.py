@@ -0,0 +1,276 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from secretariat.models import Organisation, SyncOperation, SyncRun, User
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.outline import Client
+from secretariat.utils.sync_journal import SyncJournal
+from secretariat.utils.sync_plan import (
+    ADD,
+    CREATE_GROUP,
+    INVITE,
+    REMOVE,
+    SyncExecutor,
+    SyncPlan,
+    SyncPlanner,
+)
+
+
+class TestSyncPlanner(FakeOutlineTestCase, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def outline_user(self, user):
+        outline_user = self.server.state.add_user(str(user), user.email)
+        user.outline_uuid = outline_user["id"]
+        user.save()
+        return outline_user
+
+    def test_plan_contains_only_the_differences(self):
+        organisation = OrganisationFactory()
+        group = self.server.state.add_group(organisation.name)
+        organisation.outline_group_uuid = group["id"]
+        organisation.save()
+
+        already_member, to_add, to_invite = UserFactory.create_batch(3)
+        for user in (already_member, to_add, to_invite):
+            MembershipFactory(user=user, organisation=organisation)
+        self.outline_user(already_member)
+        self.outline_user(to_add)
+        self.server.state.add_member(group["id"], already_member.outline_uuid)
+        stranger = self.server.state.add_user("Ex Membre", "ex.membre@fictif.gouv.fr")
+        self.server.state.add_member(group["id"], stranger["id"])
+
+        plan = SyncPlanner(self.client).plan([organisation])
+
+        self.assertEqual(
+            sorted(
+                (operation.kind, operation.user_id)
+                for operation in plan.operations
+                if operation.user_id
+            ),
+            sorted([(ADD, to_add.pk), (INVITE, to_invite.pk), (ADD, to_invite.pk)]),
+        )
+        self.assertEqual(plan.of_kind(REMOVE)[0].user_uuid, stranger["id"])
+        self.assertEqual(plan.estimated_api_calls()["total"], 4)
+
+        result = SyncExecutor(self.client).execute(plan)
+
+        self.assertEqual(result.errors, [])
+        to_invite.refresh_from_db()
+        self.assertEqual(
+            set(self.server.state.memberships[group["id"]]),
+            {
+                str(already_member.outline_uuid),
+                str(to_add.outline_uuid),
+                str(to_invite.outline_uuid),
+            },
+        )
+        self.assertEqual(SyncPlanner(self.client).plan([organisation]).operations, [])
+
+    def test_new_organisation_is_created_with_its_members(self):
+        organisation = OrganisationFactory()
+        for user in UserFactory.create_batch(3):
+            MembershipFactory(user=user, organisation=organisation)
+
+        plan = SyncPlanner(self.client).plan([organisation])
+        self.assertEqual(len(plan.of_kind(CREATE_GROUP)), 1)
+        self.assertEqual(plan.estimated_api_calls()[INVITE], 1)
+
+        organisation.synchronize_to_outline()
+
+        organisation.refresh_from_db()
+        self.assertIsNotNone(organisation.outline_group_uuid)
+        self.assertEqual(
+            len(self.server.state.memberships[str(organisation.outline_group_uuid)]), 3
+        )
+        self.assertEqual(User.objects.filter(outline_uuid__isnull=True).count(), 0)
+
+    def test_dry_run_changes_nothing(self):
+        organisation = OrganisationFactory(name="Opérateur")
+        MembershipFactory(organisation=organisation)
+        stdout = StringIO()
+
+        call_command("sync-to-outline", "--dry-run", stdout=stdout)
+
+        self.assertIn("Créer le groupe Outline « Opérateur »", stdout.getvalue())
+        self.assertIn("3 opération(s) prévue(s)", stdout.getvalue())
+        self.assertIsNone(Organisation.objects.get().outline_group_uuid)
+        self.assertEqual(self.server.calls["groups.create"], 0)
+
+
+class TestUserSyncPlanner(FakeOutlineTestCase, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def organisation_with_group(self):
+        organisation = OrganisationFactory()
+        organisation.outline_group_uuid = self.server.state.add_group(
+            organisation.name
+        )["id"]
+        organisation.save()
+        return organisation
+
+    def test_only_missing_groups_are_added(self):
+        user = UserFactory()
+        outline_user = self.server.state.add_user(str(user), user.email)
+        user.outline_uuid = outline_user["id"]
+        user.save()
+        organisations = [self.organisation_with_group() for _ in range(4)]
+        for organisation in organisations:
+            MembershipFactory(user=user, organisation=organisation)
+        for organisation in organisations[:3]:
+            self.server.state.add_member(
+                str(organisation.outline_group_uuid), outline_user["id"]
+            )
+
+        user.synchronize_to_outline(self.client)
+
+        # one page of the user's groups, then the missing group only
+        self.assertEqual(
+            dict(self.server.calls), {"groups.list": 1, "groups.add_user": 1}
+        )
+        self.assertIn(
+            outline_user["id"],
+            self.server.state.memberships[str(organisations[3].outline_group_uuid)],
+        )
+
+        # the snapshot is kept up to date: a second sync reads and writes nothing
+        calls_before = sum(self.server.calls.values())
+        user.synchronize_to_outline(self.client)
+        self.assertEqual(sum(self.server.calls.values()), calls_before)
+
+    def test_new_user_is_invited_and_added(self):
+        organisation = self.organisation_with_group()
+        user = UserFactory()
+        MembershipFactory(user=user, organisation=organisation)
+
+        user.synchronize_to_outline(self.client)
+
+        user.refresh_from_db()
+        self.assertIsNotNone(user.outline_uuid)
+        self.assertIn(
+            str(user.outline_uuid),
+            self.server.state.memberships[str(organisation.outline_group_uuid)],
+        )
+
+    def test_only_groups_of_organisations_are_removed(self):
+        former, current = self.organisation_with_group(), self.organisation_with_group()
+        foreign_group = self.server.state.add_group("Groupe géré dans Outline")
+        user = UserFactory()
+        outline_user = self.server.state.add_user(str(user), user.email)
+        user.outline_uuid = outline_user["id"]
+        user.save()
+        MembershipFactory(user=user, organisation=current)
+        for group_uuid in (former.outline_group_uuid, foreign_group["id"]):
+            self.server.state.add_member(str(group_uuid), outline_user["id"])
+
+        plan = SyncPlanner(self.client).plan_users([user])
+
+        self.assertEqual(
+            sorted(
+                (operation.kind, operation.organisation_id)
+                for operation in plan.operations
+            ),
+            sorted([(ADD, current.pk), (REMOVE, former.pk)]),
+        )
+        self.assertEqual(SyncExecutor(self.client).execute(plan).errors, [])
+        self.assertIn(
+            outline_user["id"], self.server.state.memberships[foreign_group["id"]]
+        )
+        self.assertNotIn(
+            outline_user["id"],
+            self.server.state.memberships[str(former.outline_group_uuid)],
+        )
+
+
+class TestSyncJournal(FakeOutlineTestCase, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.organisation = OrganisationFactory()
+        for user in UserFactory.create_batch(3):
+            MembershipFactory(user=user, organisation=self.organisation)
+
+    def test_resume_only_applies_the_remaining_operations(self):
+        self.server.fail_next("groups.add_user", 500)
+        call_command("sync-to-outline", stdout=StringIO())
+
+        run = SyncRun.objects.get()
+        self.assertEqual(run.status, SyncRun.FAILED)
+        self.assertEqual(
+            sorted(run.operations.values_list("status", flat=True)),
+            [SyncOperation.DONE] * 6 + [SyncOperation.FAILED],
+        )
+
+        self.server.calls.clear()
+        stdout = StringIO()
+        call_command("sync-to-outline", "--resume", run.pk, stdout=stdout)
+
+        self.assertIn("1 opération(s) restante(s)", stdout.getvalue())
+        self.assertEqual(
+            dict(self.server.calls), {"groups.add_user": 1}, "only the failed add"
+        )
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.resumed_count), (SyncRun.DONE, 1))
+        self.organisation.refresh_from_db()
+        self.assertEqual(
+            len(
+                self.server.state.memberships[str(self.organisation.outline_group_uuid)]
+            ),
+            3,
+        )
+
+    def test_failed_removal_is_journaled_and_resumed(self):
+        call_command("sync-to-outline", stdout=StringIO())
+        self.organisation.refresh_from_db()
+        group_id = str(self.organisation.outline_group_uuid)
+        former = self.server.state.add_user("Ancien membre", "ancien@example.org")
+        self.server.state.add_member(group_id, former["id"])
+
+        self.server.fail_next("groups.remove_user", 500)
+        call_command("sync-to-outline", stdout=StringIO())
+
+        run = SyncRun.objects.latest("pk")
+        self.assertEqual(run.status, SyncRun.FAILED)
+        self.assertEqual(run.operations.get(kind=REMOVE).status, SyncOperation.FAILED)
+        self.assertIn(former["id"], self.server.state.memberships[group_id])
+
+        call_command("sync-to-outline", "--resume", run.pk, stdout=StringIO())
+
+        self.assertNotIn(former["id"], self.server.state.memberships[group_id])
+
+    def test_interrupted_run_is_resumed_after_its_journaled_operations(self):
+        plan = SyncPlanner(Client()).plan([self.organisation])
+        journal = SyncJournal.start(plan)
+        # the process was killed once the group was created
+        SyncExecutor(Client(), journal=journal).execute(
+            SyncPlan(plan.organisations, plan.users, plan.of_kind(CREATE_GROUP))
+        )
+        self.assertEqual(journal.run.status, SyncRun.RUNNING)
+
+        self.server.calls.clear()
+        call_command("sync-to-outline", "--resume", journal.run.pk, stdout=StringIO())
+
+        self.assertEqual(self.server.calls["groups.create"], 0)
+        self.assertEqual(self.server.calls["groups.add_user"], 3)
+        self.assertFalse(
+            journal.run.operations.exclude(status=SyncOperation.DONE).exists()
+        )
+
+    def test_admin_lists_runs(self):
+        call_command("sync-to-outline", stdout=StringIO())
+        self.client.force_login(UserFactory(is_staff=True, is_superuser=True))
+
+        response = self.client.get(reverse("admin:secretariat_syncrun_changelist"))
+
+        self.assertContains(response, "Synchronisation n°")
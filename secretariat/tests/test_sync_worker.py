@@ -0,0 +1,121 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from secretariat.models import SyncJob
+from secretariat.tests.factories import (
+    MembershipFactory,
+    OrganisationFactory,
+    UserFactory,
+)
+from secretariat.tests.fake_outline import FakeOutlineTestCase
+from secretariat.utils.sync_worker import SyncWorker
+
+
+class TestSyncJob(TestCase):
+    def test_enqueue_skips_objects_already_pending(self):
+        SyncJob.enqueue(SyncJob.USER, [1, 2])
+        SyncJob.objects.filter(object_id=2).update(status=SyncJob.RUNNING)
+
+        jobs = SyncJob.enqueue(SyncJob.USER, [1, 2, 3])
+
+        self.assertEqual(sorted(job.object_id for job in jobs), [2, 3])
+        self.assertEqual(SyncJob.objects.filter(status=SyncJob.PENDING).count(), 3)
+
+    def test_admin_save_enqueues_a_job(self):
+        admin = UserFactory(is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        organisation = OrganisationFactory()
+
+        response = self.client.post(
+            reverse("admin:secretariat_organisation_change", args=[organisation.pk]),
+            {
+                "name": "Nouveau nom",
+                "membership_set-TOTAL_FORMS": 0,
+                "membership_set-INITIAL_FORMS": 0,
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        job = SyncJob.objects.get()
+        self.assertEqual(
+            (job.target, job.object_id), (SyncJob.ORGANISATION, organisation.pk)
+        )
+
+
+class TestSyncWorker(FakeOutlineTestCase, TestCase):
+    def test_jobs_are_drained(self):
+        organisation = OrganisationFactory()
+        for user in UserFactory.create_batch(3):
+            MembershipFactory(user=user, organisation=organisation)
+        user = UserFactory()
+        SyncJob.enqueue(SyncJob.ORGANISATION, [organisation.pk])
+        SyncJob.enqueue(SyncJob.USER, [user.pk])
+        stdout = StringIO()
+
+        call_command("run-sync-worker", "--once", stdout=stdout)
+
+        self.assertIn("2 tâche(s) terminée(s), 0 en échec.", stdout.getvalue())
+        self.assertEqual(SyncJob.objects.filter(status=SyncJob.DONE).count(), 2)
+        organisation.refresh_from_db()
+        user.refresh_from_db()
+        self.assertEqual(
+            len(self.server.state.memberships[str(organisation.outline_group_uuid)]), 3
+        )
+        self.assertIsNotNone(user.outline_uuid)
+
+    def test_failed_job_is_retried_later_then_given_up(self):
+        organisation = OrganisationFactory()
+        organisation.outline_group_uuid = self.server.state.add_group(
+            organisation.name
+        )["id"]
+        organisation.save()
+        MembershipFactory(organisation=organisation)
+        SyncJob.enqueue(SyncJob.ORGANISATION, [organisation.pk])
+        worker = SyncWorker(max_attempts=2)
+
+        self.server.fail_next("groups.add_user", 500)
+        self.assertEqual(worker.run_once(), 1)
+
+        job = SyncJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (SyncJob.PENDING, 1))
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertEqual(worker.run_once(), 0)
+
+        SyncJob.objects.update(available_at=timezone.now())
+        self.server.fail_next("groups.add_user", 500)
+        worker.run_once()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (SyncJob.FAILED, 2))
+        self.assertNotEqual(job.last_error, "")
+
+    def test_expired_lease_is_claimed_again(self):
+        SyncJob.enqueue(SyncJob.USER, [UserFactory().pk])
+        worker = SyncWorker()
+        self.assertEqual(len(worker.claim()), 1)
+        self.assertEqual(worker.claim(), [])
+
+        SyncJob.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(len(worker.claim()), 1)
+
+    def test_worker_with_an_expired_lease_does_not_overwrite_the_job(self):
+        SyncJob.enqueue(SyncJob.USER, [UserFactory().pk])
+        late_worker = SyncWorker()
+        late_jobs = late_worker.claim()
+
+        SyncJob.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        jobs = SyncWorker().claim()
+        late_worker.process(late_jobs)
+
+        job = SyncJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (SyncJob.RUNNING, 2))
+
+        SyncWorker().process(jobs)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.DONE)
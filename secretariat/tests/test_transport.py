@@ -0,0 +1,58 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase
+
+from secretariat.utils.outline import Client
+from secretariat.utils.transport import OutlineTransport, get_shared_transport
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True, "data": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestOutlineTransport(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        transport = OutlineTransport(pool_size=2)
+        for _ in range(5):
+            response = transport.post(f"{self.url}/api/users.list", json={})
+            self.assertEqual(response.status_code, 200)
+
+        stats = transport.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 4)
+        transport.close()
+
+    def test_clients_share_the_process_transport(self):
+        self.assertIs(Client().transport, Client().transport)
+        self.assertIs(Client().transport, get_shared_transport())
+
+    def test_client_uses_given_transport_and_url(self):
+        transport = OutlineTransport(pool_size=1)
+        client = Client(transport=transport, api_url=f"{self.url}/api")
+        self.assertEqual(client.list_users(), [])
+        self.assertEqual(client.connection_stats()["requests"], 1)
+        transport.close()
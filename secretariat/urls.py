@@ -6,4 +6,6 @@ urlpatterns = [
     path("", views.view_index, name="index"),
     path("accessibilite/", views.view_accessibilite, name="accessibilite"),
     path("logout/", views.view_logout, name="logout"),
+    path("outline/etat/", views.view_outline_status, name="outline_status"),
+    path("outline/metrics", views.view_outline_metrics, name="outline_metrics"),
 ]
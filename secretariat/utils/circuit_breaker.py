@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+
+from config.settings import (
+    OUTLINE_BREAKER_FAILURE_RATE,
+    OUTLINE_BREAKER_MINIMUM_CALLS,
+    OUTLINE_BREAKER_OPEN_SECONDS,
+    OUTLINE_BREAKER_WINDOW,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling Outline while it is failing.
+
+    - closed: calls go through; when the failure rate over the last `window`
+      seconds reaches `failure_rate` (with at least `minimum_calls` calls),
+      the circuit opens;
+    - open: calls are refused until `open_seconds` have elapsed;
+    - half-open: one probe call goes through; it closes the circuit if it
+      succeeds and opens it again otherwise.
+    """
+
+    def __init__(
+        self,
+        failure_rate=OUTLINE_BREAKER_FAILURE_RATE,
+        minimum_calls=OUTLINE_BREAKER_MINIMUM_CALLS,
+        window=OUTLINE_BREAKER_WINDOW,
+        open_seconds=OUTLINE_BREAKER_OPEN_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.outcomes = deque()
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def _forget_old_outcomes(self, now):
+        while self.outcomes and now - self.outcomes[0][0] > self.window:
+            self.outcomes.popleft()
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.probe_in_flight = False
+        self.times_opened += 1
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN:
+                if self.probe_in_flight:
+                    return False
+                self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.outcomes.clear()
+                self.probe_in_flight = False
+            self.outcomes.append((now, True))
+            self._forget_old_outcomes(now)
+
+    def record_failure(self):
+        with self.lock:
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            self.outcomes.append((now, False))
+            self._forget_old_outcomes(now)
+            failures = sum(1 for _, success in self.outcomes if not success)
+            if (
+                self.state == CLOSED
+                and len(self.outcomes) >= self.minimum_calls
+                and failures / len(self.outcomes) >= self.failure_rate
+            ):
+                self._open(now)
+
+    def retry_in(self):
+        """Seconds before a probe call is allowed, 0 when not open."""
+        with self.lock:
+            if self.state != OPEN:
+                return 0
+            return max(self.open_seconds - (self.clock() - self.opened_at), 0)
+
+    def stats(self):
+        retry_in = self.retry_in()
+        with self.lock:
+            self._forget_old_outcomes(self.clock())
+            return {
+                "state": self.state,
+                "calls": len(self.outcomes),
+                "failures": sum(1 for _, success in self.outcomes if not success),
+                "times_opened": self.times_opened,
+                "retry_in": retry_in,
+            }
+
+
+_shared_breaker = None
+_shared_breaker_lock = threading.Lock()
+
+
+def get_shared_breaker():
+    """Process-wide circuit breaker, shared by every `Client` instance."""
+    global _shared_breaker
+    with _shared_breaker_lock:
+        if _shared_breaker is None:
+            _shared_breaker = CircuitBreaker()
+        return _shared_breaker
@@ -0,0 +1,74 @@
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config.settings import OUTLINE_CONCURRENCY
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class FetchPipeline:
+    """
+    Calls `fetch(item)` for every item on a pool of `workers` threads and
+    hands `(item, result)` pairs to a single consumer through a bounded queue.
+
+    The fetching runs in a background thread, so network round-trips overlap
+    with the consumer's database writes; when the consumer falls behind, the
+    full queue stops new fetches. Results come in completion order. An error
+    raised by `fetch` or by the items iterator is re-raised to the consumer.
+    """
+
+    def __init__(self, fetch, workers=OUTLINE_CONCURRENCY, queue_size=None):
+        self.fetch = fetch
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size or 2 * workers)
+        self.stopped = threading.Event()
+
+    def _put(self, entry):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fetch_one(self, item):
+        return item, self.fetch(item)
+
+    def _produce(self, items):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                for item in items:
+                    if self.stopped.is_set():
+                        break
+                    pending.add(executor.submit(self._fetch_one, item))
+                    if len(pending) >= self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._put(future.result())
+                for future in pending:
+                    self._put(future.result())
+            self._put(_DONE)
+        except BaseException as error:
+            self._put(_Failure(error))
+
+    def run(self, items):
+        producer = threading.Thread(target=self._produce, args=(items,), daemon=True)
+        producer.start()
+        try:
+            while True:
+                entry = self.queue.get()
+                if entry is _DONE:
+                    return
+                if isinstance(entry, _Failure):
+                    raise entry.error
+                yield entry
+        finally:
+            self.stopped.set()
+            producer.join()
@@ -0,0 +1,80 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from secretariat.models import SyncRun
+
+
+class ImportCheckpoint:
+    """
+    Progress of an `import-from-outline` run, kept on its `SyncRun`: the next
+    users page to read, whether the users are done, and the groups already
+    written. A resumed run starts again from there.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.groups_done = set(run.checkpoint.get("groups_done", []))
+
+    @classmethod
+    def start(cls, since=None):
+        run = SyncRun.objects.create(
+            kind=SyncRun.IMPORT,
+            checkpoint={
+                "since": since.isoformat() if since else None,
+                "users_offset": 0,
+                "users_done": False,
+                "latest_user_update": None,
+                "groups_done": [],
+            },
+        )
+        return cls(run)
+
+    @classmethod
+    def resume(cls, run_id):
+        run = SyncRun.objects.get(pk=run_id, kind=SyncRun.IMPORT)
+        run.status = SyncRun.RUNNING
+        run.finished_at = None
+        run.resumed_count += 1
+        run.save(update_fields=["status", "finished_at", "resumed_count"])
+        return cls(run)
+
+    def _datetime(self, name):
+        value = self.run.checkpoint.get(name)
+        return parse_datetime(value) if value else None
+
+    @property
+    def since(self):
+        return self._datetime("since")
+
+    @property
+    def latest_user_update(self):
+        return self._datetime("latest_user_update")
+
+    @property
+    def users_offset(self):
+        return self.run.checkpoint["users_offset"]
+
+    @property
+    def users_done(self):
+        return self.run.checkpoint["users_done"]
+
+    def save(self):
+        self.run.checkpoint["groups_done"] = sorted(self.groups_done)
+        self.run.save(update_fields=["checkpoint"])
+
+    def users_committed(self, next_offset, latest_user_update):
+        """Records that every users page before `next_offset` is written."""
+        self.run.checkpoint["users_offset"] = next_offset
+        if latest_user_update:
+            self.run.checkpoint["latest_user_update"] = latest_user_update.isoformat()
+        self.save()
+
+    def users_finished(self):
+        self.run.checkpoint["users_done"] = True
+        self.save()
+
+    def finish(self, status=SyncRun.DONE):
+        self.run.status = status
+        self.run.finished_at = timezone.now()
+        self.save()
+        self.run.save(update_fields=["status", "finished_at"])
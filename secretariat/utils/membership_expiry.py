@@ -0,0 +1,169 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from config.settings import OUTLINE_CONCURRENCY, OUTLINE_EXPIRY_BUDGET
+from secretariat.models import Membership, SyncJob, Watermark
+from secretariat.utils.outline import Client
+from secretariat.utils.sync_plan import (
+    ADD,
+    INVITE,
+    REMOVE,
+    Operation,
+    SyncExecutor,
+    SyncPlan,
+)
+
+EXPIRY_WATERMARK = "expire-memberships"
+
+
+@dataclass
+class ExpiryResult:
+    days: list = field(default_factory=list)
+    done: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    queued: list = field(default_factory=list)
+    out_of_time: bool = False
+
+
+class MembershipExpiry:
+    """
+    Applies to Outline the memberships that started or ended since the last
+    run. Each day since the watermark is read with an indexed query on
+    `start_date`/`end_date`, so a run costs as much as the number of changing
+    memberships. Operations are sent group by group, and the run stops
+    between groups once `budget` seconds have elapsed; the watermark only
+    moves past fully handled days, and the groups handled within a day are
+    kept in its checkpoint for the next run. The users whose operations
+    failed are handed to the sync worker as `SyncJob`s, which retries them
+    with backoff, so one failure does not hold back the following days.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        workers=OUTLINE_CONCURRENCY,
+        budget=OUTLINE_EXPIRY_BUDGET,
+        clock=time.monotonic,
+    ):
+        self.client = client or Client()
+        self.workers = workers
+        self.budget = budget
+        self.clock = clock
+
+    def pending_days(self, today=None):
+        today = today or timezone.localdate()
+        watermark = Watermark.get_value(EXPIRY_WATERMARK)
+        if watermark is None:
+            # first run: older transitions are left to a full sync
+            day = today
+        else:
+            day = timezone.localtime(watermark).date() + timedelta(days=1)
+        while day <= today:
+            yield day
+            day += timedelta(days=1)
+
+    def plan_day(self, day, today=None):
+        """Operations bringing the memberships changing on `day` to their state today."""
+        today = today or timezone.localdate()
+        plan = SyncPlan()
+        pairs = set()
+        for membership in (
+            Membership.objects.changing_on(day)
+            .filter(organisation__outline_group_uuid__isnull=False)
+            .select_related("user", "organisation")
+        ):
+            plan.users.setdefault(membership.user_id, membership.user)
+            plan.organisations.setdefault(
+                membership.organisation_id, membership.organisation
+            )
+            pairs.add((membership.user_id, membership.organisation_id))
+        if not pairs:
+            return plan
+
+        # another membership may keep the user in the organisation
+        active_pairs = set(
+            Membership.objects.active(today)
+            .filter(user__in=plan.users, organisation__in=plan.organisations)
+            .values_list("user_id", "organisation_id")
+        )
+        for user_id, organisation_id in sorted(pairs, key=lambda pair: pair[::-1]):
+            user = plan.users[user_id]
+            if (user_id, organisation_id) in active_pairs:
+                plan.operations.append(Operation(ADD, organisation_id, user_id))
+            elif user.outline_uuid:
+                plan.operations.append(
+                    Operation(
+                        REMOVE,
+                        organisation_id,
+                        user_id=user_id,
+                        user_uuid=str(user.outline_uuid),
+                    )
+                )
+        return plan
+
+    def _group_batches(self, plan):
+        operations_by_group = {}
+        for operation in plan.operations:
+            operations_by_group.setdefault(operation.organisation_id, []).append(
+                operation
+            )
+        for organisation_id, operations in operations_by_group.items():
+            invites = [
+                Operation(INVITE, user_id=operation.user_id)
+                for operation in operations
+                if operation.kind == ADD
+                and not plan.users[operation.user_id].outline_uuid
+            ]
+            yield SyncPlan(
+                organisations={organisation_id: plan.organisations[organisation_id]},
+                users=plan.users,
+                operations=invites + operations,
+            )
+
+    @staticmethod
+    def _midnight(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def _groups_done(self, day):
+        checkpoint = Watermark.get_checkpoint(EXPIRY_WATERMARK)
+        if checkpoint.get("day") != day.isoformat():
+            return set()
+        return set(checkpoint["groups_done"])
+
+    def run(self, today=None):
+        today = today or timezone.localdate()
+        started = self.clock()
+        executor = SyncExecutor(self.client, self.workers)
+        result = ExpiryResult()
+
+        for day in self.pending_days(today):
+            groups_done = self._groups_done(day)
+            for batch in self._group_batches(self.plan_day(day, today)):
+                (organisation_id,) = batch.organisations
+                if organisation_id in groups_done:
+                    continue
+                if self.clock() - started > self.budget:
+                    result.out_of_time = True
+                    return result
+                batch_result = executor.execute(batch)
+                result.done.extend(batch_result.done)
+                result.errors.extend(batch_result.errors)
+                if batch_result.errors:
+                    result.queued += SyncJob.enqueue(
+                        SyncJob.USER,
+                        set(operation.user_id for operation, _ in batch_result.errors),
+                    )
+                groups_done.add(organisation_id)
+                # the next run resumes after this group
+                Watermark.save_checkpoint(
+                    EXPIRY_WATERMARK,
+                    self._midnight(day - timedelta(days=1)),
+                    {"day": day.isoformat(), "groups_done": sorted(groups_done)},
+                )
+
+            Watermark.advance(EXPIRY_WATERMARK, self._midnight(day))
+            result.days.append(day)
+        return result
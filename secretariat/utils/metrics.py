@@ -0,0 +1,137 @@
+import threading
+from collections import Counter
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.status_codes = Counter()
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, status, duration, bytes_sent, bytes_received):
+        self.calls += 1
+        self.status_codes[str(status)] += 1
+        self.latency_sum += duration
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if duration <= upper_bound:
+                self.latency_buckets[index] += 1
+                break
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "status_codes": dict(self.status_codes),
+            "latency_buckets": list(self.latency_buckets),
+            "latency_sum": self.latency_sum,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class OutlineMetrics:
+    """
+    Per-endpoint call counts, status codes, latency histogram and bytes
+    transferred for the Outline API. Counters live in the process memory:
+    each gunicorn worker reports its own calls.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, status, duration, bytes_sent=0, bytes_received=0):
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointMetrics()
+            self.endpoints[endpoint].record(
+                status, duration, bytes_sent, bytes_received
+            )
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                endpoint: metrics.as_dict()
+                for endpoint, metrics in sorted(self.endpoints.items())
+            }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def render_prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP outline_api_requests_total Outline API requests.",
+            "# TYPE outline_api_requests_total counter",
+        ]
+        for endpoint, metrics in snapshot.items():
+            for status, count in sorted(metrics["status_codes"].items()):
+                lines.append(
+                    f'outline_api_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                )
+
+        lines += [
+            "# HELP outline_api_request_duration_seconds Outline API latency.",
+            "# TYPE outline_api_request_duration_seconds histogram",
+        ]
+        for endpoint, metrics in snapshot.items():
+            cumulative = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS, metrics["latency_buckets"]):
+                cumulative += count
+                le = "+Inf" if upper_bound == float("inf") else upper_bound
+                lines.append(
+                    f'outline_api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}'
+                )
+            lines.append(
+                f'outline_api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {metrics["latency_sum"]}'
+            )
+            lines.append(
+                f'outline_api_request_duration_seconds_count{{endpoint="{endpoint}"}} {metrics["calls"]}'
+            )
+
+        lines += [
+            "# HELP outline_api_bytes_total Bytes exchanged with the Outline API.",
+            "# TYPE outline_api_bytes_total counter",
+        ]
+        for endpoint, metrics in snapshot.items():
+            for direction in ("sent", "received"):
+                lines.append(
+                    f'outline_api_bytes_total{{endpoint="{endpoint}",direction="{direction}"}} {metrics[f"bytes_{direction}"]}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+def diff_snapshots(before, after):
+    """Calls and time spent per endpoint between two snapshots."""
+    diff = {}
+    for endpoint, metrics in after.items():
+        previous = before.get(endpoint, {"calls": 0, "latency_sum": 0.0})
+        calls = metrics["calls"] - previous["calls"]
+        if calls:
+            diff[endpoint] = {
+                "calls": calls,
+                "latency_sum": metrics["latency_sum"] - previous["latency_sum"],
+            }
+    return diff
+
+
+def summary_lines(diff):
+    lines = [
+        f"{endpoint} : {metrics['calls']} appel(s), {metrics['latency_sum']:.2f} s"
+        for endpoint, metrics in diff.items()
+    ]
+    total_calls = sum(metrics["calls"] for metrics in diff.values())
+    total_time = sum(metrics["latency_sum"] for metrics in diff.values())
+    lines.append(f"Total : {total_calls} appel(s) à l'API Outline, {total_time:.2f} s")
+    return lines
+
+
+metrics = OutlineMetrics()
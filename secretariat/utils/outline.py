@@ -1,7 +1,23 @@
+import time
+
 import requests
 
-from config.settings import OUTLINE_API_TOKEN, OUTLINE_URL
+from config.settings import (
+    OUTLINE_API_TOKEN,
+    OUTLINE_EMAIL_CHUNK_SIZE,
+    OUTLINE_INVITE_CHUNK_SIZE,
+    OUTLINE_URL,
+)
 from secretariat.models import Organisation, User
+from secretariat.utils.circuit_breaker import get_shared_breaker
+from secretariat.utils.metrics import metrics
+from secretariat.utils.outline_cache import (
+    get_shared_group_index,
+    get_shared_user_cache,
+    get_shared_user_groups_cache,
+)
+from secretariat.utils.scheduler import get_shared_scheduler
+from secretariat.utils.transport import get_shared_transport
 
 
 class OutlineAPIClientError(Exception):
@@ -19,13 +35,28 @@ class InvalidRequest(OutlineAPIClientError):
 
 
 class InvitationFailed(OutlineAPIClientError):
-    pass
+    def __init__(self, error_code, error_message="", users=None):
+        super().__init__(error_code, error_message)
+        # users left without an Outline account, None when the whole batch failed
+        self.users = users
 
 
 class GroupCreationFailed(OutlineAPIClientError):
     pass
 
 
+class RateLimited(RemoteServerError):
+    pass
+
+
+class OutlineUnreachable(RemoteServerError):
+    pass
+
+
+class CircuitOpen(RemoteServerError):
+    pass
+
+
 class Client:
     api_url = f"{OUTLINE_URL}/api"
     headers = {
@@ -34,20 +65,114 @@ class Client:
         "Authorization": f"Bearer {OUTLINE_API_TOKEN}",
     }
 
-    def invite_to_outline(self, user: User):
-        response = requests.post(
-            url=f"{self.api_url}/users.invite",
-            headers=self.headers,
-            json={
-                "invites": [
-                    {
-                        "name": f"{user.first_name} {user.last_name}",
-                        "email": user.email,
-                        "role": "member",
-                    }
-                ]
-            },
+    # read-only endpoints, safe to send again after a server error
+    idempotent_endpoints = {
+        "users.list",
+        "users.info",
+        "groups.list",
+        "groups.info",
+        "groups.memberships",
+    }
+
+    def __init__(
+        self,
+        transport=None,
+        api_url=None,
+        scheduler=None,
+        group_index=None,
+        user_cache=None,
+        breaker=None,
+        user_groups_cache=None,
+    ):
+        self.transport = transport or get_shared_transport()
+        self.scheduler = scheduler or get_shared_scheduler()
+        self.breaker = breaker or get_shared_breaker()
+        if api_url is not None:
+            self.api_url = api_url
+        self.group_index = group_index or get_shared_group_index(self.api_url)
+        self.user_cache = user_cache or get_shared_user_cache(self.api_url)
+        self.user_groups_cache = user_groups_cache or get_shared_user_groups_cache(
+            self.api_url
+        )
+
+    def _is_retryable(self, endpoint, response):
+        if response.status_code == 429:
+            return True
+        return response.status_code >= 500 and endpoint in self.idempotent_endpoints
+
+    def _post(self, endpoint, payload):
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise CircuitOpen(
+                    503,
+                    f"Outline is unavailable, retry in {self.breaker.retry_in():.0f} s",
+                )
+            self.scheduler.acquire(endpoint)
+            try:
+                response = self._send(endpoint, payload)
+            except requests.RequestException as error:
+                self.breaker.record_failure()
+                if (
+                    endpoint not in self.idempotent_endpoints
+                    or attempt >= self.scheduler.max_retries
+                ):
+                    raise OutlineUnreachable(None, str(error))
+                self.scheduler.wait_before_retry(endpoint, attempt, None)
+                attempt += 1
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            if (
+                not self._is_retryable(endpoint, response)
+                or attempt >= self.scheduler.max_retries
+                or not self.scheduler.wait_before_retry(endpoint, attempt, response)
+            ):
+                break
+            attempt += 1
+
+        if response.status_code == 429:
+            raise RateLimited(429, f"{endpoint} - too many requests")
+        return response
+
+    def _send(self, endpoint, payload):
+        started_at = time.perf_counter()
+        try:
+            response = self.transport.post(
+                f"{self.api_url}/{endpoint}",
+                headers=self.headers,
+                json=payload,
+            )
+        except Exception:
+            metrics.record(endpoint, "error", time.perf_counter() - started_at)
+            raise
+
+        request = getattr(response, "request", None)
+        metrics.record(
+            endpoint,
+            response.status_code,
+            time.perf_counter() - started_at,
+            bytes_sent=len(getattr(request, "body", None) or b""),
+            bytes_received=len(response.content or b""),
         )
+        return response
+
+    def connection_stats(self):
+        return self.transport.stats()
+
+    def _invite_payload(self, user: User):
+        return {
+            "name": f"{user.first_name} {user.last_name}",
+            "email": user.email,
+            "role": "member",
+        }
+
+    @staticmethod
+    def _raise_for_status(response):
         if 400 <= response.status_code < 500:
             data = response.json()
             raise InvalidRequest(
@@ -58,39 +183,72 @@ class Client:
         if response.status_code >= 500:
             raise RemoteServerError(response.status_code)
 
+    def _post_invites(self, users):
+        response = self._post(
+            "users.invite",
+            {"invites": [self._invite_payload(user) for user in users]},
+        )
+        self._raise_for_status(response)
+        return response
+
+    def invite_to_outline(self, user: User):
+        response = self._post_invites([user])
+
         if len(response.json()["data"]["users"]) == 0:
             raise InvitationFailed(response.status_code)
 
         user_uuid = response.json()["data"]["users"][0]["id"]
         return user_uuid
 
+    def invite_many_to_outline(self, users, chunk_size=OUTLINE_INVITE_CHUNK_SIZE):
+        """
+        Invites users by chunks of `chunk_size` and returns a mapping from
+        (lowercased) email to the UUID of each user created on Outline.
+        Users who already have an Outline account are missing from the mapping.
+        """
+        users = list(users)
+        uuids_by_email = {}
+        for start in range(0, len(users), chunk_size):
+            data = self._post_invites(users[start : start + chunk_size]).json()["data"]
+            # users.invite does not always return emails: fall back on names
+            emails_by_name = {
+                invite["name"]: invite["email"] for invite in data.get("sent", [])
+            }
+            for outline_user in data["users"]:
+                email = outline_user.get("email") or emails_by_name.get(
+                    outline_user["name"]
+                )
+                if email:
+                    uuids_by_email[email.lower()] = outline_user["id"]
+        return uuids_by_email
+
     def add_to_outline_group(self, user_uuid, group_uuid):
-        response = requests.post(
-            url=f"{self.api_url}/groups.add_user",
-            headers=self.headers,
-            json={
+        response = self._post(
+            "groups.add_user",
+            {
                 "id": str(group_uuid),
                 "userId": str(user_uuid),
             },
         )
         if response.json()["ok"] is False:
             raise Exception(response.json()["message"])
+        self.user_groups_cache.add(user_uuid, group_uuid)
 
     def remove_from_outline_group(self, user_uuid, group_uuid):
-        requests.post(
-            url=f"{self.api_url}/groups.remove_user",
-            headers=self.headers,
-            json={
+        response = self._post(
+            "groups.remove_user",
+            {
                 "id": str(group_uuid),
                 "userId": str(user_uuid),
             },
         )
+        self._raise_for_status(response)
+        self.user_groups_cache.discard(user_uuid, group_uuid)
 
     def list_users(self, query="", offset=0, limit=25):
-        response = requests.post(
-            url=f"{self.api_url}/users.list",
-            headers=self.headers,
-            json={
+        response = self._post(
+            "users.list",
+            {
                 "offset": offset,
                 "limit": limit,
                 "sort": "updatedAt",
@@ -105,25 +263,39 @@ class Client:
         return response.json()["data"]
 
     def find_user_from_email(self, email):
-        response = requests.post(
-            url=f"{self.api_url}/users.list",
-            headers=self.headers,
-            json={
-                "offset": 0,
-                "limit": 1,
-                "emails": [email],
-            },
-        )
-        if response.status_code != 200:
-            raise RemoteServerError(response.status_code)
+        return self.find_users_from_emails([email])[email.lower()]
+
+    def find_users_from_emails(self, emails, chunk_size=OUTLINE_EMAIL_CHUNK_SIZE):
+        """
+        Returns a mapping from (lowercased) email to Outline user, filling the
+        `emails` filter of users.list by chunks. Unknown emails are left out.
+        """
+        emails = list(dict.fromkeys(email.lower() for email in emails))
+        users_by_email, missing = self.user_cache.get_many(emails)
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start : start + chunk_size]
+            response = self._post(
+                "users.list",
+                {
+                    "offset": 0,
+                    "limit": len(chunk),
+                    "emails": chunk,
+                },
+            )
+            if response.status_code != 200:
+                raise RemoteServerError(response.status_code)
+
+            found = {user["email"].lower(): user for user in response.json()["data"]}
+            self.user_cache.set_many(found)
+            users_by_email.update(found)
 
-        return response.json()["data"][0]
+        return users_by_email
 
     def create_new_group(self, group_name):
-        response = requests.post(
-            url=f"{self.api_url}/groups.create",
-            headers=self.headers,
-            json={"name": group_name},
+        response = self._post(
+            "groups.create",
+            {"name": group_name},
         )
         if response.status_code >= 500:
             raise RemoteServerError(response.status_code)
@@ -134,45 +306,32 @@ class Client:
                 400, f"{data.get('error')} - {data.get('message')}"
             )
 
-        group_uuid = response.json()["data"]["id"]
-        return group_uuid
-
-    def list_groups(self, offset=0, limit=25):
-        response = requests.post(
-            url=f"{self.api_url}/groups.list",
-            headers=self.headers,
-            json={
-                "offset": offset,
-                "limit": limit,
-                "sort": "createdAt",
-                "direction": "ASC",
-            },
-        )
+        group = response.json()["data"]
+        self.group_index.add(group)
+        return group["id"]
+
+    def list_groups(self, offset=0, limit=25, user_id=None):
+        payload = {
+            "offset": offset,
+            "limit": limit,
+            "sort": "createdAt",
+            "direction": "ASC",
+        }
+        if user_id is not None:
+            # only the groups this user is a member of
+            payload["userId"] = str(user_id)
+        response = self._post("groups.list", payload)
         if response.status_code >= 500:
             raise RemoteServerError(response.status_code)
         return response.json().get("data").get("groups")
 
     def find_group_by_name(self, group_name):
-        offset = 0
-        step = 20
-        group_list = self.list_groups(offset, step)
-        matching_groups = [group for group in group_list if group["name"] == group_name]
-
-        while len(group_list) and not (len(matching_groups)):
-            offset += step
-            group_list = self.list_groups(offset, step)
-            matching_groups = [
-                group for group in group_list if group["name"] == group_name
-            ]
-
-        if len(matching_groups):
-            return matching_groups[0]
+        return self.group_index.get(group_name, self)
 
     def _request_list_memberships(self, group_id, offset, limit):
-        response = requests.post(
-            url=f"{self.api_url}/groups.memberships",
-            headers=self.headers,
-            json={
+        response = self._post(
+            "groups.memberships",
+            {
                 "offset": offset,
                 "limit": limit,
                 "sort": "createdAt",
@@ -194,19 +353,18 @@ class Client:
             users = self._request_list_memberships(group_id, offset, limit)
 
     def remove_user_from_outline(self, user: User):
-        requests.post(
-            url=f"{self.api_url}/users.delete",
-            headers=self.headers,
-            json={
+        self._post(
+            "users.delete",
+            {
                 "id": str(user.outline_uuid),
             },
         )
 
     def delete_group_from_outline(self, group: Organisation):
-        requests.post(
-            url=f"{self.api_url}/groups.delete",
-            headers=self.headers,
-            json={
+        self.group_index.discard(group.name)
+        self._post(
+            "groups.delete",
+            {
                 "id": str(group.outline_group_uuid),
             },
         )
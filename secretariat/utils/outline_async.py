@@ -0,0 +1,166 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from config.settings import OUTLINE_CONCURRENCY
+from secretariat.utils.outline import Client
+
+
+class AsyncClient:
+    """
+    Asyncio counterpart of `Client` for the read-only, paginated endpoints.
+
+    Calls are made by the regular `Client` on a thread pool, so they share the
+    keep-alive transport. A semaphore caps the number of requests in flight.
+    """
+
+    def __init__(self, client=None, concurrency=OUTLINE_CONCURRENCY, executor=None):
+        self.client = client or Client()
+        self.concurrency = concurrency
+        self.executor = executor
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _call(self, method, *args, **kwargs):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, partial(method, *args, **kwargs)
+            )
+
+    async def _gather(self, *coroutines):
+        # wait for every request before raising, so no task is left pending
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def list_users(self, offset=0, limit=25):
+        return await self._call(self.client.list_users, offset=offset, limit=limit)
+
+    async def list_groups(self, offset=0, limit=25, user_id=None):
+        return await self._call(
+            self.client.list_groups, offset=offset, limit=limit, user_id=user_id
+        )
+
+    async def list_group_memberships(self, group_id, offset=0, limit=25):
+        return await self._call(
+            self.client._request_list_memberships, group_id, offset, limit
+        )
+
+    async def iter_pages(self, fetch_page, start_offset=0, limit=25):
+        """
+        Yield `(offset, page)` in order, up to the first page shorter than
+        `limit`. The first page is fetched alone: most listings fit in it, and
+        only a full one is followed by `concurrency` pages at a time.
+        """
+        page = await fetch_page(offset=start_offset, limit=limit)
+        if page:
+            yield start_offset, page
+        if len(page) < limit:
+            return
+
+        offset = start_offset + limit
+        while True:
+            offsets = [offset + i * limit for i in range(self.concurrency)]
+            pages = await self._gather(
+                *(
+                    fetch_page(offset=page_offset, limit=limit)
+                    for page_offset in offsets
+                )
+            )
+            for page_offset, page in zip(offsets, pages):
+                if page:
+                    yield page_offset, page
+                if len(page) < limit:
+                    return
+            offset = offsets[-1] + limit
+
+    async def list_group_users(self, group_id, limit=25):
+        users = []
+        async for _, page in self.iter_pages(
+            partial(self.list_group_memberships, group_id), limit=limit
+        ):
+            users.extend(page)
+        return users
+
+    async def list_user_groups(self, user_id, limit=25):
+        groups = []
+        async for _, page in self.iter_pages(
+            partial(self.list_groups, user_id=user_id), limit=limit
+        ):
+            groups.extend(page)
+        return groups
+
+    async def list_many_user_groups(self, user_ids):
+        user_ids = list(user_ids)
+        results = await self._gather(
+            *(self.list_user_groups(user_id) for user_id in user_ids)
+        )
+        return dict(zip(user_ids, results))
+
+    async def list_many_group_users(self, group_ids):
+        group_ids = list(group_ids)
+        results = await self._gather(
+            *(self.list_group_users(group_id) for group_id in group_ids)
+        )
+        return dict(zip(group_ids, results))
+
+
+class ConcurrentClient:
+    """
+    Synchronous facade over `AsyncClient`, usable from management commands
+    and models. Each call runs on its own event loop.
+    """
+
+    def __init__(self, client=None, concurrency=OUTLINE_CONCURRENCY):
+        self.client = client or Client()
+        self.concurrency = concurrency
+
+    def _async_client(self, executor):
+        return AsyncClient(self.client, self.concurrency, executor)
+
+    def _iterate(self, make_generator):
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            generator = make_generator(self._async_client(executor))
+            try:
+                while True:
+                    try:
+                        yield loop.run_until_complete(generator.__anext__())
+                    except StopAsyncIteration:
+                        break
+            finally:
+                loop.run_until_complete(generator.aclose())
+        finally:
+            executor.shutdown(wait=True)
+            loop.close()
+
+    def _run(self, make_coroutine):
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            return loop.run_until_complete(make_coroutine(self._async_client(executor)))
+        finally:
+            executor.shutdown(wait=True)
+            loop.close()
+
+    def iter_user_pages(self, start_offset=0, limit=25):
+        return self._iterate(
+            lambda client: client.iter_pages(client.list_users, start_offset, limit)
+        )
+
+    def iter_group_pages(self, start_offset=0, limit=25):
+        return self._iterate(
+            lambda client: client.iter_pages(client.list_groups, start_offset, limit)
+        )
+
+    def list_group_users(self, group_id):
+        return self._run(lambda client: client.list_group_users(group_id))
+
+    def list_many_group_users(self, group_ids):
+        return self._run(lambda client: client.list_many_group_users(group_ids))
+
+    def list_many_user_groups(self, user_ids):
+        return self._run(lambda client: client.list_many_user_groups(user_ids))
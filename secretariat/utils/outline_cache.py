@@ -0,0 +1,184 @@
+import threading
+import time
+
+from config.settings import OUTLINE_GROUP_INDEX_TTL, OUTLINE_USER_CACHE_TTL
+
+
+class GroupIndex:
+    """
+    Name → group index of every Outline group.
+
+    The index is built with one paginated sweep of `groups.list` and kept for
+    `ttl` seconds; `invalidate()` forces the next lookup to rebuild it.
+    """
+
+    page_size = 100
+
+    def __init__(self, ttl=OUTLINE_GROUP_INDEX_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.groups_by_name = None
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        return self.built_at is None or self.clock() - self.built_at > self.ttl
+
+    def refresh(self, client):
+        groups_by_name = {}
+        offset = 0
+        groups = client.list_groups(offset, self.page_size)
+        while len(groups):
+            for group in groups:
+                groups_by_name.setdefault(group["name"], group)
+            offset += self.page_size
+            groups = client.list_groups(offset, self.page_size)
+
+        with self.lock:
+            self.groups_by_name = groups_by_name
+            self.built_at = self.clock()
+        return groups_by_name
+
+    def invalidate(self):
+        with self.lock:
+            self.groups_by_name = None
+            self.built_at = None
+
+    def get(self, name, client):
+        with self.lock:
+            groups_by_name = None if self.is_stale() else self.groups_by_name
+
+        if groups_by_name is None:
+            return self.refresh(client).get(name)
+
+        group = groups_by_name.get(name)
+        if group is None:
+            # the group may have been created since the index was built
+            group = self.refresh(client).get(name)
+        return group
+
+    def add(self, group):
+        with self.lock:
+            if self.groups_by_name is not None:
+                self.groups_by_name[group["name"]] = group
+
+    def discard(self, name):
+        with self.lock:
+            if self.groups_by_name is not None:
+                self.groups_by_name.pop(name, None)
+
+
+class UserEmailCache:
+    """
+    Short-lived memo of Outline users by (lowercased) email, so repeated
+    lookups of the same people during a sync do not hit the API again.
+    """
+
+    def __init__(self, ttl=OUTLINE_USER_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.users_by_email = {}
+        self.lock = threading.Lock()
+
+    def get_many(self, emails):
+        """Returns the cached users and the emails still to resolve."""
+        found, missing = {}, []
+        now = self.clock()
+        with self.lock:
+            for email in emails:
+                cached = self.users_by_email.get(email)
+                if cached is not None and now - cached[1] <= self.ttl:
+                    found[email] = cached[0]
+                else:
+                    missing.append(email)
+        return found, missing
+
+    def set_many(self, users_by_email):
+        now = self.clock()
+        with self.lock:
+            for email, user in users_by_email.items():
+                self.users_by_email[email] = (user, now)
+
+    def clear(self):
+        with self.lock:
+            self.users_by_email.clear()
+
+
+class UserGroupsCache:
+    """
+    Short-lived snapshot of the Outline groups each user belongs to, keyed by
+    user UUID. The client updates it on every group addition and removal, so
+    repeated syncs of the same users do not need to read Outline again.
+    """
+
+    def __init__(self, ttl=OUTLINE_USER_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.groups_by_user = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_uuid):
+        with self.lock:
+            cached = self.groups_by_user.get(str(user_uuid))
+            if cached is None or self.clock() - cached[1] > self.ttl:
+                return None
+            return set(cached[0])
+
+    def set(self, user_uuid, group_uuids):
+        with self.lock:
+            self.groups_by_user[str(user_uuid)] = (
+                set(str(group_uuid) for group_uuid in group_uuids),
+                self.clock(),
+            )
+
+    def add(self, user_uuid, group_uuid):
+        with self.lock:
+            cached = self.groups_by_user.get(str(user_uuid))
+            if cached is not None:
+                cached[0].add(str(group_uuid))
+
+    def discard(self, user_uuid, group_uuid):
+        with self.lock:
+            cached = self.groups_by_user.get(str(user_uuid))
+            if cached is not None:
+                cached[0].discard(str(group_uuid))
+
+    def clear(self):
+        with self.lock:
+            self.groups_by_user.clear()
+
+
+_shared_group_indexes = {}
+_shared_group_indexes_lock = threading.Lock()
+
+
+def get_shared_group_index(api_url):
+    """Process-wide group index, one per Outline instance."""
+    with _shared_group_indexes_lock:
+        if api_url not in _shared_group_indexes:
+            _shared_group_indexes[api_url] = GroupIndex()
+        return _shared_group_indexes[api_url]
+
+
+_shared_user_caches = {}
+_shared_user_caches_lock = threading.Lock()
+
+
+def get_shared_user_cache(api_url):
+    """Process-wide email → user memo, one per Outline instance."""
+    with _shared_user_caches_lock:
+        if api_url not in _shared_user_caches:
+            _shared_user_caches[api_url] = UserEmailCache()
+        return _shared_user_caches[api_url]
+
+
+_shared_user_groups_caches = {}
+_shared_user_groups_caches_lock = threading.Lock()
+
+
+def get_shared_user_groups_cache(api_url):
+    """Process-wide user → groups snapshot, one per Outline instance."""
+    with _shared_user_groups_caches_lock:
+        if api_url not in _shared_user_groups_caches:
+            _shared_user_groups_caches[api_url] = UserGroupsCache()
+        return _shared_user_groups_caches[api_url]
@@ -0,0 +1,218 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from config.settings import OUTLINE_CONCURRENCY
+from secretariat.models import (
+    Membership,
+    Organisation,
+    OutlineGroup,
+    OutlineGroupMembership,
+    OutlineUser,
+    User,
+)
+from secretariat.utils.outline_async import ConcurrentClient
+from secretariat.utils.sync_plan import ADD, REMOVE
+
+BULK_BATCH_SIZE = 1000
+
+
+def _outline_user(user, fetched_at):
+    return OutlineUser(
+        id=user["id"],
+        name=user["name"],
+        email=user.get("email") or "",
+        is_admin=user.get("isAdmin", False),
+        is_suspended=user.get("isSuspended", False),
+        updated_at=parse_datetime(user["updatedAt"]) if user.get("updatedAt") else None,
+        fetched_at=fetched_at,
+    )
+
+
+def refresh_mirror(client, concurrency=OUTLINE_CONCURRENCY):
+    """
+    Reads every Outline user, group and group membership, then replaces the
+    mirror tables in one transaction. Returns the number of rows of each.
+    """
+    concurrent_client = ConcurrentClient(client, concurrency)
+
+    users = {}
+    for _, page in concurrent_client.iter_user_pages():
+        users.update((user["id"], user) for user in page)
+
+    groups, memberships = {}, []
+    for _, page in concurrent_client.iter_group_pages():
+        members_by_group = concurrent_client.list_many_group_users(
+            group["id"] for group in page
+        )
+        for group in page:
+            groups[group["id"]] = group
+            for member in members_by_group[group["id"]]:
+                users.setdefault(member["id"], member)
+                memberships.append((group["id"], member["id"]))
+
+    fetched_at = timezone.now()
+    with transaction.atomic():
+        OutlineGroupMembership.objects.all().delete()
+        OutlineGroup.objects.all().delete()
+        OutlineUser.objects.all().delete()
+        OutlineUser.objects.bulk_create(
+            (_outline_user(user, fetched_at) for user in users.values()),
+            batch_size=BULK_BATCH_SIZE,
+        )
+        OutlineGroup.objects.bulk_create(
+            (
+                OutlineGroup(id=group["id"], name=group["name"], fetched_at=fetched_at)
+                for group in groups.values()
+            ),
+            batch_size=BULK_BATCH_SIZE,
+        )
+        OutlineGroupMembership.objects.bulk_create(
+            (
+                OutlineGroupMembership(
+                    group_id=group_id, user_id=user_id, fetched_at=fetched_at
+                )
+                for group_id, user_id in set(memberships)
+            ),
+            batch_size=BULK_BATCH_SIZE,
+        )
+    return {"users": len(users), "groups": len(groups), "memberships": len(memberships)}
+
+
+def last_refresh():
+    """Date of the last mirror refresh, None if it was never filled."""
+    return (
+        OutlineUser.objects.order_by("-fetched_at")
+        .values_list("fetched_at", flat=True)
+        .first()
+    )
+
+
+class MirroredOutlineState:
+    """
+    Outline state read from the mirror tables instead of the API, with the
+    same interface as `RemoteOutlineState`.
+    """
+
+    def group_members(self, group_uuids):
+        members = {str(group_uuid): set() for group_uuid in group_uuids}
+        for group_id, user_id in OutlineGroupMembership.objects.filter(
+            group_id__in=members
+        ).values_list("group_id", "user_id"):
+            members[str(group_id)].add(str(user_id))
+        return members
+
+    def user_groups(self, user_uuids):
+        groups = {str(user_uuid): set() for user_uuid in user_uuids}
+        for user_id, group_id in OutlineGroupMembership.objects.filter(
+            user_id__in=groups
+        ).values_list("user_id", "group_id"):
+            groups[str(user_id)].add(str(group_id))
+        return groups
+
+    def record(self, plan, operations):
+        """Applies the group changes that went through to the mirror."""
+        fetched_at = timezone.now()
+        added, removed = [], []
+        for operation in operations:
+            # invitations and group creations have no membership to mirror
+            if operation.kind not in (ADD, REMOVE):
+                continue
+            organisation = plan.organisations[operation.organisation_id]
+            if operation.kind == ADD:
+                user = plan.users[operation.user_id]
+                added.append((organisation, user))
+            elif operation.kind == REMOVE:
+                removed.append((organisation.outline_group_uuid, operation.user_uuid))
+
+        with transaction.atomic():
+            OutlineUser.objects.bulk_create(
+                [
+                    OutlineUser(
+                        id=user.outline_uuid,
+                        name=str(user),
+                        email=user.email,
+                        fetched_at=fetched_at,
+                    )
+                    for _, user in added
+                ],
+                ignore_conflicts=True,
+            )
+            OutlineGroup.objects.bulk_create(
+                [
+                    OutlineGroup(
+                        id=organisation.outline_group_uuid,
+                        name=organisation.name,
+                        fetched_at=fetched_at,
+                    )
+                    for organisation, _ in added
+                ],
+                ignore_conflicts=True,
+            )
+            OutlineGroupMembership.objects.bulk_create(
+                [
+                    OutlineGroupMembership(
+                        group_id=organisation.outline_group_uuid,
+                        user_id=user.outline_uuid,
+                        fetched_at=fetched_at,
+                    )
+                    for organisation, user in added
+                ],
+                ignore_conflicts=True,
+            )
+            for group_uuid, user_uuid in removed:
+                OutlineGroupMembership.objects.filter(
+                    group_id=group_uuid, user_id=user_uuid
+                ).delete()
+
+
+def users_missing_from_outline():
+    """Django users linked to an Outline account that no longer exists."""
+    return User.objects.filter(outline_uuid__isnull=False).exclude(
+        Exists(OutlineUser.objects.filter(id=OuterRef("outline_uuid")))
+    )
+
+
+def outline_users_missing_from_django():
+    return OutlineUser.objects.exclude(
+        Exists(User.objects.filter(outline_uuid=OuterRef("id")))
+    )
+
+
+def memberships_missing_from_outline():
+    """Active Django memberships whose user is not in the Outline group."""
+    return (
+        Membership.objects.active()
+        .filter(
+            user__outline_uuid__isnull=False,
+            organisation__outline_group_uuid__isnull=False,
+        )
+        .exclude(
+            Exists(
+                OutlineGroupMembership.objects.filter(
+                    group_id=OuterRef("organisation__outline_group_uuid"),
+                    user_id=OuterRef("user__outline_uuid"),
+                )
+            )
+        )
+        .select_related("user", "organisation")
+    )
+
+
+def outline_memberships_missing_from_django():
+    """Members of organisations' Outline groups without an active Django membership."""
+    return (
+        OutlineGroupMembership.objects.filter(
+            Exists(Organisation.objects.filter(outline_group_uuid=OuterRef("group_id")))
+        )
+        .exclude(
+            Exists(
+                Membership.objects.active().filter(
+                    organisation__outline_group_uuid=OuterRef("group_id"),
+                    user__outline_uuid=OuterRef("user_id"),
+                )
+            )
+        )
+        .select_related("user", "group")
+    )
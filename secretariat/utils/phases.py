@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+
+from secretariat.utils.queries import QueryCounter
+
+
+class PhaseRecorder:
+    """
+    Wall time and SQL queries spent in the named phases of a long-running
+    command. A phase can be entered many times, its totals add up.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = {}
+
+    def _add(self, name, seconds, queries):
+        phase = self.phases.setdefault(
+            name, {"seconds": 0.0, "queries": 0, "entries": 0}
+        )
+        phase["seconds"] += seconds
+        phase["queries"] += queries
+        phase["entries"] += 1
+
+    @contextmanager
+    def phase(self, name):
+        counter = QueryCounter()
+        started = self.clock()
+        try:
+            with counter:
+                yield
+        finally:
+            self._add(name, self.clock() - started, counter.count)
+
+    def iterate(self, name, iterable):
+        """Yields from `iterable`, recording the time spent waiting for each item in `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self):
+        return {name: dict(phase) for name, phase in self.phases.items()}
+
+    def summary_lines(self):
+        return [
+            f"{name} : {phase['seconds']:.2f} s, {phase['queries']} requête(s) SQL"
+            for name, phase in self.phases.items()
+        ]
@@ -0,0 +1,107 @@
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+
+from django.db import connection
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalise(sql):
+    """`sql` with its literals and parameters replaced, so that runs of the same statement group together."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql.replace("%s", "?"))
+    sql = _PARAMETER_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class QueryCounter:
+    """
+    Counts the SQL queries run on the default connection inside a `with`
+    block, through `connection.execute_wrapper`.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def record(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self.record)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+class QueryRecorder(QueryCounter):
+    """A `QueryCounter` that also counts the runs of each normalised statement."""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = Counter()
+
+    def record(self, execute, sql, params, many, context):
+        self.statements[normalise(sql)] += 1
+        return super().record(execute, sql, params, many, context)
+
+    def repeated(self, threshold=2):
+        """`(statement, count)` pairs run at least `threshold` times, most repeated first."""
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def report(self, limit=5):
+        return "\n".join(
+            f"  {count}× {statement}"
+            for statement, count in self.statements.most_common(limit)
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(QueryRecorder, ContextDecorator):
+    """
+    Fails with `QueryBudgetExceeded` when the block (or decorated function)
+    runs more than `max_queries` queries, or any single normalised statement
+    more than `max_repeats` times, the usual sign of an N+1 pattern.
+    """
+
+    def __init__(self, max_queries, max_repeats=None):
+        super().__init__()
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def __enter__(self):
+        # a decorator enters the same budget on every call
+        self.count = 0
+        self.statements = Counter()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, *exc_info):
+        super().__exit__(exc_type, *exc_info)
+        if exc_type is not None:
+            return False
+        if self.count > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"{self.count} requêtes SQL pour un budget de {self.max_queries} :\n"
+                f"{self.report()}"
+            )
+        repeated = self.max_repeats is not None and self.repeated(self.max_repeats + 1)
+        if repeated:
+            statement, count = repeated[0]
+            raise QueryBudgetExceeded(
+                f"Requête répétée {count} fois pour un maximum de {self.max_repeats} :\n"
+                f"  {statement}"
+            )
+        return False
@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from config.settings import (
+    OUTLINE_BACKOFF_BASE,
+    OUTLINE_BACKOFF_MAX,
+    OUTLINE_MAX_RETRIES,
+    OUTLINE_RATE_BURST,
+    OUTLINE_RATE_LIMIT,
+    OUTLINE_RETRY_AFTER_MAX,
+)
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Tokens may go negative: a caller reserves a token
+    and is told how long to wait before using it, so waiting callers are
+    served in order without holding a lock while they sleep.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def reserve(self):
+        self._refill()
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0)
+
+    def block(self, seconds):
+        """No token will be handed out for `seconds` (e.g. after a Retry-After)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class RequestScheduler:
+    """
+    Paces Outline API calls with one token bucket per endpoint and decides
+    how long to wait before retrying a throttled or failed call.
+    """
+
+    def __init__(
+        self,
+        rate=OUTLINE_RATE_LIMIT,
+        burst=OUTLINE_RATE_BURST,
+        max_retries=OUTLINE_MAX_RETRIES,
+        backoff_base=OUTLINE_BACKOFF_BASE,
+        backoff_max=OUTLINE_BACKOFF_MAX,
+        retry_after_max=OUTLINE_RETRY_AFTER_MAX,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.sleep = sleep
+        self.clock = clock
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def _bucket(self, endpoint):
+        if endpoint not in self.buckets:
+            self.buckets[endpoint] = TokenBucket(
+                self.rate, max(self.burst, 1), self.clock
+            )
+        return self.buckets[endpoint]
+
+    def _wait(self, delay):
+        if delay <= 0:
+            return
+        with self.lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            self.sleep(delay)
+        finally:
+            with self.lock:
+                self.queue_depth -= 1
+                self.wait_time += delay
+
+    def acquire(self, endpoint):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            delay = self._bucket(endpoint).reserve()
+        self._wait(delay)
+
+    def backoff_delay(self, attempt):
+        # "equal jitter": half of the exponential delay, plus a random half
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def retry_after_delay(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+    def wait_before_retry(self, endpoint, attempt, response):
+        """
+        `response` is None when the previous attempt got no answer. Returns
+        False, without waiting, when the server asks for a longer pause than
+        `retry_after_max`: the caller should give up instead of retrying.
+        """
+        delay = None
+        throttled = response is not None and response.status_code == 429
+        if throttled:
+            delay = self.retry_after_delay(response)
+            if delay is not None and delay > self.retry_after_max:
+                return False
+        if delay is None:
+            delay = self.backoff_delay(attempt)
+        with self.lock:
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+
+        if throttled and self.rate > 0:
+            # the whole endpoint is throttled: every caller waits in acquire()
+            with self.lock:
+                self._bucket(endpoint).block(delay)
+        else:
+            self._wait(delay)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "wait_time": self.wait_time,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_shared_scheduler():
+    """Process-wide scheduler, shared by every `Client` instance."""
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = RequestScheduler()
+        return _shared_scheduler
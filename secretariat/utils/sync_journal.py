@@ -0,0 +1,78 @@
+from django.utils import timezone
+
+from secretariat.models import Organisation, SyncOperation, SyncRun, User
+from secretariat.utils.sync_plan import Operation, SyncPlan
+
+
+class SyncJournal:
+    """
+    Persists the operations of a `SyncPlan` and their outcome as they are
+    applied, so an interrupted run can be resumed without repeating the
+    Outline calls that already succeeded.
+    """
+
+    def __init__(self, run):
+        self.run = run
+
+    @classmethod
+    def start(cls, plan):
+        run = SyncRun.objects.create()
+        SyncOperation.objects.bulk_create(
+            SyncOperation(
+                run=run,
+                key=operation.key,
+                kind=operation.kind,
+                organisation_id=operation.organisation_id,
+                user_id=operation.user_id,
+                user_uuid=operation.user_uuid or "",
+            )
+            for operation in plan.operations
+        )
+        return cls(run)
+
+    @classmethod
+    def resume(cls, run_id):
+        """Returns the journal of run `run_id` and the plan of its remaining operations."""
+        run = SyncRun.objects.get(pk=run_id, kind=SyncRun.SYNC)
+        run.status = SyncRun.RUNNING
+        run.finished_at = None
+        run.resumed_count += 1
+        run.save(update_fields=["status", "finished_at", "resumed_count"])
+
+        operations = [
+            Operation(
+                journaled.kind,
+                journaled.organisation_id,
+                journaled.user_id,
+                journaled.user_uuid or None,
+            )
+            for journaled in run.operations.exclude(status=SyncOperation.DONE).order_by(
+                "pk"
+            )
+        ]
+        # users invited and groups created before the interruption now have
+        # their Outline UUID in the database
+        plan = SyncPlan(
+            organisations=Organisation.objects.in_bulk(
+                set(op.organisation_id for op in operations if op.organisation_id)
+            ),
+            users=User.objects.in_bulk(
+                set(op.user_id for op in operations if op.user_id)
+            ),
+            operations=operations,
+        )
+        return cls(run), plan
+
+    def record(self, operations, error=None):
+        SyncOperation.objects.filter(
+            run=self.run, key__in=[operation.key for operation in operations]
+        ).update(
+            status=SyncOperation.DONE if error is None else SyncOperation.FAILED,
+            error="" if error is None else f"{type(error).__name__} : {error}",
+            updated_at=timezone.now(),
+        )
+
+    def finish(self, result):
+        self.run.status = SyncRun.FAILED if result.errors else SyncRun.DONE
+        self.run.finished_at = timezone.now()
+        self.run.save(update_fields=["status", "finished_at"])
@@ -0,0 +1,357 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from config.settings import OUTLINE_CONCURRENCY, OUTLINE_INVITE_CHUNK_SIZE
+from secretariat.models import Membership, Organisation, User
+from secretariat.utils.outline import Client, GroupCreationFailed, InvitationFailed
+from secretariat.utils.outline_async import ConcurrentClient
+
+CREATE_GROUP = "create_group"
+INVITE = "invite"
+ADD = "add"
+REMOVE = "remove"
+
+
+@dataclass(frozen=True)
+class Operation:
+    kind: str
+    organisation_id: int = None
+    user_id: int = None
+    user_uuid: str = None
+
+    @property
+    def key(self):
+        """Identifies the operation, whatever the run it belongs to."""
+        if self.kind == CREATE_GROUP:
+            return f"{CREATE_GROUP}:{self.organisation_id}"
+        if self.kind == INVITE:
+            return f"{INVITE}:{self.user_id}"
+        if self.kind == ADD:
+            return f"{ADD}:{self.organisation_id}:{self.user_id}"
+        return f"{REMOVE}:{self.organisation_id}:{self.user_uuid}"
+
+
+@dataclass
+class SyncPlan:
+    """Minimal set of Outline operations to bring groups in line with Django."""
+
+    organisations: dict = field(default_factory=dict)
+    users: dict = field(default_factory=dict)
+    operations: list = field(default_factory=list)
+
+    def of_kind(self, kind):
+        return [operation for operation in self.operations if operation.kind == kind]
+
+    def estimated_api_calls(self, invite_chunk_size=OUTLINE_INVITE_CHUNK_SIZE):
+        estimate = {
+            CREATE_GROUP: len(self.of_kind(CREATE_GROUP)),
+            INVITE: math.ceil(len(self.of_kind(INVITE)) / invite_chunk_size),
+            ADD: len(self.of_kind(ADD)),
+            REMOVE: len(self.of_kind(REMOVE)),
+        }
+        estimate["total"] = sum(estimate.values())
+        return estimate
+
+    def describe(self):
+        lines = []
+        for operation in self.operations:
+            organisation = self.organisations.get(operation.organisation_id)
+            user = self.users.get(operation.user_id, operation.user_uuid)
+            if operation.kind == CREATE_GROUP:
+                lines.append(f"Créer le groupe Outline « {organisation} »")
+            elif operation.kind == INVITE:
+                lines.append(f"Inviter {user} ({user.email}) sur Outline")
+            elif operation.kind == ADD:
+                lines.append(f"Ajouter {user} au groupe « {organisation} »")
+            else:
+                lines.append(f"Retirer {user} du groupe « {organisation} »")
+        return lines
+
+
+class RemoteOutlineState:
+    """Outline state read through the API."""
+
+    def __init__(self, client, concurrency=OUTLINE_CONCURRENCY):
+        self.concurrent_client = ConcurrentClient(client, concurrency)
+
+    def group_members(self, group_uuids):
+        """Maps each group UUID to the set of its members' UUIDs."""
+        members_by_group = self.concurrent_client.list_many_group_users(
+            str(group_uuid) for group_uuid in group_uuids
+        )
+        return {
+            group_uuid: set(str(member["id"]) for member in members)
+            for group_uuid, members in members_by_group.items()
+        }
+
+    def user_groups(self, user_uuids):
+        """
+        Maps each user UUID to the set of UUIDs of the groups they belong to,
+        reusing the client's snapshot when it is still fresh.
+        """
+        cache = self.concurrent_client.client.user_groups_cache
+        groups_by_user, missing = {}, []
+        for user_uuid in map(str, user_uuids):
+            cached = cache.get(user_uuid)
+            if cached is None:
+                missing.append(user_uuid)
+            else:
+                groups_by_user[user_uuid] = cached
+
+        for user_uuid, groups in self.concurrent_client.list_many_user_groups(
+            missing
+        ).items():
+            groups_by_user[user_uuid] = set(str(group["id"]) for group in groups)
+            cache.set(user_uuid, groups_by_user[user_uuid])
+        return groups_by_user
+
+
+class SyncPlanner:
+    """
+    Loads the Django memberships in effect today and the Outline group
+    memberships once, and computes the operations needed to synchronize a set
+    of organisations.
+    """
+
+    def __init__(self, client=None, outline_state=None):
+        self.client = client or Client()
+        self.outline_state = outline_state or RemoteOutlineState(self.client)
+
+    def plan(self, organisations):
+        plan = SyncPlan(
+            organisations={
+                organisation.pk: organisation for organisation in organisations
+            }
+        )
+
+        users_by_organisation = {pk: {} for pk in plan.organisations}
+        for membership in (
+            Membership.objects.active()
+            .filter(organisation__in=plan.organisations)
+            .select_related("user")
+        ):
+            user = plan.users.setdefault(membership.user_id, membership.user)
+            users_by_organisation[membership.organisation_id][user.pk] = user
+
+        outline_members = self.outline_state.group_members(
+            organisation.outline_group_uuid
+            for organisation in plan.organisations.values()
+            if organisation.outline_group_uuid
+        )
+
+        invited = set()
+        for organisation in plan.organisations.values():
+            current_uuids = set()
+            if organisation.outline_group_uuid:
+                current_uuids = outline_members[str(organisation.outline_group_uuid)]
+            else:
+                plan.operations.append(Operation(CREATE_GROUP, organisation.pk))
+
+            django_uuids = set()
+            for user in users_by_organisation[organisation.pk].values():
+                if not user.outline_uuid:
+                    if user.pk not in invited:
+                        invited.add(user.pk)
+                        plan.operations.append(Operation(INVITE, user_id=user.pk))
+                    plan.operations.append(Operation(ADD, organisation.pk, user.pk))
+                    continue
+                django_uuids.add(str(user.outline_uuid))
+                if str(user.outline_uuid) not in current_uuids:
+                    plan.operations.append(Operation(ADD, organisation.pk, user.pk))
+
+            for user_uuid in sorted(current_uuids - django_uuids):
+                plan.operations.append(
+                    Operation(REMOVE, organisation.pk, user_uuid=user_uuid)
+                )
+
+        return plan
+
+    def plan_users(self, users):
+        """
+        Operations needed to bring the Outline groups of `users` in line with
+        their organisations. Outline groups that do not belong to any
+        organisation are left alone.
+        """
+        plan = SyncPlan(users={user.pk: user for user in users})
+
+        organisations_by_user = {pk: {} for pk in plan.users}
+        for membership in (
+            Membership.objects.active()
+            .filter(user__in=plan.users)
+            .select_related("organisation")
+        ):
+            organisation = plan.organisations.setdefault(
+                membership.organisation_id, membership.organisation
+            )
+            organisations_by_user[membership.user_id][organisation.pk] = organisation
+
+        outline_groups = self.outline_state.user_groups(
+            user.outline_uuid for user in plan.users.values() if user.outline_uuid
+        )
+        managed_groups = {
+            str(organisation.outline_group_uuid): organisation
+            for organisation in Organisation.objects.filter(
+                outline_group_uuid__in=set().union(*outline_groups.values())
+            )
+        }
+
+        for user in plan.users.values():
+            organisations = organisations_by_user[user.pk].values()
+            if not user.outline_uuid:
+                plan.operations.append(Operation(INVITE, user_id=user.pk))
+                current_groups = set()
+            else:
+                current_groups = outline_groups[str(user.outline_uuid)]
+
+            django_groups = set()
+            for organisation in organisations:
+                if not organisation.outline_group_uuid:
+                    continue
+                django_groups.add(str(organisation.outline_group_uuid))
+                if str(organisation.outline_group_uuid) not in current_groups:
+                    plan.operations.append(Operation(ADD, organisation.pk, user.pk))
+
+            for group_uuid in sorted(current_groups - django_groups):
+                organisation = managed_groups.get(group_uuid)
+                if organisation is None:
+                    continue
+                plan.organisations.setdefault(organisation.pk, organisation)
+                plan.operations.append(
+                    Operation(
+                        REMOVE,
+                        organisation.pk,
+                        user_id=user.pk,
+                        user_uuid=str(user.outline_uuid),
+                    )
+                )
+
+        return plan
+
+
+@dataclass
+class SyncResult:
+    done: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    def raise_first_error(self):
+        if self.errors:
+            raise self.errors[0][1]
+
+
+class SyncExecutor:
+    """
+    Applies a `SyncPlan`: groups are created first, then users are invited
+    in batches, then group additions and removals run concurrently.
+    """
+
+    # successful additions and removals journaled per UPDATE; replaying them
+    # after a crash is harmless
+    journal_batch_size = 50
+
+    def __init__(self, client=None, workers=OUTLINE_CONCURRENCY, journal=None):
+        self.client = client or Client()
+        self.workers = workers
+        self.journal = journal
+
+    def _record(self, result, operations, error=None):
+        if not operations:
+            return
+        if error is None:
+            result.done.extend(operations)
+        else:
+            result.errors.extend((operation, error) for operation in operations)
+        if self.journal is not None:
+            self.journal.record(operations, error)
+
+    def _create_group(self, organisation):
+        try:
+            organisation.outline_group_uuid = self.client.create_new_group(
+                organisation.name
+            )
+        except GroupCreationFailed:
+            # the group already exists: look it up in the cached name index
+            outline_group = self.client.find_group_by_name(organisation.name)
+            organisation.outline_group_uuid = outline_group["id"]
+        organisation.save(update_fields=["outline_group_uuid"])
+
+    def _apply_membership(self, plan, operation):
+        organisation = plan.organisations[operation.organisation_id]
+        if operation.kind == ADD:
+            user_uuid = plan.users[operation.user_id].outline_uuid
+            self.client.add_to_outline_group(user_uuid, organisation.outline_group_uuid)
+        else:
+            self.client.remove_from_outline_group(
+                operation.user_uuid, organisation.outline_group_uuid
+            )
+
+    def execute(self, plan):
+        result = SyncResult()
+
+        for operation in plan.of_kind(CREATE_GROUP):
+            try:
+                self._create_group(plan.organisations[operation.organisation_id])
+                self._record(result, [operation])
+            except Exception as error:
+                self._record(result, [operation], error)
+
+        invites = plan.of_kind(INVITE)
+        if invites:
+            try:
+                User.invite_many_to_outline(
+                    [plan.users[operation.user_id] for operation in invites],
+                    self.client,
+                )
+                self._record(result, invites)
+            except InvitationFailed as error:
+                if error.users is None:
+                    failed_ids = set(operation.user_id for operation in invites)
+                else:
+                    # the other invited users were linked and saved
+                    failed_ids = set(user.pk for user in error.users)
+                self._record(
+                    result,
+                    [
+                        operation
+                        for operation in invites
+                        if operation.user_id not in failed_ids
+                    ],
+                )
+                self._record(
+                    result,
+                    [
+                        operation
+                        for operation in invites
+                        if operation.user_id in failed_ids
+                    ],
+                    error,
+                )
+            except Exception as error:
+                self._record(result, invites, error)
+
+        failed_keys = set(operation.key for operation, _ in result.errors)
+        memberships = [
+            operation
+            for operation in plan.operations
+            if operation.kind in (ADD, REMOVE)
+            and f"{CREATE_GROUP}:{operation.organisation_id}" not in failed_keys
+            and f"{INVITE}:{operation.user_id}" not in failed_keys
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (operation, executor.submit(self._apply_membership, plan, operation))
+                for operation in memberships
+            ]
+            done = []
+            for operation, future in futures:
+                try:
+                    future.result()
+                    done.append(operation)
+                except Exception as error:
+                    self._record(result, [operation], error)
+                if len(done) >= self.journal_batch_size:
+                    self._record(result, done)
+                    done = []
+            self._record(result, done)
+
+        return result
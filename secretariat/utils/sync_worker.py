@@ -0,0 +1,184 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from config.settings import (
+    OUTLINE_CONCURRENCY,
+    OUTLINE_SYNC_BATCH_SIZE,
+    OUTLINE_SYNC_LEASE_SECONDS,
+    OUTLINE_SYNC_MAX_ATTEMPTS,
+)
+from secretariat.models import Organisation, SyncJob, User
+from secretariat.utils.outline import Client
+from secretariat.utils.sync_plan import ADD, INVITE, SyncExecutor, SyncPlanner
+
+
+class SyncWorker:
+    """
+    Drains the `SyncJob` outbox: claims a batch of due jobs under a lease,
+    plans the users and the organisations of the batch at once, applies the
+    plans with `workers` concurrent Outline calls, then records the outcome
+    of each job. Failed jobs are retried later with an exponential delay.
+    """
+
+    retry_delay = 60
+    max_retry_delay = 3600
+
+    def __init__(
+        self,
+        client=None,
+        workers=OUTLINE_CONCURRENCY,
+        batch_size=OUTLINE_SYNC_BATCH_SIZE,
+        lease_seconds=OUTLINE_SYNC_LEASE_SECONDS,
+        max_attempts=OUTLINE_SYNC_MAX_ATTEMPTS,
+    ):
+        self.client = client or Client()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def claim(self):
+        """Leases due jobs, including the ones whose previous lease expired."""
+        now = timezone.now()
+        lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+        with transaction.atomic():
+            jobs = list(
+                SyncJob.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=SyncJob.PENDING, available_at__lte=now)
+                    | Q(status=SyncJob.RUNNING, lease_expires_at__lt=now)
+                )
+                .order_by("available_at", "pk")[: self.batch_size]
+            )
+            SyncJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=SyncJob.RUNNING,
+                lease_expires_at=lease_expires_at,
+                attempts=F("attempts") + 1,
+            )
+        for job in jobs:
+            job.attempts += 1
+            job.lease_expires_at = lease_expires_at
+        return jobs
+
+    def _execute(self, jobs, model, make_plan, operations_of):
+        objects = model.objects.in_bulk([job.object_id for job in jobs])
+        if not objects:
+            return {}
+        plan = make_plan(objects.values())
+        result = SyncExecutor(self.client, self.workers).execute(plan)
+
+        errors = {operation.key: error for operation, error in result.errors}
+        done = set(operation.key for operation in result.done)
+        outcomes = {}
+        for object_id in objects:
+            for operation in operations_of(plan, object_id):
+                if operation.key not in done:
+                    outcomes[object_id] = errors.get(
+                        operation.key, RuntimeError(f"{operation.key} non appliquée")
+                    )
+                    break
+        return outcomes
+
+    @staticmethod
+    def _user_operations(plan, user_id):
+        return [
+            operation for operation in plan.operations if operation.user_id == user_id
+        ]
+
+    @staticmethod
+    def _organisation_operations(plan, organisation_id):
+        operations = [
+            operation
+            for operation in plan.operations
+            if operation.organisation_id == organisation_id
+        ]
+        invited = set(
+            operation.user_id for operation in operations if operation.kind == ADD
+        )
+        return operations + [
+            operation
+            for operation in plan.of_kind(INVITE)
+            if operation.user_id in invited
+        ]
+
+    def process(self, jobs):
+        planner = SyncPlanner(self.client)
+        by_target = {SyncJob.USER: [], SyncJob.ORGANISATION: []}
+        for job in jobs:
+            by_target[job.target].append(job)
+
+        failures = {}
+        try:
+            outcomes = self._execute(
+                by_target[SyncJob.USER], User, planner.plan_users, self._user_operations
+            )
+            failures.update(
+                (job.pk, outcomes[job.object_id])
+                for job in by_target[SyncJob.USER]
+                if job.object_id in outcomes
+            )
+            outcomes = self._execute(
+                by_target[SyncJob.ORGANISATION],
+                Organisation,
+                planner.plan,
+                self._organisation_operations,
+            )
+            failures.update(
+                (job.pk, outcomes[job.object_id])
+                for job in by_target[SyncJob.ORGANISATION]
+                if job.object_id in outcomes
+            )
+        except Exception as error:
+            # planning failed (Outline unreachable…): the whole batch is retried
+            failures = {job.pk: error for job in jobs}
+
+        self._finish(jobs, failures)
+        return failures
+
+    @staticmethod
+    def _leased(jobs):
+        # a worker whose lease expired must not overwrite another worker's outcome
+        leases = {}
+        for job in jobs:
+            leases.setdefault(job.lease_expires_at, []).append(job.pk)
+        condition = Q()
+        for lease_expires_at, pks in leases.items():
+            condition |= Q(pk__in=pks, lease_expires_at=lease_expires_at)
+        return SyncJob.objects.filter(condition, status=SyncJob.RUNNING)
+
+    def _finish(self, jobs, failures):
+        now = timezone.now()
+        done = [job for job in jobs if job.pk not in failures]
+        if done:
+            self._leased(done).update(
+                status=SyncJob.DONE, lease_expires_at=None, last_error=""
+            )
+
+        for job in jobs:
+            if job.pk not in failures:
+                continue
+            last_error = f"{type(failures[job.pk]).__name__} : {failures[job.pk]}"
+            if job.attempts >= self.max_attempts:
+                status, available_at = SyncJob.FAILED, job.available_at
+            else:
+                status = SyncJob.PENDING
+                delay = min(
+                    self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay
+                )
+                available_at = now + timedelta(seconds=delay)
+            self._leased([job]).update(
+                status=status,
+                last_error=last_error,
+                lease_expires_at=None,
+                available_at=available_at,
+            )
+
+    def run_once(self):
+        """Processes one batch; returns the number of jobs claimed."""
+        jobs = self.claim()
+        if jobs:
+            self.process(jobs)
+        return len(jobs)
@@ -0,0 +1,73 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import (
+    OUTLINE_HTTP_CONNECT_TIMEOUT,
+    OUTLINE_HTTP_POOL_SIZE,
+    OUTLINE_HTTP_READ_TIMEOUT,
+)
+
+
+class OutlineTransport:
+    """
+    Keep-alive HTTP transport for the Outline API.
+
+    A single `requests.Session` keeps TCP/TLS connections open between calls,
+    so consecutive API calls reuse the same socket instead of doing a new
+    handshake every time.
+    """
+
+    def __init__(
+        self,
+        pool_size=OUTLINE_HTTP_POOL_SIZE,
+        connect_timeout=OUTLINE_HTTP_CONNECT_TIMEOUT,
+        read_timeout=OUTLINE_HTTP_READ_TIMEOUT,
+    ):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url=url, **kwargs)
+
+    def stats(self):
+        """
+        Counts read from the urllib3 connection pools: `connections` is the
+        number of sockets opened, `requests` the number of requests sent
+        through them. Everything above one request per connection is reuse.
+        """
+        connections, sent = 0, 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            sent += pool.num_requests
+        return {
+            "pool_size": self.pool_size,
+            "connections": connections,
+            "requests": sent,
+            "reused": max(sent - connections, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_shared_transport():
+    """Process-wide transport, shared by every `Client` instance."""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = OutlineTransport()
+        return _shared_transport
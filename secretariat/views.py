@@ -1,8 +1,19 @@
-from django.contrib import messages
+import hmac
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_POST
 
+from config.settings import OUTLINE_METRICS_TOKEN
+from secretariat.utils.circuit_breaker import get_shared_breaker
+from secretariat.utils.metrics import metrics
+from secretariat.utils.scheduler import get_shared_scheduler
+from secretariat.utils.transport import get_shared_transport
+
 
 def view_index(request):
     return render(request, "secretariat/accueil.html")
@@ -20,3 +31,43 @@ def view_logout(request):
         "Vous avez bien été déconnecté.e.",
     )
     return redirect("index")
+
+
+@staff_member_required
+def view_outline_status(request):
+    endpoints = [
+        {
+            "name": name,
+            "calls": endpoint["calls"],
+            "status_codes": sorted(endpoint["status_codes"].items()),
+            "mean_latency": endpoint["latency_sum"] / endpoint["calls"],
+            "bytes_sent": endpoint["bytes_sent"],
+            "bytes_received": endpoint["bytes_received"],
+        }
+        for name, endpoint in metrics.snapshot().items()
+    ]
+    return render(
+        request,
+        "secretariat/admin/outline_status.html",
+        {
+            **admin.site.each_context(request),
+            "title": "État de la connexion à Outline",
+            "endpoints": endpoints,
+            "connections": get_shared_transport().stats(),
+            "scheduler": get_shared_scheduler().stats(),
+            "breaker": get_shared_breaker().stats(),
+        },
+    )
+
+
+def view_outline_metrics(request):
+    token = request.headers.get("Authorization", "")
+    # an empty token setting must not open the endpoint to anonymous requests
+    token_is_valid = bool(OUTLINE_METRICS_TOKEN) and hmac.compare_digest(
+        token.encode(), f"Bearer {OUTLINE_METRICS_TOKEN}".encode()
+    )
+    if not (request.user.is_staff or token_is_valid):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render_prometheus(), content_type="text/plain; version=0.0.4"
+    )